@@ -0,0 +1,146 @@
+import codecs
+import json
+
+from tokenizer import format_value, is_long_literal
+
+CHUNK_SIZE = 64 * 1024
+MAX_ITEM_SIZE = 16 * 1024 * 1024
+
+_WHITESPACE = " \t\n\r"
+
+
+class InvalidBatchError(ValueError):
+    """Raised when the body of a batch request can't be read as a JSON array or as NDJSON."""
+
+    pass
+
+
+def _read_chunks(stream, chunk_size):
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    while True:
+        chunk = stream.read(chunk_size)
+        text = decoder.decode(chunk, final=not chunk)
+        if text:
+            yield text
+        if not chunk:
+            return
+
+
+def iter_json_array(stream, chunk_size=CHUNK_SIZE, max_item_size=MAX_ITEM_SIZE):
+    """Yield the items of a JSON array read from a binary stream, one at a time.
+
+    Only the item being decoded is buffered, so the memory used doesn't depend on the number of items,
+    and items which can't be decoded from max_item_size chars are rejected.
+    """
+    decoder = json.JSONDecoder()
+    chunks = _read_chunks(stream, chunk_size)
+    buffer, pos, eof = "", 0, False
+    expected = "["  # the next structural char: "[" at the start, then a value, then "," or "]" after each value
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+            pos += 1
+        if pos == len(buffer):
+            if eof:
+                raise InvalidBatchError("The batch is not a complete JSON array.")
+            buffer, pos = next(chunks, ""), 0
+            eof = not buffer
+            continue
+
+        char = buffer[pos]
+        if expected == "[":
+            if char != "[":
+                raise InvalidBatchError("The batch is not a JSON array.")
+            pos += 1
+            expected = "value or ]"
+        elif char == "]" and expected != "value":
+            return
+        elif expected == ", or ]":
+            if char != ",":
+                raise InvalidBatchError("Expected ',' or ']' between the items of the batch.")
+            pos += 1
+            expected = "value"
+        else:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                item, end = None, None
+            # a value ending with the buffer (e.g. a number) may continue in the next chunk
+            if end is None or (end == len(buffer) and not eof):
+                if eof or len(buffer) - pos > max_item_size:
+                    raise InvalidBatchError("The batch contains an invalid JSON item.")
+                chunk = next(chunks, "")
+                eof = not chunk
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+            yield item
+            buffer, pos = buffer[end:], 0
+            expected = ", or ]"
+
+
+def iter_ndjson(stream, max_item_size=MAX_ITEM_SIZE):
+    """Yield the items of a NDJSON stream, one per non empty line. Lines which aren't valid JSON yield an error.
+
+    Lines are read up to max_item_size bytes: longer ones yield an error, and the rest of them is skipped by chunks,
+    so the memory used doesn't depend on the length of the lines.
+    """
+    while True:
+        line = stream.readline(max_item_size + 1)
+        if not line:
+            return
+        if len(line) > max_item_size:
+            while line and not line.endswith(b"\n"):
+                line = stream.readline(CHUNK_SIZE)
+            yield InvalidBatchError(f"The batch item is longer than {max_item_size} bytes.")
+            continue
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield InvalidBatchError("The batch item is not valid JSON.")
+
+
+def _expression(item):
+    if isinstance(item, str):
+        return item
+    if isinstance(item, dict) and isinstance(item.get("expression", ""), str):
+        return item.get("expression", "")
+    raise InvalidBatchError("The batch item is neither an expression nor an object with an expression.")
+
+
+def dumps_record(record):
+    """Serialize a record to JSON, writing its result with format_literal if it's an int too long for json.dumps.
+
+    Such results are written last, as JSON numbers of any size.
+    """
+    result = record.get("result")
+    if type(result) is not int or not is_long_literal(result):
+        return json.dumps(record)
+    fields = json.dumps({key: value for key, value in record.items() if key != "result"})
+    return f'{fields[:-1]}{", " if len(fields) > 2 else ""}"result": {format_value(result)}}}'
+
+
+def evaluate_batch(items, evaluate, error_response, errors):
+    """Evaluate the batch items in order and yield one NDJSON line per item, as soon as its result is ready.
+
+    Items are expressions, or objects with an expression. The exceptions in errors are turned into error records
+    through error_response, instead of failing the whole batch. An unreadable batch ends with a last error record.
+    """
+    index = 0
+    try:
+        for item in items:
+            try:
+                if isinstance(item, InvalidBatchError):
+                    raise item
+                record = {"index": index, "result": evaluate(_expression(item))}
+            except InvalidBatchError as e:
+                record = {"index": index, "error": type(e).__name__, "message": str(e), "status": 400}
+            except errors as e:
+                body, status = error_response(e)
+                record = {"index": index, "error": type(e).__name__, **body, "status": status}
+            yield dumps_record(record) + "\n"
+            index += 1
+    except InvalidBatchError as e:
+        yield json.dumps({"index": index, "error": type(e).__name__, "message": str(e), "status": 400}) + "\n"
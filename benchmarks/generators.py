@@ -0,0 +1,67 @@
+import random
+
+OPERATORS = "+-*/"
+
+
+def _literal(rng, literal_digits):
+    # literals never start with 0, so they're never zero and divisions by zero can't happen
+    first = str(rng.randint(1, 9))
+    return first + "".join(rng.choice("0123456789") for _ in range(literal_digits - 1))
+
+
+def _operator(rng, operators):
+    if isinstance(operators, dict):
+        return rng.choices(list(operators), weights=list(operators.values()))[0]
+    return rng.choice(operators)
+
+
+def _split(rng, operands, depth):
+    """Return how many of the operands go to the left subtree, so both subtrees fit in depth - 1 levels."""
+    capacity = 2 ** (depth - 1)
+    return rng.randint(max(1, operands - capacity), min(operands - 1, capacity))
+
+
+def _tree_tokens(rng, tokens, depth, literal_digits, operators, infix):
+    # a lone literal isn't a valid infix expression, so there's at least one operator
+    operands = max((tokens + 1) // 2, 2)
+    # a binary tree of depth levels holds up to 2 ** depth operands
+    depth = max(depth, (operands - 1).bit_length())
+    pending = [(operands, depth)]  # a subtree (operands, depth) or a token to emit as is
+    while pending:
+        item = pending.pop()
+        if isinstance(item, str):
+            yield item
+            continue
+        operands, depth = item
+        if operands == 1:
+            yield _literal(rng, literal_digits)
+            continue
+        left = _split(rng, operands, depth)
+        operator = _operator(rng, operators)
+        right_subtree, left_subtree = (operands - left, depth - 1), (left, depth - 1)
+        if infix:
+            pending.extend((")", right_subtree, operator, left_subtree))
+            yield "("
+        else:
+            pending.extend((right_subtree, left_subtree))
+            yield operator
+
+
+def random_prefix_expression(seed, tokens=15, depth=4, literal_digits=2, operators=OPERATORS):
+    """Return a random valid prefix expression of `tokens` tokens (rounded up to an odd number, and at least 3).
+
+    The expression tree is at most `depth` levels deep (or as deep as needed to hold the operands). Literals have
+    `literal_digits` digits, and operators are picked uniformly from `operators`, or from a dict of operators to
+    their weights. The same arguments always return the same expression.
+    """
+    rng = random.Random(seed)
+    return " ".join(_tree_tokens(rng, tokens, depth, literal_digits, operators, infix=False))
+
+
+def random_infix_expression(seed, tokens=15, depth=4, literal_digits=2, operators=OPERATORS):
+    """Return a random valid fully parenthesized infix expression, with the same arguments as the prefix one.
+
+    `tokens` doesn't count the parentheses, so both notations of the same arguments have the same values.
+    """
+    rng = random.Random(seed)
+    return " ".join(_tree_tokens(rng, tokens, depth, literal_digits, operators, infix=True))
@@ -0,0 +1,71 @@
+import argparse
+import timeit
+
+from tokenizer import tokenize
+
+DIGITS = (10, 100, 1000, 10000, 100000)
+
+
+def legacy_prefix_literal(literal):
+    """Per digit accumulation of the previous prefix scanner, reading the literal in reverse order."""
+    value = 0
+    power = 0
+    for c in literal[::-1]:
+        value += int(c) * 10 ** power
+        power += 1
+    return value
+
+
+def legacy_infix_literal(literal):
+    """Per digit accumulation of the previous infix scanner."""
+    value = 0
+    for c in literal:
+        value = value * 10 + int(c)
+    return value
+
+
+def tokenizer_literal(literal):
+    return next(tokenize(literal))
+
+
+def _best_of(function, argument, repeat):
+    return min(timeit.repeat(lambda: function(argument), number=1, repeat=repeat))
+
+
+def run(digits=DIGITS, max_legacy_digits=10000, repeat=3):
+    """Time the tokenizer against the previous per digit parsing of both scanners, per literal length.
+
+    The legacy prefix parsing is quadratic (and worse), so the legacy parsing is only timed up to
+    max_legacy_digits digits.
+    """
+    results = []
+    for length in digits:
+        literal = "9" * length
+        row = {"digits": length, "tokenizer": _best_of(tokenizer_literal, literal, repeat)}
+        if length <= max_legacy_digits:
+            row["legacy_prefix"] = _best_of(legacy_prefix_literal, literal, repeat)
+            row["legacy_infix"] = _best_of(legacy_infix_literal, literal, repeat)
+        results.append(row)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the parsing of long literals.")
+    parser.add_argument("--max-legacy-digits", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'digits':>8} {'tokenizer':>10} {'prefix':>10} {'speedup':>9} {'infix':>10} {'speedup':>9}")
+    for row in run(max_legacy_digits=args.max_legacy_digits, repeat=args.repeat):
+        columns = [f"{row['digits']:>8}", f"{row['tokenizer']:>10.6f}"]
+        for notation in ("prefix", "infix"):
+            legacy = row.get(f"legacy_{notation}")
+            if legacy is None:
+                columns.append(f"{'-':>10} {'-':>9}")
+            else:
+                columns.append(f"{legacy:>10.6f} {legacy / row['tokenizer']:>8.1f}x")
+        print(" ".join(columns))
+
+
+if __name__ == "__main__":
+    main()
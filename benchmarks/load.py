@@ -0,0 +1,343 @@
+import argparse
+import http.client
+import itertools
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+from collections import Counter, namedtuple
+
+from benchmarks.generators import random_infix_expression, random_prefix_expression
+from benchmarks.precedence import minimal_parentheses
+from compiler import compile_infix_notation
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ROUTES = {
+    "prefix": "/calculator/prefix/",
+    "infix": "/calculator/infix/",
+    "algebraic": "/calculator/algebraic/",
+}
+
+# a request of the traffic: its kind, the route it's posted to, its expression and the status code it should get
+LoadRequest = namedtuple("LoadRequest", ["kind", "route", "expression", "expected_status"])
+
+# the mix of operators of the well formed expressions, which never divide by zero
+OPERATORS = "+-*"
+
+
+def _prefix(seed):
+    return "prefix", random_prefix_expression(seed, tokens=15, depth=4, operators=OPERATORS), 200
+
+
+def _infix(seed):
+    return "infix", random_infix_expression(seed, tokens=15, depth=4, operators=OPERATORS), 200
+
+
+def _algebraic(seed):
+    expression = random_infix_expression(seed, tokens=15, depth=4, operators=OPERATORS)
+    return "algebraic", minimal_parentheses(compile_infix_notation(expression)), 200
+
+
+def _malformed(seed):
+    # a well formed prefix or infix expression missing one of its tokens is always malformed
+    rng = random.Random(seed)
+    notation, generate = rng.choice((("prefix", random_prefix_expression), ("infix", random_infix_expression)))
+    tokens = generate(seed, tokens=15, depth=4, operators=OPERATORS).split()
+    del tokens[rng.randrange(len(tokens))]
+    return notation, " ".join(tokens), 400
+
+
+def _big_int(seed):
+    # products of up to 4 literals of 1000 digits, within the 4300 digits the routes serialize to JSON
+    expression = random_prefix_expression(seed, tokens=7, depth=3, literal_digits=1000, operators={"+": 2, "*": 1})
+    return "prefix", expression, 200
+
+
+KINDS = {
+    "prefix": _prefix,
+    "infix": _infix,
+    "algebraic": _algebraic,
+    "malformed": _malformed,
+    "big_int": _big_int,
+}
+DEFAULT_MIX = {"prefix": 4, "infix": 3, "algebraic": 1, "malformed": 1, "big_int": 1}
+
+
+def parse_mix(text):
+    """Parse a traffic mix, as kind=weight pairs separated by commas (e.g. "prefix=3,malformed=1")."""
+    mix = {}
+    for item in text.split(","):
+        kind, _, weight = item.partition("=")
+        if kind not in KINDS:
+            raise argparse.ArgumentTypeError(f"Unknown kind of request '{kind}', expected one of {', '.join(KINDS)}.")
+        mix[kind] = float(weight) if weight else 1.0
+    return mix
+
+
+def generate_traffic(mix=DEFAULT_MIX, pool=1000, seed=0):
+    """Return `pool` distinct requests, whose kinds are picked from the mix of kinds to their weights.
+
+    The same arguments always return the same requests.
+    """
+    rng = random.Random(seed)
+    kinds = rng.choices(list(mix), weights=list(mix.values()), k=pool)
+    requests = []
+    for index, kind in enumerate(kinds):
+        notation, expression, expected_status = KINDS[kind](seed * pool + index)
+        requests.append(LoadRequest(kind, ROUTES[notation], expression, expected_status))
+    return requests
+
+
+class ClientTransport:
+    """Post the requests to the webapp in this process, through the Flask test client (one per thread)."""
+
+    def __init__(self):
+        from webapp import app
+
+        self.app = app
+        self._local = threading.local()
+
+    def __str__(self):
+        return "client"
+
+    def post(self, route, expression):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        return client.post(route, json={"expression": expression}).status_code
+
+
+class HttpTransport:
+    """Post the requests to a running server, with a connection per thread (reopened when the server closes it)."""
+
+    def __init__(self, url, timeout=60.0):
+        self.url = url
+        parts = urllib.parse.urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.path = parts.path.rstrip("/")
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def __str__(self):
+        return self.url
+
+    def post(self, route, expression):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = http.client.HTTPConnection(self.host, self.port, self.timeout)
+        try:
+            connection.request(
+                "POST", self.path + route, json.dumps({"expression": expression}), {"Content-Type": "application/json"}
+            )
+            response = connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            self._local.connection = None
+            raise
+        return response.status
+
+
+def start_server(mode, port=3456, workers=None, timeout=30.0):
+    """Start `python webapp.py` (mode "webapp", on port 3456) or `python server.py` (mode "server") locally.
+
+    Return the process and the url of the server once it answers on /status/.
+    """
+    if mode == "webapp":
+        command, port = [sys.executable, "webapp.py"], 3456
+    else:
+        command = [sys.executable, "server.py", "--host", "127.0.0.1", "--port", str(port)]
+        if workers is not None:
+            command += ["--workers", str(workers)]
+    process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The {mode} exited with {process.returncode} before serving requests.")
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+        try:
+            connection.request("GET", "/status/")
+            if connection.getresponse().status == 200:
+                return process, url
+        except OSError:
+            pass
+        finally:
+            connection.close()
+        time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f"The {mode} didn't answer on {url} within {timeout} seconds.")
+
+
+def stop_server(process, timeout=30.0):
+    """Stop a server started by start_server, gracefully unless it doesn't exit within timeout seconds."""
+    process.terminate()
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def percentile(values, fraction):
+    """Return the nearest-rank percentile of sorted values (e.g. fraction=0.99 for the p99), or None without values."""
+    if not values:
+        return None
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def summarize(samples, seconds):
+    """Return the throughput, latencies and errors of (latency, status, expected status) samples over seconds.
+
+    Errors are the requests which failed (no response) or got another status code than the expected one.
+    """
+    latencies = sorted(latency for latency, _, _ in samples)
+    errors = sum(1 for _, status, expected_status in samples if status != expected_status)
+    statuses = Counter("failed" if status is None else str(status) for _, status, _ in samples)
+    return {
+        "requests": len(samples),
+        "throughput": len(samples) / seconds if seconds else 0.0,
+        "latency_seconds": {
+            "mean": sum(latencies) / len(latencies) if latencies else None,
+            "p50": percentile(latencies, 0.5),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "max": latencies[-1] if latencies else None,
+        },
+        "errors": errors,
+        "error_rate": errors / len(samples) if samples else 0.0,
+        "status_codes": dict(statuses),
+    }
+
+
+def run(transport, requests, concurrency=8, duration=10.0, rate=None, max_requests=None):
+    """Send the requests (cycling through them) from `concurrency` threads for `duration` seconds, and report it.
+
+    Without a rate, each thread sends its next request as soon as it gets the response of the previous one (closed
+    loop). With a rate (in requests per second), the requests are scheduled at that rate and sent by the first idle
+    thread (open loop): the latencies are measured from their scheduled time, so they include the time spent waiting
+    for a thread when the server can't keep up. max_requests stops the run after that many requests.
+    """
+    samples = []  # (kind, latency, status, expected status) of each request
+    indexes = itertools.count()
+    start = time.perf_counter()
+    deadline = start + duration
+
+    def send():
+        for index in indexes:
+            if max_requests is not None and index >= max_requests:
+                return
+            if rate is None:
+                scheduled = time.perf_counter()
+                if scheduled >= deadline:
+                    return
+            else:
+                scheduled = start + index / rate
+                if scheduled >= deadline:
+                    return
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            request = requests[index % len(requests)]
+            try:
+                status = transport.post(request.route, request.expression)
+            except (OSError, http.client.HTTPException):
+                status = None
+            samples.append((request.kind, time.perf_counter() - scheduled, status, request.expected_status))
+
+    threads = [threading.Thread(target=send, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+
+    report = {
+        "target": str(transport),
+        "concurrency": concurrency,
+        "rate": rate,
+        "seconds": seconds,
+        **summarize([sample[1:] for sample in samples], seconds),
+        "kinds": {},
+    }
+    for kind in sorted({sample[0] for sample in samples}):
+        report["kinds"][kind] = summarize([sample[1:] for sample in samples if sample[0] == kind], seconds)
+    return report
+
+
+def check(report, max_error_rate=None, max_p99=None):
+    """Return a description of each threshold the report exceeds."""
+    violations = []
+    if max_error_rate is not None and report["error_rate"] > max_error_rate:
+        violations.append(f"error_rate: {report['error_rate']:.4f} above {max_error_rate}")
+    p99 = report["latency_seconds"]["p99"]
+    if max_p99 is not None and p99 is not None and p99 > max_p99:
+        violations.append(f"p99: {p99:.4f}s above {max_p99}s")
+    return violations
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the calculator webapp, reporting latencies as JSON.")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument(
+        "--serve",
+        choices=("webapp", "server"),
+        help="start `python webapp.py` or `python server.py` locally (default: the webapp in process, through the "
+        "Flask test client)",
+    )
+    target.add_argument("--url", help="the url of a running server")
+    parser.add_argument("--port", type=int, default=3456, help="the port of the server started with --serve server")
+    parser.add_argument("--workers", type=int, help="the workers of the server started with --serve server")
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default=DEFAULT_MIX,
+        help=f"the weights of the kinds of requests (default: {','.join(f'{k}={w}' for k, w in DEFAULT_MIX.items())})",
+    )
+    parser.add_argument("--pool", type=int, default=1000, help="distinct requests, sent in turn (default: 1000)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, default=8, help="threads sending requests (default: 8)")
+    parser.add_argument("--rate", type=float, help="target requests per second (default: as fast as possible)")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds (default: 10)")
+    parser.add_argument("--requests", type=int, help="stop after this many requests")
+    parser.add_argument("--output", help="file to write the report to (default: stdout)")
+    parser.add_argument("--max-error-rate", type=float, help="exit with 1 if the error rate is above this fraction")
+    parser.add_argument("--max-p99", type=float, help="exit with 1 if the p99 latency is above this many seconds")
+    args = parser.parse_args(argv)
+
+    requests = generate_traffic(args.mix, args.pool, args.seed)
+    process = None
+    if args.serve:
+        process, url = start_server(args.serve, args.port, args.workers)
+        transport = HttpTransport(url)
+    else:
+        transport = HttpTransport(args.url) if args.url else ClientTransport()
+    try:
+        report = run(transport, requests, args.concurrency, args.duration, args.rate, args.requests)
+    finally:
+        if process is not None:
+            stop_server(process)
+    report["mix"] = args.mix
+    report["pool"] = args.pool
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    violations = check(report, args.max_error_rate, args.max_p99)
+    for violation in violations:
+        print(violation, file=sys.stderr)
+    return 1 if violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.generators import random_infix_expression, random_prefix_expression
+
+# the mix of operators of the expressions, whose values stay within the range of the doubles (the products of
+# million-token expressions overflow them, and the float64 mode would leave them to the exact evaluators)
+OPERATORS = {"+": 2, "/": 1}
+
+GENERATORS = {
+    "prefix": random_prefix_expression,
+    "infix": random_infix_expression,
+}
+
+
+def _evaluator(notation, mode):
+    from float64 import evaluate_float64
+    from infix_calculator import evaluate_infix_notation
+    from prefix_calculator import evaluate_prefix_notation
+
+    if mode == "float64":
+        return lambda expression: evaluate_float64(expression, notation)
+    return {"prefix": evaluate_prefix_notation, "infix": evaluate_infix_notation}[notation]
+
+
+def _reset_peak_rss():
+    """Reset the peak resident set size of the process, where linux allows it, returning whether it did."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return False
+    return True
+
+
+def _peak_rss_bytes():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def measure(notation, mode, path):
+    """Evaluate the expression in the file at path, in this process, and return what it took.
+
+    peak_rss_bytes is how much the peak resident set size of the process grew while evaluating the expression
+    (after reading it, and resetting the peak where linux allows it), and peak_traced_bytes the peak of the memory
+    allocated by Python objects, from a second evaluation traced by tracemalloc.
+    """
+    evaluate = _evaluator(notation, mode)
+    with open(path) as f:
+        expression = f.read()
+    _reset_peak_rss()
+    baseline = _peak_rss_bytes()
+    start = time.perf_counter()
+    result = evaluate(expression)
+    seconds = time.perf_counter() - start
+    peak_rss_bytes = _peak_rss_bytes() - baseline
+
+    tracemalloc.start()
+    try:
+        evaluate(expression)
+        _, peak_traced_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "notation": notation,
+        "mode": mode,
+        "seconds": seconds,
+        "peak_rss_bytes": peak_rss_bytes,
+        "peak_traced_bytes": peak_traced_bytes,
+        # the float64 mode returns None for the expressions it leaves to the exact evaluators
+        "fast_path": result is not None,
+    }
+
+
+def run(tokens=1000001, depth=20, literal_digits=6, seed=0):
+    """Measure each evaluator on an expression of `tokens` tokens, each in a fresh process so their peaks are apart."""
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for notation, generate in GENERATORS.items():
+            path = os.path.join(directory, f"{notation}.txt")
+            with open(path, "w") as f:
+                f.write(generate(seed, tokens, depth, literal_digits, OPERATORS))
+            for mode in ("exact", "float64"):
+                output = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.memory", "--measure", notation, mode, path],
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                ).stdout
+                results.append(json.loads(output))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the memory used by the exact and float64 evaluators.")
+    parser.add_argument("--tokens", type=int, default=1000001)
+    parser.add_argument("--depth", type=int, default=20)
+    parser.add_argument("--literal-digits", type=int, default=6)
+    parser.add_argument("--measure", nargs=3, metavar=("NOTATION", "MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(*args.measure)))
+        return
+
+    print(f"{'notation':>8} {'mode':>8} {'seconds':>8} {'peak rss':>12} {'peak traced':>12}")
+    for row in run(args.tokens, args.depth, args.literal_digits):
+        fallback = "" if row["mode"] == "exact" or row["fast_path"] else " (evaluated exactly)"
+        print(
+            f"{row['notation']:>8} {row['mode']:>8} {row['seconds']:>8.3f} {row['peak_rss_bytes'] / 2**20:>10.1f}MB "
+            f"{row['peak_traced_bytes'] / 2**20:>10.1f}MB{fallback}"
+        )
+
+
+if __name__ == "__main__":
+    main()
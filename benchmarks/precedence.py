@@ -0,0 +1,98 @@
+import argparse
+import json
+import logging
+import timeit
+
+from benchmarks.generators import random_infix_expression
+from compiler import INFIX, PRECEDENCE, compile_infix_notation, run_program
+from infix_calculator import evaluate_algebraic_notation, evaluate_infix_notation
+
+# (tokens, depth, literal digits, operators) of the fully parenthesized expressions, from the deepest ones
+SHAPES = {
+    "deep": (2001, 1000, 1, "+-"),
+    "deeper": (20001, 10000, 1, "+-"),
+    "deep_mixed": (2001, 1000, 2, "+-*/"),
+    "long": (2001, 14, 3, "+-*/"),
+}
+
+# the precedence of the literals, which never need parentheses
+_VALUE_PRECEDENCE = max(PRECEDENCE.values()) + 1
+
+
+def minimal_parentheses(program):
+    """Return the algebraic expression of an infix program, with only the parentheses the precedence requires.
+
+    Operands binding less tightly than their operator are parenthesized, and so are the right operands binding as
+    tightly, as the operators are left associative.
+    """
+    stack = []  # (expression, precedence of its last operator) pairs
+    for instruction in program.instructions:
+        if type(instruction) is int:
+            stack.append((str(instruction), _VALUE_PRECEDENCE))
+            continue
+        (right, right_precedence), (left, left_precedence) = stack.pop(), stack.pop()
+        precedence = PRECEDENCE[instruction]
+        if left_precedence < precedence:
+            left = f"( {left} )"
+        if right_precedence <= precedence:
+            right = f"( {right} )"
+        stack.append((f"{left} {instruction} {right}", precedence))
+    return stack.pop()[0]
+
+
+def _ops_per_sec(function, expression, repeat):
+    def evaluate():
+        try:
+            function(expression)
+        except ArithmeticError:
+            pass
+
+    number, seconds = timeit.Timer(evaluate).autorange()
+    seconds = min([seconds] + timeit.repeat(evaluate, number=number, repeat=repeat - 1))
+    return number / seconds
+
+
+def run(shapes=SHAPES, repeat=3, seed=0):
+    """Measure the throughput of the infix evaluators on the expressions of each shape.
+
+    The interpreter (evaluate_infix_notation) and the compiler of the fully parenthesized notation are measured on
+    the fully parenthesized expression, and the shunting-yard compiler (evaluate_algebraic_notation) both on it and
+    on the same expression with only the parentheses the precedence requires.
+    """
+    results = []
+    for name, (tokens, depth, literal_digits, operators) in shapes.items():
+        expression = random_infix_expression(seed, tokens, depth, literal_digits, operators)
+        minimal = minimal_parentheses(compile_infix_notation(expression))
+        evaluators = {
+            "interpreter": (evaluate_infix_notation, expression),
+            "compiled": (lambda text: run_program(compile_infix_notation(text)), expression),
+            "algebraic": (evaluate_algebraic_notation, expression),
+            "algebraic_minimal": (evaluate_algebraic_notation, minimal),
+        }
+        row = {"shape": name, "tokens": tokens, "depth": depth, "minimal_chars": len(minimal), "chars": len(expression)}
+        for evaluator, (function, text) in evaluators.items():
+            row[evaluator] = _ops_per_sec(function, text, repeat)
+        results.append(row)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=f"Benchmark the {INFIX} evaluators on deeply nested expressions.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+    # long mixes of multiplications and divisions can divide by zero, which isn't worth logging here
+    logging.disable(logging.ERROR)
+
+    results = run(repeat=args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    columns = ("interpreter", "compiled", "algebraic", "algebraic_minimal")
+    print(f"{'shape':>10} " + " ".join(f"{column:>17}" for column in columns))
+    for row in results:
+        print(f"{row['shape']:>10} " + " ".join(f"{row[column]:>13.1f}op/s" for column in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+
+from benchmarks.generators import random_infix_expression, random_prefix_expression
+from infix_calculator import evaluate_infix_notation
+from prefix_calculator import evaluate_prefix_notation
+
+# the shape of the expressions of a benchmark case, see random_prefix_expression
+Case = namedtuple("Case", ["name", "tokens", "depth", "literal_digits", "operators"])
+
+CASES = (
+    Case("small", tokens=15, depth=4, literal_digits=2, operators="+-*/"),
+    Case("long", tokens=2001, depth=14, literal_digits=3, operators="+-*/"),
+    Case("deep", tokens=2001, depth=1000, literal_digits=1, operators="+-"),
+    # sums only, as the routes can't serialize results of more than 4300 digits to JSON
+    Case("wide_literals", tokens=31, depth=5, literal_digits=4000, operators="+-"),
+    Case("additions", tokens=2001, depth=14, literal_digits=6, operators={"+": 8, "-": 1, "*": 1}),
+)
+TARGETS = ("prefix_evaluator", "infix_evaluator", "prefix_route", "infix_route")
+
+# whether a higher value of each compared metric is better
+METRICS = {"ops_per_sec": True, "peak_bytes": False}
+
+
+class RouteFailure(Exception):
+    """A route answered a benchmarked expression with another status code than 200."""
+
+
+def _evaluator(target):
+    """Return a function evaluating an expression with the target, along with the notation it expects."""
+    if target == "prefix_evaluator":
+        return evaluate_prefix_notation, "prefix"
+    if target == "infix_evaluator":
+        return evaluate_infix_notation, "infix"
+
+    from webapp import app
+
+    client = app.test_client()
+    notation = target.split("_")[0]
+
+    def post(expression):
+        response = client.post(f"/calculator/{notation}/", json={"expression": expression})
+        if response.status_code != 200:
+            raise RouteFailure(f"{response.status_code} {response.get_json()['message']}")
+        return response
+
+    return post, notation
+
+
+def _call(function, expression):
+    # long mixes of multiplications and divisions can overflow floats, which is part of what's measured
+    try:
+        function(expression)
+        return None
+    except ArithmeticError as e:
+        return type(e).__name__
+
+
+def measure(function, expression, repeat=3, min_time=0.2):
+    """Return the throughput of function on the expression (best of repeat rounds of at least min_time seconds)
+    and the peak memory it allocates to evaluate it once.
+
+    A route failing to evaluate the expression isn't measured: its failure is returned instead of the metrics.
+    """
+    try:
+        _call(function, expression)
+    except RouteFailure as e:
+        return {"ops_per_sec": None, "peak_bytes": None, "error": None, "failure": str(e)}
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            _call(function, expression)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number *= 2
+    best = elapsed
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            _call(function, expression)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        error = _call(function, expression)
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"ops_per_sec": number / best, "peak_bytes": peak_bytes, "error": error}
+
+
+def run(cases=CASES, targets=TARGETS, seed=0, repeat=3, min_time=0.2):
+    """Benchmark each target on the expression generated for each case, returning the results as a dict.
+
+    The routes are benchmarked through the Flask test client, with the expression cache disabled so every request
+    evaluates its expression.
+    """
+    from webapp import app
+
+    cache_enabled = app.config["EXPRESSION_CACHE_ENABLED"]
+    app.config["EXPRESSION_CACHE_ENABLED"] = False
+    try:
+        results = {}
+        for case in cases:
+            expressions = {
+                "prefix": random_prefix_expression(seed, *case[1:]),
+                "infix": random_infix_expression(seed, *case[1:]),
+            }
+            results[case.name] = {}
+            for target in targets:
+                function, notation = _evaluator(target)
+                result = measure(function, expressions[notation], repeat, min_time)
+                if result["ops_per_sec"] is not None:
+                    result["tokens_per_sec"] = result["ops_per_sec"] * case.tokens
+                results[case.name][target] = result
+    finally:
+        app.config["EXPRESSION_CACHE_ENABLED"] = cache_enabled
+    return {"python": platform.python_version(), "seed": seed, "results": results}
+
+
+def compare(baseline, current, threshold=0.1):
+    """Return a description of each metric of current which regressed by more than threshold from the baseline.
+
+    Cases and targets missing from either run are skipped, and routes failing in current are reported as such.
+    """
+    regressions = []
+    for case, targets in current["results"].items():
+        for target, metrics in targets.items():
+            base = baseline["results"].get(case, {}).get(target)
+            if base is None:
+                continue
+            if metrics.get("failure"):
+                regressions.append(f"{case} {target} failed: {metrics['failure']}")
+                continue
+            for metric, higher_is_better in METRICS.items():
+                if not base[metric]:
+                    continue
+                change = (metrics[metric] - base[metric]) / base[metric]
+                regression = -change if higher_is_better else change
+                if regression > threshold:
+                    regressions.append(
+                        f"{case} {target} {metric}: {base[metric]:.6g} -> {metrics[metric]:.6g} ({change:+.1%})"
+                    )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the evaluators and routes on generated expressions.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run the benchmarks and write their results as JSON")
+    run_parser.add_argument("--output", help="file to write the results to (default: stdout)")
+    run_parser.add_argument("--cases", nargs="+", choices=[case.name for case in CASES])
+    run_parser.add_argument("--targets", nargs="+", choices=TARGETS, default=TARGETS)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument("--min-time", type=float, default=0.2)
+    compare_parser = commands.add_parser("compare", help="fail if the results regressed from a baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument(
+        "--threshold", type=float, default=0.1, help="largest accepted regression, as a fraction (default: 0.1)"
+    )
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        cases = [case for case in CASES if not args.cases or case.name in args.cases]
+        results = run(cases, args.targets, args.seed, args.repeat, args.min_time)
+        output = json.dumps(results, indent=2)
+        if args.output:
+            with open(args.output, "w") as f:
+                f.write(output + "\n")
+        else:
+            print(output)
+        failures = [
+            f"{case} {target} failed: {result['failure']}"
+            for case, targets in results["results"].items()
+            for target, result in targets.items()
+            if result.get("failure")
+        ]
+        for failure in failures:
+            print(failure, file=sys.stderr)
+        return 1 if failures else 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    regressions = compare(baseline, current, args.threshold)
+    for regression in regressions:
+        print(regression)
+    if regressions:
+        print(f"{len(regressions)} metrics regressed by more than {args.threshold:.0%}.")
+        return 1
+    print("No regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+import argparse
+import logging
+import random
+import re
+import timeit
+
+import codegen
+from benchmarks.generators import random_infix_expression, random_prefix_expression
+from compiler import compile_expression, run_program
+from infix_calculator import evaluate_infix_notation
+from prefix_calculator import evaluate_prefix_notation
+
+# (tokens, depth, literal digits, operators) of the templates
+SHAPES = {
+    "small": (15, 4, 2, "+-*/"),
+    "long": (2001, 14, 3, "+-*/"),
+    "deep": (2001, 1000, 1, "+-"),
+}
+
+INTERPRETERS = {
+    "prefix": evaluate_prefix_notation,
+    "infix": evaluate_infix_notation,
+}
+
+_LITERAL_RE = re.compile(r"[0-9]+")
+
+
+def _variants(expression, literal_digits, count, seed):
+    """Return count copies of the expression with other random literals of the same width, which never start with
+    0 (so there are no divisions by zero)."""
+    rng = random.Random(seed)
+
+    def literal(_):
+        return str(rng.randint(10 ** (literal_digits - 1), 10**literal_digits - 1))
+
+    return [_LITERAL_RE.sub(literal, expression) for _ in range(count)]
+
+
+def _per_evaluation(function, arguments, repeat):
+    def evaluate_all():
+        for argument in arguments:
+            try:
+                function(argument)
+            except ArithmeticError:
+                pass
+
+    return min(timeit.repeat(evaluate_all, number=1, repeat=repeat)) / len(arguments)
+
+
+def run(shapes=SHAPES, variants=200, repeat=3, seed=0):
+    """Time the evaluation of many expressions of the same shape, with different literals, per evaluation.
+
+    The per character interpreters and codegen.evaluate parse each expression, while run_program and the compiled
+    template run already parsed ones, the template getting the literals as the arguments of its function.
+    """
+    results = []
+    for name, (tokens, depth, literal_digits, operators) in shapes.items():
+        for notation, generate in (("prefix", random_prefix_expression), ("infix", random_infix_expression)):
+            expression = generate(seed, tokens, depth, literal_digits, operators)
+            expressions = _variants(expression, literal_digits, variants, seed)
+            programs = [compile_expression(notation, expression) for expression in expressions]
+            template = codegen.templates.get(programs[0])
+            literals = [[value for value in program.instructions if type(value) is int] for program in programs]
+            results.append(
+                {
+                    "shape": name,
+                    "notation": notation,
+                    "interpreter": _per_evaluation(INTERPRETERS[notation], expressions, repeat),
+                    "codegen": _per_evaluation(lambda text: codegen.evaluate(text, notation), expressions, repeat),
+                    "run_program": _per_evaluation(run_program, programs, repeat),
+                    "template": _per_evaluation(lambda values: template.function(None, *values), literals, repeat),
+                }
+            )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark compiled templates against the interpreters.")
+    parser.add_argument("--variants", type=int, default=200, help="expressions of each shape, with other literals")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    # some variants divide by zero, which isn't worth logging here
+    logging.disable(logging.ERROR)
+
+    columns = ("interpreter", "codegen", "run_program", "template")
+    print(f"{'shape':>6} {'notation':>8} " + " ".join(f"{column:>11}" for column in columns) + f" {'speedup':>8}")
+    for row in run(variants=args.variants, repeat=args.repeat):
+        times = " ".join(f"{row[column] * 1e6:>9.1f}us" for column in columns)
+        print(f"{row['shape']:>6} {row['notation']:>8} {times} {row['interpreter'] / row['template']:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
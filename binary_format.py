@@ -0,0 +1,103 @@
+import logging
+import struct
+
+from exceptions import InvalidPayloadError
+from tokenizer import tokenize
+
+logger = logging.getLogger(__name__)
+
+# The binary format of the calculator routes of the web API, an alternative to their JSON bodies.
+#
+# Requests (Content-Type: application/x-calculator-tokens) carry the tokens of the expression, in order, without
+# separators:
+# - an operator or a parenthesis is its ASCII char, on 1 byte (any other byte is an invalid char)
+# - a literal is a 0 byte, the length n of the literal in bytes as a 4 bytes big endian unsigned int, then the n bytes
+#   of the literal, as a big endian unsigned int
+#
+# Responses (sent when the Accept header prefers application/x-calculator-tokens to application/json) are one of:
+# - a 0 byte, the length n as a 4 bytes big endian unsigned int, then the n bytes of the int result, as a big endian
+#   two's complement int
+# - a 1 byte, then the float result as a big endian double on 8 bytes
+# - a 2 byte, the length n as a 4 bytes big endian unsigned int, then the n bytes of the error message, in utf-8,
+#   with the same status code as the JSON response
+#
+# Ints are converted to and from bytes in linear time, unlike their decimal digits, so big literals and results skip
+# both the JSON encoding and the conversion to and from decimal.
+MIMETYPE = "application/x-calculator-tokens"
+
+LITERAL = 0
+_INT, _FLOAT, _MESSAGE = range(3)
+
+_LENGTH = struct.Struct(">I")
+_DOUBLE = struct.Struct(">d")
+
+# the token of each byte which isn't a literal
+_CHARS = [chr(byte) for byte in range(256)]
+
+
+def encode_tokens(tokens):
+    """Encode the tokens of an expression (non negative ints and single chars) into a request payload."""
+    parts = []
+    for token in tokens:
+        if type(token) is int:
+            literal = token.to_bytes((token.bit_length() + 7) // 8, "big")
+            parts.append(bytes((LITERAL,)) + _LENGTH.pack(len(literal)) + literal)
+        else:
+            parts.append(token.encode("latin-1"))
+    return b"".join(parts)
+
+
+def encode_expression(expression):
+    """Encode an expression into a request payload, for the clients which have it as a string."""
+    return encode_tokens(tokenize(expression))
+
+
+def decode_tokens(payload):
+    """Decode the tokens of a request payload: ints for the literals, and single chars for the other bytes."""
+    tokens = []
+    pos, end = 0, len(payload)
+    while pos < end:
+        byte = payload[pos]
+        if byte != LITERAL:
+            tokens.append(_CHARS[byte])
+            pos += 1
+            continue
+        if pos + 5 > end:
+            error_mgs = f"The length of the literal at byte {pos} of the payload is truncated."
+            logger.error(error_mgs)
+            raise InvalidPayloadError(error_mgs)
+        (length,) = _LENGTH.unpack_from(payload, pos + 1)
+        if pos + 5 + length > end:
+            error_mgs = f"The literal at byte {pos} of the payload is truncated: {length} bytes expected."
+            logger.error(error_mgs)
+            raise InvalidPayloadError(error_mgs)
+        tokens.append(int.from_bytes(payload[pos + 5 : pos + 5 + length], "big"))
+        pos += 5 + length
+    return tokens
+
+
+def encode_response(body):
+    """Encode the body of a response, either {"result": int or float} or {"message": str}."""
+    if "message" in body:
+        message = body["message"].encode("utf-8")
+        return bytes((_MESSAGE,)) + _LENGTH.pack(len(message)) + message
+    result = body["result"]
+    if isinstance(result, float):
+        return bytes((_FLOAT,)) + _DOUBLE.pack(result)
+    value = result.to_bytes(result.bit_length() // 8 + 1, "big", signed=True)
+    return bytes((_INT,)) + _LENGTH.pack(len(value)) + value
+
+
+def decode_response(payload):
+    """Decode the body of a response, returning the same dict as the JSON response."""
+    if not payload or payload[0] not in (_INT, _FLOAT, _MESSAGE):
+        error_mgs = "The response payload doesn't start with a known type of value."
+        logger.error(error_mgs)
+        raise InvalidPayloadError(error_mgs)
+    if payload[0] == _FLOAT:
+        return {"result": _DOUBLE.unpack_from(payload, 1)[0]}
+    (length,) = _LENGTH.unpack_from(payload, 1)
+    value = payload[5 : 5 + length]
+    if payload[0] == _MESSAGE:
+        return {"message": value.decode("utf-8")}
+    return {"result": int.from_bytes(value, "big", signed=True)}
@@ -0,0 +1,198 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from compiler import INFIX, PREFIX, compile_expression, run_program
+from expression_cache import EVALUATION_ERRORS
+from tokenizer import format_literal
+
+CHUNK_BYTES = 1024 * 1024
+
+
+def evaluate_chunk(notation, start, chunk):
+    """Evaluate the expressions of a chunk of lines starting at byte offset start, one per non empty line.
+
+    Return the JSONL records of the chunk, with the byte offset of each expression, and the count of expressions
+    and of errors by type. Results are written with format_literal, so ints of any size stay JSON numbers.
+    """
+    records = []
+    errors = Counter()
+    expressions = 0
+    offset = start
+    for line in chunk.splitlines(keepends=True):
+        expression = line.decode(errors="replace").strip()
+        if expression:
+            expressions += 1
+            try:
+                result = run_program(compile_expression(notation, expression))
+            # float divisions of huge ints raise an OverflowError
+            except (*EVALUATION_ERRORS, ArithmeticError) as e:
+                errors[type(e).__name__] += 1
+                record = {"offset": offset, "error": type(e).__name__, "message": str(e)}
+                records.append(json.dumps(record) + "\n")
+            else:
+                value = format_literal(result) if type(result) is int else json.dumps(result)
+                records.append(f'{{"offset": {offset}, "result": {value}}}\n')
+        offset += len(line)
+    return "".join(records), expressions, errors
+
+
+def read_chunks(stream, offset=0, chunk_bytes=CHUNK_BYTES):
+    """Yield (start offset, chunk) pairs of whole lines of about chunk_bytes bytes, from offset in a binary stream."""
+    if offset:
+        if stream.seekable():
+            stream.seek(offset)
+        else:
+            skipped = 0
+            while skipped < offset:
+                data = stream.read(min(CHUNK_BYTES, offset - skipped))
+                if not data:
+                    break
+                skipped += len(data)
+    start = offset
+    while True:
+        chunk = b"".join(stream.readlines(chunk_bytes))
+        if not chunk:
+            return
+        yield start, chunk
+        start += len(chunk)
+
+
+class BulkEvaluation:
+    """Evaluate the expressions of files (or stdin) line by line, in chunks spread across worker processes.
+
+    The records of a chunk are written as soon as it's evaluated, or in the order of the input with keep_order.
+    At most 2 chunks per worker are read ahead, so the memory used doesn't depend on the size of the input.
+    resume_offset is the byte offset up to which all the records of the current file are written: evaluating the
+    file again from there writes the missing records (and with keep_order=False, maybe some records again).
+    """
+
+    def __init__(self, output, notation=PREFIX, workers=1, keep_order=False, chunk_bytes=CHUNK_BYTES):
+        self.output = output
+        self.notation = notation
+        self.workers = workers
+        self.keep_order = keep_order
+        self.chunk_bytes = chunk_bytes
+        self.expressions = 0
+        self.errors = Counter()
+        self.file = None
+        self.resume_offset = 0
+        self._executor = None
+        self._pending = deque()  # the (start, end, future) of the chunks being evaluated, in the order of the input
+        if workers > 1:
+            self._executor = ProcessPoolExecutor(
+                workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                # the errors are in the records, so the workers don't log them
+                initializer=logging.disable,
+                initargs=(logging.ERROR,),
+            )
+
+    def _write(self, records, expressions, errors):
+        self.output.write(records)
+        self.output.flush()
+        self.expressions += expressions
+        self.errors.update(errors)
+
+    def evaluate_file(self, path, offset=0):
+        """Evaluate the expressions of the file at path (- for stdin), from byte offset."""
+        self.file, self.resume_offset = path, offset
+        stream = sys.stdin.buffer if path == "-" else open(path, "rb")
+        try:
+            if self._executor is None:
+                for start, chunk in read_chunks(stream, offset, self.chunk_bytes):
+                    self._write(*evaluate_chunk(self.notation, start, chunk))
+                    self.resume_offset = start + len(chunk)
+            else:
+                self._evaluate_in_workers(read_chunks(stream, offset, self.chunk_bytes))
+        finally:
+            if stream is not sys.stdin.buffer:
+                stream.close()
+
+    def _evaluate_in_workers(self, chunks):
+        pending = self._pending
+        completed = {}  # start -> end of the chunks written after a chunk not written yet
+        for start, chunk in chunks:
+            future = self._executor.submit(evaluate_chunk, self.notation, start, chunk)
+            pending.append((start, start + len(chunk), future))
+            if len(pending) >= 2 * self.workers:
+                self._collect(pending, completed)
+        while pending:
+            self._collect(pending, completed)
+
+    def _collect(self, pending, completed):
+        if self.keep_order:
+            start, end, future = pending.popleft()
+            self._write(*future.result())
+            self.resume_offset = end
+            return
+        done, _ = wait([future for _, _, future in pending], return_when=FIRST_COMPLETED)
+        for item in [item for item in pending if item[2] in done]:
+            pending.remove(item)
+            start, end, future = item
+            self._write(*future.result())
+            completed[start] = end
+        while self.resume_offset in completed:
+            self.resume_offset = completed.pop(self.resume_offset)
+
+    def close(self):
+        if self._executor is not None:
+            # the chunks not evaluated yet (e.g. after an interruption) are cancelled rather than waited for
+            for _, _, future in self._pending:
+                future.cancel()
+            self._executor.shutdown(wait=True)
+
+    def summary(self, seconds, interrupted=False):
+        """Return the totals of the evaluation, and where to resume it from."""
+        return {
+            "expressions": self.expressions,
+            "errors": sum(self.errors.values()),
+            "errors_by_type": dict(self.errors),
+            "seconds": round(seconds, 3),
+            "expressions_per_second": round(self.expressions / seconds) if seconds else 0,
+            "interrupted": interrupted,
+            "file": self.file,
+            "resume_offset": self.resume_offset,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate the expressions of files or stdin, one per line, to JSONL.")
+    parser.add_argument("files", nargs="*", default=["-"], help="files to evaluate (default: - for stdin)")
+    parser.add_argument("--notation", choices=(PREFIX, INFIX), default=PREFIX)
+    parser.add_argument("--output", help="file to append the JSONL records to (default: stdout)")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--chunk-bytes", type=int, default=CHUNK_BYTES, help="size of the chunks given to workers")
+    parser.add_argument("--keep-order", action="store_true", help="write the records in the order of the input")
+    parser.add_argument(
+        "--offset", type=int, default=0, help="byte offset to resume the first file from (see resume_offset)"
+    )
+    args = parser.parse_args(argv)
+    logging.disable(logging.ERROR)
+
+    output = open(args.output, "a") if args.output else sys.stdout
+    bulk = BulkEvaluation(output, args.notation, args.workers, args.keep_order, args.chunk_bytes)
+    start = time.perf_counter()
+    interrupted = False
+    try:
+        for index, path in enumerate(args.files):
+            bulk.evaluate_file(path, args.offset if index == 0 else 0)
+    except KeyboardInterrupt:
+        interrupted = True
+    finally:
+        logging.disable(logging.NOTSET)
+        bulk.close()
+        if output is not sys.stdout:
+            output.close()
+    # the summary goes to stderr, so it doesn't mix with the records
+    print(json.dumps(bulk.summary(time.perf_counter() - start, interrupted)), file=sys.stderr)
+    return 130 if interrupted else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+import hashlib
+from collections import deque
+
+from compiler import PREFIX
+from tokenizer import Variable, format_literal
+
+# the notation of the cache keys of canonical expressions, shared by both notations
+CANONICAL = "canonical"
+
+# the operators whose operands can be swapped without changing the result
+COMMUTATIVE_OPERATORS = frozenset("+*")
+
+
+def _digest(*parts):
+    return hashlib.blake2b(b"\0".join(parts), digest_size=16).digest()
+
+
+def _leaf_digest(instruction):
+    if type(instruction) is Variable:
+        return _digest(b"v", instruction.name.encode())
+    return _digest(b"i", instruction.to_bytes(instruction.bit_length() // 8 + 1, "little"))
+
+
+def canonical_tree(program):
+    """Return the canonical tree of a compiled program, with the digest of its root, or None if it's malformed.
+
+    Both notations map to the same tree: literals and variables are leaves, and operators are (operator, left,
+    right) tuples with their operands in the written order, except for + and * whose operands are sorted by their
+    digest. So `+ 2 3`, `+ 3 2` and `( 3 + 2 )` share a tree, while `- 2 3` and `- 3 2` don't.
+    Each node's digest combines its operator and the digests of its children, so the tree is built in a single pass
+    over the instructions, however deep it is.
+    """
+    if program.error is not None:
+        return None
+
+    stack = deque()  # using a double ended queue as a stack of (digest, node) pairs
+    for instruction in program.instructions:
+        if type(instruction) is int or type(instruction) is Variable:
+            stack.append((_leaf_digest(instruction), instruction))
+            continue
+        # the prefix operators apply to the latest value first, the infix ones to the latest value last
+        first, second = stack.pop(), stack.pop()
+        left, right = (first, second) if program.notation == PREFIX else (second, first)
+        if instruction in COMMUTATIVE_OPERATORS and right[0] < left[0]:
+            left, right = right, left
+        digest = _digest(b"o", instruction.encode(), left[0], right[0])
+        stack.append((digest, (instruction, left[1], right[1])))
+    digest, tree = stack.pop()
+    return tree, digest
+
+
+def canonical_digest(program):
+    """Return the hex digest of the canonical tree of a compiled program, or None if it's malformed.
+
+    Equivalent expressions (up to spaces, notation and the order of the operands of + and *) have the same digest,
+    in any process, so it can key caches and deduplicate expressions.
+    """
+    canonical = canonical_tree(program)
+    return canonical[1].hex() if canonical is not None else None
+
+
+def canonical_expression(tree):
+    """Return the canonical tree as an expression in prefix notation, with single spaces between tokens."""
+    tokens = []
+    pending = [tree]
+    while pending:
+        node = pending.pop()
+        if type(node) is int:
+            tokens.append(format_literal(node))
+        elif type(node) is Variable:
+            tokens.append(node.name)
+        else:
+            operator, left, right = node
+            tokens.append(operator)
+            pending.extend((right, left))
+    return " ".join(tokens)
@@ -0,0 +1,75 @@
+import threading
+
+
+class _Call:
+    """An evaluation in progress, and its outcome once it's done."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None  # (exception type, args) of the error raised by the evaluation
+        self.completed = False  # whether it returned or raised an exception (rather than being interrupted)
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into a single call of the function.
+
+    The first caller of a key runs the function, and the callers arriving while it runs wait for it and share its
+    result, or raise the same error. A waiter blocks for up to timeout seconds, then gives up and calls the function
+    itself (e.g. so a stuck evaluation doesn't hold all the identical requests).
+    """
+
+    def __init__(self, timeout=10.0):
+        self.timeout = timeout
+        self.calls = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self._in_progress = {}  # key -> _Call
+        self._lock = threading.Lock()
+
+    def do(self, key, function):
+        with self._lock:
+            call = self._in_progress.get(key)
+            if call is None:
+                call = self._in_progress[key] = _Call()
+                self.calls += 1
+                leader = True
+            else:
+                leader = False
+
+        if leader:
+            try:
+                call.result = function()
+                call.completed = True
+                return call.result
+            except Exception as e:
+                call.error = (type(e), e.args)
+                call.completed = True
+                raise
+            finally:
+                with self._lock:
+                    del self._in_progress[key]
+                call.done.set()
+
+        if not call.done.wait(self.timeout):
+            with self._lock:
+                self.timeouts += 1
+            return function()
+        if not call.completed:
+            return function()
+        with self._lock:
+            self.coalesced += 1
+        if call.error is not None:
+            error_type, error_args = call.error
+            raise error_type(*error_args)
+        return call.result
+
+    def stats(self):
+        """Return the counters of the coalesced calls."""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "timeouts": self.timeouts,
+                "in_progress": len(self._in_progress),
+            }
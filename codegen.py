@@ -0,0 +1,156 @@
+import logging
+from collections import OrderedDict, namedtuple
+from threading import Lock
+
+from compiler import COMPILERS, PREFIX, bound_value, run_program
+from operations import PREFIX_OPERATORS, cast_float_to_int_if_no_decimals
+from tokenizer import Variable
+
+logger = logging.getLogger(__name__)
+
+# the marker of the literals of a template shape, whose values are passed to the function
+SLOT = None
+
+# the programs with more instructions are run by run_program, as they're unlikely to be templates worth compiling
+MAX_TEMPLATE_INSTRUCTIONS = 10000
+
+# A compiled template: the Python function evaluating a shape of program, which takes the bindings of the variables
+# and the values of its literal slots (in the order of the instructions), the number of slots, and the number of
+# operations folded into constants when it was generated.
+Template = namedtuple("Template", ["notation", "shape", "function", "slots", "folded"])
+
+
+def template_shape(program, literal_slots=True):
+    """Return the shape of a compiled program: its instructions, with SLOT instead of each literal if literal_slots.
+
+    Programs which only differ by the values of their literals share a shape, and so a compiled function.
+    """
+    if not literal_slots:
+        return program.instructions
+    return tuple(SLOT if type(instruction) is int else instruction for instruction in program.instructions)
+
+
+def generate_source(notation, shape):
+    """Return the source of a function evaluating the shape, the constants it's bound to, its number of literal
+    slots and of folded operations.
+
+    The function runs the instructions as straight line code, with a local per stack slot, so there's neither a
+    stack nor a table lookup per operator at run time, and expressions of any depth compile. Operators over 2 known
+    values (literals of the shape which aren't slots, or folded operators) are folded into constants, unless
+    applying them raises an error, which is then raised by the function in the same order as by run_program.
+    """
+    constants = {}  # name -> value of the constants and variables the function is bound to
+    lines = []
+    slots = []
+    stack = []  # (value, known) pairs: a known int or float, or the name of the local holding the value
+    folded = 0
+
+    def operand(value, known):
+        if not known:
+            return value
+        name = f"k{len(constants)}"
+        constants[name] = value
+        return name
+
+    for instruction in shape:
+        if instruction is SLOT:
+            slots.append(f"c{len(slots)}")
+            stack.append((slots[-1], False))
+        elif type(instruction) is int:
+            stack.append((instruction, True))
+        elif type(instruction) is Variable:
+            lines.append(f"s{len(stack)} = bound_value({operand(instruction, True)}, bindings)")
+            stack.append((f"s{len(stack)}", False))
+        else:
+            first, second = stack.pop(), stack.pop()
+            # the prefix operators apply to the latest value first, the infix ones to the latest value last
+            (left, left_known), (right, right_known) = (first, second) if notation == PREFIX else (second, first)
+            if left_known and right_known:
+                try:
+                    stack.append((PREFIX_OPERATORS[instruction](left, right), True))
+                    folded += 1
+                    continue
+                except ArithmeticError:
+                    pass
+            local = f"s{len(stack)}"
+            lines.append(f"{local} = {operand(left, left_known)} {instruction} {operand(right, right_known)}")
+            stack.append((local, False))
+
+    result = operand(*stack[-1])
+    keywords = [f"{name}={name}" for name in ("bound_value", *constants)]
+    parameters = ", ".join(["bindings", *slots, "*", *keywords])
+    source = "\n".join([f"def template({parameters}):", *(f"    {line}" for line in lines), f"    return {result}"])
+    return source, constants, len(slots), folded
+
+
+class TemplateCache:
+    """A LRU cache of the functions compiled for the shapes of the programs, up to max_entries of them."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._templates = OrderedDict()  # (notation, shape) -> Template, the least recently used first
+        self._lock = Lock()
+
+    def get(self, program, literal_slots=True):
+        """Return the template of the shape of a well formed program, compiling it on first use."""
+        shape = template_shape(program, literal_slots)
+        key = (program.notation, shape)
+        with self._lock:
+            template = self._templates.get(key)
+            if template is not None:
+                self._templates.move_to_end(key)
+                self.hits += 1
+                return template
+            self.misses += 1
+
+        template = compile_template(program.notation, shape)
+        with self._lock:
+            self._templates[key] = template
+            while len(self._templates) > self.max_entries:
+                self._templates.popitem(last=False)
+        return template
+
+    def stats(self):
+        """Return the counters of the cache."""
+        with self._lock:
+            return {"entries": len(self._templates), "hits": self.hits, "misses": self.misses}
+
+
+def compile_template(notation, shape):
+    """Generate the source of the function of a shape, and compile it."""
+    source, constants, slots, folded = generate_source(notation, shape)
+    namespace = {"bound_value": bound_value, **constants}
+    exec(compile(source, f"<template {notation}>", "exec"), namespace)
+    return Template(notation, shape, namespace["template"], slots, folded)
+
+
+def run_template(template, program, bindings=None):
+    """Run the template's function on the literals of a program of its shape, as run_program would run it."""
+    if template.slots:
+        literals = [instruction for instruction in program.instructions if type(instruction) is int]
+    else:
+        literals = ()
+    try:
+        value = template.function(bindings, *literals)
+    except ZeroDivisionError as e:
+        logger.exception(e)
+        raise
+    return cast_float_to_int_if_no_decimals(value)
+
+
+templates = TemplateCache()
+
+
+def evaluate(expression, notation=PREFIX, bindings=None, variables=False, cache=templates):
+    """Compile the expression, and evaluate it with the function compiled for its shape.
+
+    The literals of expressions are slots of their template, so expressions which only differ by their literals
+    share a function. With variables, the variables are the slots, and the literals are constants to fold instead.
+    Malformed and very long expressions are evaluated by run_program.
+    """
+    program = COMPILERS[notation](expression, variables)
+    if program.error is not None or len(program.instructions) > MAX_TEMPLATE_INSTRUCTIONS:
+        return run_program(program, bindings)
+    return run_template(cache.get(program, literal_slots=not variables), program, bindings)
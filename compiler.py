@@ -0,0 +1,292 @@
+import logging
+from collections import deque, namedtuple
+
+from exceptions import (
+    InvalidCharacterError,
+    InvalidParenthesesError,
+    MalformedInfixNotationError,
+    MalformedPrefixNotationError,
+    ResourceLimitError,
+    UnboundVariableError,
+)
+from operations import INFIX_OPERATORS, PREFIX_OPERATORS, cast_float_to_int_if_no_decimals
+from tokenizer import Variable, tokenize, tokenize_reversed
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "prefix"
+INFIX = "infix"
+# infix expressions with operator precedence, whose parentheses are optional (compiled into infix programs)
+ALGEBRAIC = "algebraic"
+
+NOTATION_OPERATORS = {
+    PREFIX: PREFIX_OPERATORS,
+    INFIX: INFIX_OPERATORS,
+}
+
+# the precedence of the operators of the algebraic notation: * and / bind tighter than + and -, and all of them are
+# left associative, so "8 - 2 - 1" is "( ( 8 - 2 ) - 1 )" and "8 / 2 * 4" is "( ( 8 / 2 ) * 4 )"
+PRECEDENCE = {"+": 1, "-": 1, "*": 2, "/": 2}
+_STACK_PRECEDENCE = {**PRECEDENCE, "(": 0}
+
+# A compiled expression: the postfix instructions (ints and the values bound to variables are pushed to the stack,
+# operator chars pop the latest 2 values and push the result), and the (exception type, message) pair raised once
+# the instructions ran, if the expression is malformed.
+Program = namedtuple("Program", ["notation", "instructions", "error"])
+
+
+def compile_prefix_notation(expression, variables=False):
+    """Compile the input expression in prefix notation into a postfix program.
+
+    Traversing the tokens of a prefix expression in reverse order already yields them in postfix order, so the
+    literals and operators are emitted as they are read, while tracking the depth of the stack.
+    Errors are not raised, but recorded on the program, so running it raises them after the arithmetic that
+    precedes them (e.g. a zero division is raised before the extra values found further in the reverse traversal).
+    If variables is set, identifiers are compiled as variables, to be bound to values when running the program.
+    """
+    if expression is None or len(expression) == 0:
+        error = (MalformedPrefixNotationError, "The provided expression does not contain any characters.")
+        return Program(PREFIX, (), error)
+
+    return _compile_reversed_prefix_tokens(tokenize_reversed(expression, variables))
+
+
+def _compile_reversed_prefix_tokens(tokens):
+    instructions = []
+    error = None
+    depth = 0
+    for token in tokens:
+        if isinstance(token, (int, Variable)):
+            instructions.append(token)
+            depth += 1
+        elif token in PREFIX_OPERATORS:
+            if depth < 2:
+                error_msg = f"There are not enough values to apply the operand '{token}' on."
+                error = (MalformedPrefixNotationError, error_msg)
+                break
+            instructions.append(token)
+            depth -= 1
+        else:
+            error = (InvalidCharacterError, f"Invalid character found in expression: '{token}'.")
+            break
+    else:
+        if depth == 0:
+            error = (MalformedPrefixNotationError, "The provided expression does not contain any values.")
+        elif depth > 1:
+            error = (MalformedPrefixNotationError, "There were too many values and not enough operators.")
+
+    return Program(PREFIX, tuple(instructions), error)
+
+
+def compile_infix_notation(expression, variables=False):
+    """Compile the input expression in infix notation into a postfix program.
+
+    Pass through the tokens in order, put ( and operators in op_stack and emit the literals. When encountering a ),
+    check the latest value in op_stack is an operator, and last but one is a "(", pop both and emit the operator.
+    As for the prefix notation, errors are recorded on the program and raised when running it.
+    """
+    if expression is None or len(expression) == 0:
+        error = (MalformedInfixNotationError, "The provided expression does not contain any characters.")
+        return Program(INFIX, (), error)
+    if expression[0] != "(" or expression[-1] != ")":
+        return Program(INFIX, (), (InvalidParenthesesError, "Invalid parentheses configuration in input string."))
+
+    return _compile_infix_tokens(tokenize(expression, variables))
+
+
+def _compile_infix_tokens(tokens):
+    op_stack = deque()
+    instructions = []
+    error = None
+    depth = 0
+    for token in tokens:
+        if token == ")":
+            if len(op_stack) < 2:
+                error = (MalformedInfixNotationError, "Not enough operators/parentheses to perform the operation.")
+                break
+            top_op, next_parenthesis = op_stack.pop(), op_stack.pop()
+            if top_op not in INFIX_OPERATORS or next_parenthesis != "(":
+                error = (MalformedInfixNotationError, "Expected operator or parenthesis not found.")
+                break
+            if depth < 2:
+                error = (MalformedInfixNotationError, f"Not enough values to apply the operand '{top_op}' on.")
+                break
+            instructions.append(top_op)
+            depth -= 1
+        elif isinstance(token, (int, Variable)):
+            instructions.append(token)
+            depth += 1
+        elif token in INFIX_OPERATORS or token == "(":
+            op_stack.append(token)
+        else:
+            error = (InvalidCharacterError, f"Invalid character found in expression: '{token}'.")
+            break
+    else:
+        if op_stack or depth != 1:
+            error = (MalformedInfixNotationError, "There were too many values / operators / parentheses.")
+
+    return Program(INFIX, tuple(instructions), error)
+
+
+def compile_algebraic_notation(expression, variables=False):
+    """Compile the input expression in algebraic notation (infix, with operator precedence) into a postfix program.
+
+    The tokens are read in order with the shunting-yard algorithm: values are emitted as they are read, and an
+    operator first emits the operators of the op_stack which bind at least as tightly (up to the latest "("), then is
+    put in op_stack. A ) emits the operators up to its matching (, and the end of the expression emits the ones left.
+    Parentheses are optional, so fully parenthesized infix expressions compile into the same programs as with
+    compile_infix_notation. Malformed expressions compile into no instructions, so their error is raised without
+    running any operation.
+    """
+    if expression is None or len(expression) == 0:
+        error = (MalformedInfixNotationError, "The provided expression does not contain any characters.")
+        return Program(INFIX, (), error)
+
+    return _compile_algebraic_tokens(tokenize(expression, variables))
+
+
+def _malformed_algebraic(error_type, error_msg):
+    return Program(INFIX, (), (error_type, error_msg))
+
+
+def _missing_value(op_stack, instructions):
+    # a value (or a "(") was expected but an operator, a ) or the end of the expression was found
+    if op_stack and op_stack[-1] in PRECEDENCE:
+        error_msg = f"Not enough values to apply the operand '{op_stack[-1]}' on."
+        return _malformed_algebraic(MalformedInfixNotationError, error_msg)
+    if not instructions:
+        return _malformed_algebraic(MalformedInfixNotationError, "The provided expression does not contain any values.")
+    return _malformed_algebraic(MalformedInfixNotationError, "Expected value not found.")
+
+
+def _compile_algebraic_tokens(tokens):
+    op_stack = deque()  # using a double ended queue as a stack of operators and open parentheses
+    instructions = []
+    emit = instructions.append
+    expect_value = True  # whether the next token is a value or a (, rather than an operator or a )
+    for token in tokens:
+        if type(token) is int or type(token) is Variable:
+            if not expect_value:
+                return _malformed_algebraic(MalformedInfixNotationError, "Expected operator or parenthesis not found.")
+            emit(token)
+            expect_value = False
+        elif token in PRECEDENCE:
+            if expect_value:
+                # the operand of the previous operator is missing, else the first operand of this one
+                operator = op_stack[-1] if op_stack and op_stack[-1] in PRECEDENCE else token
+                error_msg = f"Not enough values to apply the operand '{operator}' on."
+                return _malformed_algebraic(MalformedInfixNotationError, error_msg)
+            # ( binds less tightly than any operator, so the operators are only emitted up to the latest one
+            precedence = PRECEDENCE[token]
+            while op_stack and _STACK_PRECEDENCE[op_stack[-1]] >= precedence:
+                emit(op_stack.pop())
+            op_stack.append(token)
+            expect_value = True
+        elif token == ")":
+            if expect_value:
+                return _missing_value(op_stack, instructions)
+            operator = op_stack.pop() if op_stack else None
+            while operator is not None and operator != "(":
+                emit(operator)
+                operator = op_stack.pop() if op_stack else None
+            if operator is None:
+                error_msg = "Invalid parentheses configuration in input string."
+                return _malformed_algebraic(InvalidParenthesesError, error_msg)
+        elif token == "(":
+            if not expect_value:
+                return _malformed_algebraic(MalformedInfixNotationError, "Expected operator or parenthesis not found.")
+            op_stack.append(token)
+        else:
+            return _malformed_algebraic(InvalidCharacterError, f"Invalid character found in expression: '{token}'.")
+
+    if expect_value:
+        return _missing_value(op_stack, instructions)
+    while op_stack:
+        operator = op_stack.pop()
+        if operator == "(":
+            return _malformed_algebraic(InvalidParenthesesError, "Invalid parentheses configuration in input string.")
+        emit(operator)
+    return Program(INFIX, tuple(instructions), None)
+
+
+COMPILERS = {
+    PREFIX: compile_prefix_notation,
+    INFIX: compile_infix_notation,
+    ALGEBRAIC: compile_algebraic_notation,
+}
+
+
+def compile_expression(notation, expression):
+    """Compile the expression with the compiler of its notation."""
+    return COMPILERS[notation](expression)
+
+
+def compile_tokens(notation, tokens):
+    """Compile the tokens of an expression (ints and single chars, as yielded by tokenize) into a postfix program.
+
+    Pre-tokenized expressions, such as the binary payloads of the web API, skip the scan of their chars, and compile
+    into the same program (and errors) as the expression they were read from.
+    """
+    if not tokens:
+        error_type = MalformedPrefixNotationError if notation == PREFIX else MalformedInfixNotationError
+        error = (error_type, "The provided expression does not contain any characters.")
+        # algebraic expressions compile into infix programs
+        return Program(PREFIX if notation == PREFIX else INFIX, (), error)
+    if notation == PREFIX:
+        return _compile_reversed_prefix_tokens(reversed(tokens))
+    if notation == ALGEBRAIC:
+        return _compile_algebraic_tokens(tokens)
+    if tokens[0] != "(" or tokens[-1] != ")":
+        return Program(INFIX, (), (InvalidParenthesesError, "Invalid parentheses configuration in input string."))
+    return _compile_infix_tokens(tokens)
+
+
+def bound_value(variable, bindings):
+    """Return the value bound to the variable, raising an error if there is none."""
+    try:
+        return bindings[variable.name]
+    except (KeyError, TypeError):
+        error_mgs = f"No value bound to variable '{variable.name}'."
+        logger.error(error_mgs)
+        raise UnboundVariableError(error_mgs)
+
+
+def check_value_size(value, max_bits):
+    """Raise an error if the value is an int longer than max_bits bits."""
+    if type(value) is int and value.bit_length() > max_bits:
+        error_mgs = f"An intermediate value of {value.bit_length()} bits is above the limit of {max_bits} bits."
+        logger.error(error_mgs)
+        raise ResourceLimitError(error_mgs)
+
+
+def run_program(program, bindings=None, max_bits=None):
+    """Run a compiled program and return its result.
+
+    Both notations share the same loop: operators pop the latest 2 values and apply the operation from the
+    operators table of the notation the program was compiled from, then push the result to the stack.
+    The variables of a parametric program are pushed with their value from bindings.
+    If max_bits is set, the evaluation is aborted as soon as a value gets longer than max_bits bits.
+    """
+    operators = NOTATION_OPERATORS[program.notation]
+    stack = deque()  # using a double ended queue as a stack of values
+    for instruction in program.instructions:
+        if type(instruction) is int:
+            stack.append(instruction)
+        elif type(instruction) is Variable:
+            stack.append(bound_value(instruction, bindings))
+        else:
+            try:
+                value = operators[instruction](stack.pop(), stack.pop())
+            except ZeroDivisionError as e:
+                logger.exception(e)
+                raise
+            if max_bits is not None:
+                check_value_size(value, max_bits)
+            stack.append(value)
+
+    if program.error is not None:
+        error_type, error_msg = program.error
+        logger.error(error_msg)
+        raise error_type(error_msg)
+
+    return cast_float_to_int_if_no_decimals(stack.pop())
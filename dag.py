@@ -0,0 +1,76 @@
+import logging
+from collections import deque, namedtuple
+
+from compiler import COMPILERS, NOTATION_OPERATORS, PREFIX, bound_value, check_value_size
+from operations import cast_float_to_int_if_no_decimals
+from tokenizer import Variable
+
+logger = logging.getLogger(__name__)
+
+# A compiled expression where identical subtrees are a single node. The nodes are in evaluation order: an int or a
+# variable, or an (operator, first, second) tuple applying the operator to the values of the nodes at the first and
+# second indexes, as run_program applies it to the 2 values it pops. root is the index of the node whose value is
+# the result, and deduplicated counts the nodes of the expression tree which were merged into an identical one.
+Dag = namedtuple("Dag", ["notation", "nodes", "root", "error", "deduplicated"])
+
+
+def build_dag(program):
+    """Hash-cons the instructions of a compiled program into a DAG.
+
+    Each node is looked up by its value (literals and variables) or by its operator and the indexes of its
+    children, which are already unique, so identical subtrees of any size are found with a single lookup per
+    instruction.
+    """
+    nodes = []
+    indexes = {}  # node -> its index in nodes
+    stack = deque()  # using a double ended queue as a stack of node indexes
+    for instruction in program.instructions:
+        if type(instruction) is int or type(instruction) is Variable:
+            node = instruction
+        else:
+            node = (instruction, stack.pop(), stack.pop())
+        index = indexes.get(node)
+        if index is None:
+            index = indexes[node] = len(nodes)
+            nodes.append(node)
+        stack.append(index)
+
+    root = stack.pop() if stack else None
+    return Dag(program.notation, tuple(nodes), root, program.error, len(program.instructions) - len(nodes))
+
+
+def compile_dag(expression, notation=PREFIX, variables=False):
+    """Compile the expression into a DAG, where each repeated subexpression is evaluated once."""
+    return build_dag(COMPILERS[notation](expression, variables))
+
+
+def run_dag(dag, bindings=None, max_bits=None):
+    """Evaluate each node of the DAG once, and return the value of its root.
+
+    The nodes are evaluated in the order their first copy appears in the program, so errors are raised as
+    run_program raises them (max_bits included).
+    """
+    operators = NOTATION_OPERATORS[dag.notation]
+    values = []
+    for node in dag.nodes:
+        if type(node) is int:
+            values.append(node)
+        elif type(node) is Variable:
+            values.append(bound_value(node, bindings))
+        else:
+            operator, first, second = node
+            try:
+                value = operators[operator](values[first], values[second])
+            except ZeroDivisionError as e:
+                logger.exception(e)
+                raise
+            if max_bits is not None:
+                check_value_size(value, max_bits)
+            values.append(value)
+
+    if dag.error is not None:
+        error_type, error_msg = dag.error
+        logger.error(error_msg)
+        raise error_type(error_msg)
+
+    return cast_float_to_int_if_no_decimals(values[dag.root])
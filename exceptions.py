@@ -27,3 +27,55 @@ class MalformedInfixNotationError(Exception):
     """Raised when the infix expression is malformed."""
 
     pass
+
+
+class UnboundVariableError(Exception):
+    """Raised when evaluating a parametric expression without a value for one of its variables."""
+
+    pass
+
+
+class ServerBusyError(Exception):
+    """Raised when too many expensive expressions are already waiting to be evaluated."""
+
+    pass
+
+
+class EvaluationTimeoutError(Exception):
+    """Raised when the evaluation of an expression takes longer than allowed, after cancelling it."""
+
+    pass
+
+
+class ResourceLimitError(Exception):
+    """Raised when evaluating an expression would exceed, or exceeds, the resource limits.
+
+    Examples: the estimated size of the result or cost of the multiplications is above the limits of the route, an
+    intermediate value is larger than allowed.
+    """
+
+    pass
+
+
+class InvalidPatchError(Exception):
+    """Raised when a patch of an evaluation session targets a node which isn't in its expression."""
+
+    pass
+
+
+class SessionNotFoundError(Exception):
+    """Raised when an evaluation session doesn't exist, or expired."""
+
+    pass
+
+
+class InvalidPayloadError(Exception):
+    """Raised when the binary payload of a pre-tokenized expression can't be decoded (e.g. a truncated literal)."""
+
+    pass
+
+
+class ProfilingNotAllowedError(Exception):
+    """Raised when a request asks for a profile of its evaluation without the profiling token of the server."""
+
+    pass
@@ -0,0 +1,177 @@
+import re
+import sys
+import threading
+from collections import OrderedDict, namedtuple
+
+from canonical import CANONICAL, canonical_digest
+from compiler import compile_expression, run_program
+from exceptions import (
+    InvalidCharacterError,
+    InvalidParenthesesError,
+    MalformedInfixNotationError,
+    MalformedPrefixNotationError,
+)
+
+EVALUATION_ERRORS = (
+    InvalidCharacterError,
+    InvalidParenthesesError,
+    MalformedInfixNotationError,
+    MalformedPrefixNotationError,
+    ZeroDivisionError,
+)
+
+_SPACES_RE = re.compile(r" {2,}")
+
+# a cached expression: the compiled program (None if its result came from the backing store), its result (or the
+# (exception type, message) pair it raised) and the approximate number of bytes held by the entry
+CacheEntry = namedtuple("CacheEntry", ["program", "result", "error", "size"])
+
+
+def normalize_expression(expression):
+    """Collapse runs of spaces, which only separate tokens, so equivalent expressions share a cache entry.
+
+    Binary payloads of tokens (bytes) have no spaces, and are returned as they are.
+    """
+    if isinstance(expression, bytes):
+        return expression
+    return _SPACES_RE.sub(" ", expression) if expression else ""
+
+
+def _entry_size(key, program, result):
+    size = sys.getsizeof(key[1]) + sys.getsizeof(result)
+    if program is None:
+        return size
+    size += sys.getsizeof(program.instructions)
+    return size + sum(sys.getsizeof(instruction) for instruction in program.instructions)
+
+
+class ExpressionCache:
+    """Bounded LRU cache of compiled programs and their results, keyed by notation and normalized expression.
+
+    Entries are evicted starting with the least recently used one when there are more than max_entries entries,
+    or when they hold more than max_bytes bytes altogether. Results which alone exceed max_bytes are not cached.
+    An optional backing store (with get(key) returning a (result, error) pair or None, and put(key, result, error)
+    methods, e.g. a SharedResultCache) is looked up on misses before evaluating, and gets the new results.
+    If canonicalize is set, the results of well formed expressions are also keyed by the digest of their canonical
+    tree, so an expression missing from the cache reuses the result of any equivalent one (up to the notation and
+    the order of the operands of + and *), and the backing store is keyed by that digest.
+    An optional persistent store with the same methods (e.g. a PersistentResultStore) is looked up after the backing
+    store, which gets the results found in it, and gets the new results as well.
+    """
+
+    def __init__(self, max_entries=4096, max_bytes=64 * 1024 * 1024, backing=None, canonicalize=False, store=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.backing = backing
+        self.store = store
+        self.canonicalize = canonicalize
+        self.hits = 0
+        self.misses = 0
+        self.canonical_hits = 0
+        self.evictions = 0
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def evaluate(self, notation, expression, run=run_program, compile_program=compile_expression):
+        """Return the result of the expression, compiling and running it only if it's not cached yet.
+
+        Errors raised by the expression are cached as well, and a new exception is raised on every hit.
+        """
+        key = (notation, normalize_expression(expression))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if entry is None:
+            entry = self._compute(key, run, compile_program)
+        if entry.error is not None:
+            error_type, error_msg = entry.error
+            raise error_type(error_msg)
+        return entry.result
+
+    def _compute(self, key, run, compile_program):
+        program = None  # not compiled when the result is found in the backing store
+        canonical_key = None
+        if self.canonicalize:
+            program = compile_program(*key)
+            digest = canonical_digest(program)
+            if digest is not None:
+                canonical_key = (CANONICAL, digest)
+                with self._lock:
+                    entry = self._entries.get(canonical_key)
+                    if entry is not None:
+                        self._entries.move_to_end(canonical_key)
+                        self.canonical_hits += 1
+                if entry is not None:
+                    entry = entry._replace(program=program, size=_entry_size(key, program, entry.result))
+                    self._store(key, entry)
+                    return entry
+
+        store_key = canonical_key or key
+        stored = self.backing.get(store_key) if self.backing is not None else None
+        if stored is None and self.store is not None:
+            stored = self.store.get(store_key)
+            if stored is not None and self.backing is not None:
+                self.backing.put(store_key, *stored)
+        if stored is not None:
+            result, error = stored
+        else:
+            if program is None:
+                program = compile_program(*key)
+            result, error = None, None
+            try:
+                result = run(program)
+            except EVALUATION_ERRORS as e:
+                error = (type(e), e.args[0])
+            for store in (self.backing, self.store):
+                if store is not None:
+                    store.put(store_key, result, error)
+
+        entry = CacheEntry(program, result, error, _entry_size(key, program, result))
+        if entry.size <= self.max_bytes:
+            self._store(key, entry)
+            if canonical_key is not None:
+                self._store(canonical_key, entry)
+        return entry
+
+    def _store(self, key, entry):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous.size
+            self._entries[key] = entry
+            self.size += entry.size
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= evicted.size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self):
+        """Return the counters of the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.size,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "canonical_hits": self.canonical_hits,
+                "evictions": self.evictions,
+                # the lookups answered without evaluating the expression, equivalent ones included
+                "hit_ratio": (self.hits + self.canonical_hits) / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,209 @@
+import logging
+import math
+import threading
+from array import array
+from collections import deque, namedtuple
+
+from compiler import INFIX, PREFIX
+from operations import cast_float_to_int_if_no_decimals
+from tokenizer import tokenize
+
+logger = logging.getLogger(__name__)
+
+# the largest literal a double holds exactly, along with all the ints below it
+MAX_EXACT_LITERAL = 2**53
+
+# the opcode pushing the next literal, and the opcodes of the operators
+PUSH = 0
+ADD, SUBTRACT, MULTIPLY, DIVIDE = 1, 2, 3, 4
+OPCODES = {"+": ADD, "-": SUBTRACT, "*": MULTIPLY, "/": DIVIDE}
+
+# A program compiled for the float64 mode: one opcode per instruction, the literals pushed by the PUSH opcodes, in
+# order, as doubles, and the most values its stack holds at once. Neither holds a Python object per token.
+Float64Program = namedtuple("Float64Program", ["notation", "opcodes", "literals", "max_depth"])
+
+# the stack buffer of each thread, reused across evaluations
+_buffers = threading.local()
+
+
+def stack_buffer(size):
+    """Return the stack buffer of the current thread, grown to hold at least size doubles."""
+    buffer = getattr(_buffers, "stack", None)
+    if buffer is None or len(buffer) < size:
+        buffer = _buffers.stack = array("d", bytes(8 * max(size, 1024)))
+    return buffer
+
+
+def _compile_prefix(expression):
+    opcodes = bytearray()
+    literals = array("d")
+    for token in tokenize(expression):
+        if type(token) is int:
+            if token > MAX_EXACT_LITERAL:
+                return None
+            opcodes.append(PUSH)
+            literals.append(token)
+        elif token in OPCODES:
+            opcodes.append(OPCODES[token])
+        else:
+            return None
+    # the tokens of a prefix expression are in postfix order once reversed, and the literals are pushed in reverse
+    opcodes.reverse()
+    literals.reverse()
+    depth = max_depth = 0
+    for opcode in opcodes:
+        if opcode == PUSH:
+            depth += 1
+            max_depth = max(max_depth, depth)
+        elif depth < 2:
+            return None
+        else:
+            depth -= 1
+    return Float64Program(PREFIX, bytes(opcodes), literals, max_depth) if depth == 1 else None
+
+
+def _compile_infix(expression):
+    if expression[0] != "(" or expression[-1] != ")":
+        return None
+    opcodes = bytearray()
+    literals = array("d")
+    op_stack = deque()
+    depth = max_depth = 0
+    for token in tokenize(expression):
+        if token == ")":
+            if len(op_stack) < 2 or depth < 2:
+                return None
+            operator, parenthesis = op_stack.pop(), op_stack.pop()
+            if operator not in OPCODES or parenthesis != "(":
+                return None
+            opcodes.append(OPCODES[operator])
+            depth -= 1
+        elif type(token) is int:
+            if token > MAX_EXACT_LITERAL:
+                return None
+            opcodes.append(PUSH)
+            literals.append(token)
+            depth += 1
+            max_depth = max(max_depth, depth)
+        elif token in OPCODES or token == "(":
+            op_stack.append(token)
+        else:
+            return None
+    return Float64Program(INFIX, bytes(opcodes), literals, max_depth) if depth == 1 and not op_stack else None
+
+
+def compile_float64(expression, notation=PREFIX):
+    """Compile a well formed expression whose literals are at most 2**53 for the float64 mode, or return None.
+
+    The expressions which return None are evaluated by the exact evaluators, which raise their errors.
+    """
+    if not expression:
+        return None
+    return _compile_prefix(expression) if notation == PREFIX else _compile_infix(expression)
+
+
+def run_float64(program, buffer=None):
+    """Run a float64 program, with its value stack in a preallocated array of doubles.
+
+    The buffer of the thread is used (and reused by the next runs) unless one is given, which must hold at least
+    program.max_depth doubles. Every value is a double, including the results of the operators on ints, which are
+    rounded as doubles are once they're above 2**53.
+    """
+    if buffer is None:
+        buffer = stack_buffer(program.max_depth)
+    elif len(buffer) < program.max_depth:
+        error_mgs = f"The stack buffer holds {len(buffer)} doubles, the program needs {program.max_depth}."
+        logger.error(error_mgs)
+        raise ValueError(error_mgs)
+    literals = iter(program.literals)
+    prefix = program.notation == PREFIX
+    top = -1  # the index of the latest value in the buffer
+    for opcode in program.opcodes:
+        if opcode == PUSH:
+            top += 1
+            buffer[top] = next(literals)
+            continue
+        # the prefix operators apply to the latest value first, the infix ones to the latest value last
+        if prefix:
+            left, right = buffer[top], buffer[top - 1]
+        else:
+            left, right = buffer[top - 1], buffer[top]
+        top -= 1
+        if opcode == ADD:
+            buffer[top] = left + right
+        elif opcode == SUBTRACT:
+            buffer[top] = left - right
+        elif opcode == MULTIPLY:
+            buffer[top] = left * right
+        else:
+            try:
+                buffer[top] = left / right
+            except ZeroDivisionError as e:
+                logger.exception(e)
+                raise
+    return buffer[top]
+
+
+def _evaluate_infix(expression, buffer):
+    """Evaluate an infix expression while reading its tokens, as evaluate_infix_notation does, or return None."""
+    if expression[0] != "(" or expression[-1] != ")":
+        return None
+    op_stack = deque()
+    top = -1  # the index of the latest value in the buffer
+    size = len(buffer)
+    for token in tokenize(expression):
+        if type(token) is int:
+            if token > MAX_EXACT_LITERAL:
+                return None
+            top += 1
+            if top == size:
+                # the depth of the stack isn't known in advance, so the buffer is doubled (in place) when it's full
+                buffer.extend(array("d", bytes(8 * size)))
+                size *= 2
+            buffer[top] = token
+        elif token == ")":
+            if len(op_stack) < 2 or top < 1:
+                return None
+            operator, parenthesis = op_stack.pop(), op_stack.pop()
+            if parenthesis != "(":
+                return None
+            right = buffer[top]
+            top -= 1
+            if operator == "+":
+                buffer[top] += right
+            elif operator == "-":
+                buffer[top] -= right
+            elif operator == "*":
+                buffer[top] *= right
+            elif operator == "/":
+                try:
+                    buffer[top] /= right
+                except ZeroDivisionError as e:
+                    logger.exception(e)
+                    raise
+            else:
+                return None
+        elif token in OPCODES or token == "(":
+            op_stack.append(token)
+        else:
+            return None
+    return buffer[top] if top == 0 and not op_stack else None
+
+
+def evaluate_float64(expression, notation=PREFIX, buffer=None):
+    """Evaluate the expression in the float64 mode, returning None if it has to be evaluated exactly.
+
+    That's the case of malformed expressions, of those with a literal above 2**53, and of those whose result
+    overflows the doubles. Prefix expressions are compiled first, as their tokens are evaluated in reverse order,
+    while infix ones are evaluated as their tokens are read, without holding them.
+    """
+    if not expression:
+        return None
+    if notation == PREFIX:
+        program = compile_float64(expression, notation)
+        value = run_float64(program, buffer) if program is not None else None
+    else:
+        value = _evaluate_infix(expression, buffer if buffer is not None else stack_buffer(1024))
+    if value is None or not math.isfinite(value):
+        return None
+    return cast_float_to_int_if_no_decimals(value)
@@ -0,0 +1,95 @@
+import logging
+from collections import deque, namedtuple
+
+from exceptions import ResourceLimitError
+from tokenizer import Variable
+
+logger = logging.getLogger(__name__)
+
+# python ints are stored in 30 bits digits, and multiplied with karatsuba above 70 digits
+_DIGIT_BITS = 30
+_KARATSUBA_CUTOFF = 70
+# floats (divisions and the values bound to variables) are counted as 64 bits values
+_FLOAT_BITS = 64
+
+# The estimated size of the result and of the largest intermediate value (upper bounds, in bits, ignoring signs),
+# and the estimated cost of the arithmetic, in operations on python int digits.
+Cost = namedtuple("Cost", ["result_bits", "max_bits", "cost"])
+
+# The limits of the cost of the expressions evaluated by a route, None meaning no limit.
+CostLimits = namedtuple("CostLimits", ["max_bits", "max_cost"])
+
+
+def _digits(bits):
+    return bits // _DIGIT_BITS + 1
+
+
+def multiplication_cost(a_bits, b_bits):
+    """Estimate the digit operations to multiply two ints, as python does (schoolbook, then karatsuba)."""
+    small, large = sorted((_digits(a_bits), _digits(b_bits)))
+    if small < _KARATSUBA_CUTOFF:
+        return small * large
+    # unbalanced operands are multiplied by slices of the size of the smaller one
+    return int(large * small**0.585)
+
+
+def estimate_instructions(program):
+    """Yield the estimated (bits, is float, cost) of the value computed by each instruction of a compiled program.
+
+    The sizes are upper bounds from the sizes of the operands: an addition or subtraction is at most 1 bit longer
+    than its longest operand, and a product at most as long as both operands together. Divisions return floats,
+    and operations on floats cost next to nothing, but dividing big ints costs about as much as multiplying them.
+    Whether a value is a float is exact, as only divisions (and the values bound to variables) introduce floats.
+    """
+    stack = deque()  # using a double ended queue as a stack of (bits, is float) pairs
+    for instruction in program.instructions:
+        if type(instruction) is int:
+            estimate = (instruction.bit_length(), False, 0)
+        elif type(instruction) is Variable:
+            estimate = (_FLOAT_BITS, True, 0)
+        else:
+            (a_bits, a_float), (b_bits, b_float) = stack.pop(), stack.pop()
+            if a_float or b_float:
+                # ints are converted to floats, in a single pass over their digits
+                estimate = (_FLOAT_BITS, True, 1)
+            elif instruction == "/":
+                estimate = (_FLOAT_BITS, True, multiplication_cost(a_bits, b_bits))
+            elif instruction == "*":
+                estimate = (a_bits + b_bits, False, multiplication_cost(a_bits, b_bits))
+            else:
+                bits = max(a_bits, b_bits) + 1
+                estimate = (bits, False, _digits(bits))
+        stack.append(estimate[:2])
+        yield estimate
+
+
+def estimate_cost(program):
+    """Estimate the size of the values and the cost of running a compiled program, without running it.
+
+    See estimate_instructions. The instructions preceding an error are estimated as well, since they run before
+    it's raised.
+    """
+    result_bits = max_bits = cost = 0
+    for bits, is_float, instruction_cost in estimate_instructions(program):
+        result_bits = bits
+        if not is_float:
+            max_bits = max(max_bits, bits)
+        cost += instruction_cost
+    return Cost(result_bits, max_bits, cost)
+
+
+def check_cost(program, limits):
+    """Raise an error if the estimated cost of running the program exceeds the limits, and return the estimate."""
+    estimate = estimate_cost(program)
+    if limits.max_bits is not None and estimate.max_bits > limits.max_bits:
+        error_mgs = (
+            f"The values of the expression could reach {estimate.max_bits} bits, above the limit of "
+            f"{limits.max_bits} bits."
+        )
+        logger.error(error_mgs)
+        raise ResourceLimitError(error_mgs)
+    if limits.max_cost is not None and estimate.cost > limits.max_cost:
+        error_mgs = f"The estimated cost of the expression ({estimate.cost}) is above the limit of {limits.max_cost}."
+        logger.error(error_mgs)
+        raise ResourceLimitError(error_mgs)
+    return estimate
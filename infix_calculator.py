@@ -1,36 +1,59 @@
+import argparse
 import logging
+import sys
 from collections import deque
 
+from compiler import INFIX, check_value_size, compile_algebraic_notation, run_program
 from exceptions import (
     InvalidCharacterError,
     InvalidParenthesesError,
     MalformedInfixNotationError,
 )
+from float64 import evaluate_float64
 from operations import INFIX_OPERATORS, cast_float_to_int_if_no_decimals
+from streaming import open_expression
+from tokenizer import CHUNK_SIZE, StreamTokenizer, format_value, tokenize
 
 logger = logging.getLogger(__name__)
 
 
-def evaluate_infix_notation(expression):
+def evaluate_infix_notation(expression, float64=False):
     """Evaluate the input expression in infix notation.
 
-    Pass through the expression in order, put ( and operators in op_stack, and operands in val_stack.
+    Pass through the tokens of the expression in order, put ( and operators in op_stack, and operands in val_stack.
     When encountering a ), check the latest value in the operators stack is an operand, and last but one
-    is a "(". Pop both, and use the operand on the latest 2 values in val_stack, and add the result to
-    val_stack on the next " " char.
-    Raises errors for some malformed expressions (but assumes proper spacing).
+    is a "(". Pop both, use the operand on the latest 2 values in val_stack, and push the result to val_stack.
+    Raises errors for some malformed expressions (runs of spaces only separate tokens).
+    With float64, the expression is evaluated with machine doubles instead (see float64.py), unless it's malformed,
+    has a literal above 2**53 or overflows the doubles.
     """
-    op_stack = deque()  # using a double ended queue as a stack of operations/parentheses
-    val_stack = deque()  # using a double ended queue as a stack of values
-    value = None
-
+    if float64:
+        value = evaluate_float64(expression, INFIX)
+        if value is not None:
+            return value
     if expression is None or len(expression) == 0:
         raise MalformedInfixNotationError("The provided expression does not contain any characters.")
     if expression[0] != "(" or expression[-1] != ")":
         raise InvalidParenthesesError("Invalid parentheses configuration in input string.")
 
-    for c in expression:
-        if c == ")":
+    return _evaluate_infix_tokens(tokenize(expression))
+
+
+def evaluate_algebraic_notation(expression):
+    """Evaluate the input expression in infix notation with operator precedence, whose parentheses are optional.
+
+    The expression is compiled with the shunting-yard algorithm (see compile_algebraic_notation), then run as the
+    programs of the other notations are, so "1 + 2 * 3" is 7, and "( 1 + 2 ) * 3" is 9.
+    """
+    return run_program(compile_algebraic_notation(expression))
+
+
+def _evaluate_infix_tokens(tokens, max_bits=None):
+    op_stack = deque()  # using a double ended queue as a stack of operations/parentheses
+    val_stack = deque()  # using a double ended queue as a stack of values
+
+    for token in tokens:
+        if token == ")":
             try:
                 top_op, next_parenthesis = op_stack.pop(), op_stack.pop()
             except IndexError as e:
@@ -42,7 +65,7 @@ def evaluate_infix_notation(expression):
                 raise MalformedInfixNotationError(f"Expected operator or parenthesis not found.")
 
             operation = INFIX_OPERATORS[top_op]
-            # apply operator to the latest 2 values from the val_stack, but only push result to stack on next space char
+            # apply operator to the latest 2 values from the val_stack, and push the result to val_stack
             try:
                 value = operation(val_stack.pop(), val_stack.pop())
             except IndexError as e:
@@ -52,36 +75,75 @@ def evaluate_infix_notation(expression):
             except ZeroDivisionError as e:
                 logger.exception(e)
                 raise
+            if max_bits is not None:
+                check_value_size(value, max_bits)
+            val_stack.append(value)
+        elif type(token) is int:
+            val_stack.append(token)
         # add operands and open parentheses to the op_stack
-        elif c in INFIX_OPERATORS.keys() or c == "(":
-            op_stack.append(c)
+        elif token in INFIX_OPERATORS or token == "(":
+            op_stack.append(token)
         else:
-            if c.isdigit():
-                if value is None:
-                    value = 0
-                value = value * 10 + int(c)
-            elif c == " ":
-                # always push calculated value in the stack on the next space
-                if value is not None:
-                    val_stack.append(value)
-                value = None
-            else:
-                error_mgs = f"Invalid character found in expression: '{c}'."
-                logger.error(error_mgs)
-                raise InvalidCharacterError(error_mgs)
-
-    # if any of the stacks is not empty at the end, raise an exception
-    if val_stack or op_stack:
+            error_mgs = f"Invalid character found in expression: '{token}'."
+            logger.error(error_mgs)
+            raise InvalidCharacterError(error_mgs)
+
+    # if any of the stacks is not empty at the end (except for the result), raise an exception
+    if len(val_stack) != 1 or op_stack:
         error_mgs = "There were too many values / operators / parentheses."
         logger.error(error_mgs)
         raise MalformedInfixNotationError(error_mgs)
 
-    # return the latest calculated value - we haven't pushed it to the val_stack yet
-    # since there is no space char on which to do it
-    return cast_float_to_int_if_no_decimals(value)
+    return cast_float_to_int_if_no_decimals(val_stack.pop())
+
+
+def _parenthesized_tokens(tokens):
+    """Yield the tokens read from a stream, checking its first and last chars as evaluate_infix_notation does."""
+    for token in tokens:
+        if tokens.first_char != "(":
+            break
+        yield token
+
+    if tokens.first_char is None:
+        raise MalformedInfixNotationError("The provided expression does not contain any characters.")
+    if tokens.first_char != "(" or tokens.last_char != ")":
+        raise InvalidParenthesesError("Invalid parentheses configuration in input string.")
+
+
+def evaluate_infix_stream(stream, chunk_size=CHUNK_SIZE, max_bits=None):
+    """Evaluate an expression in infix notation read from a stream, in a single forward pass.
+
+    The evaluation is the same as evaluate_infix_notation's, which already reads the expression in order, so only
+    the stacks are kept in memory and the memory used depends on the nesting depth instead of the length.
+    The last char of the expression is only checked once the whole stream is read.
+    If max_bits is set, the evaluation is aborted as soon as a value gets longer than max_bits bits.
+    """
+    return _evaluate_infix_tokens(_parenthesized_tokens(StreamTokenizer(stream, chunk_size)), max_bits)
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Evaluate expressions in infix notation.")
+    parser.add_argument(
+        "file",
+        nargs="?",
+        help="evaluate the expression in this file (- for stdin) in a single streaming pass, instead of prompting",
+    )
+    args = parser.parse_args()
+    if args.file:
+        with open_expression(args.file) as stream:
+            try:
+                print(format_value(evaluate_infix_stream(stream)))
+            except (
+                InvalidCharacterError,
+                InvalidParenthesesError,
+                MalformedInfixNotationError,
+                ArithmeticError,
+                UnicodeDecodeError,
+            ) as e:
+                print(f"Failed to evaluate expression: {e}")
+                return 1
+        return 0
+
     print("Type 'exit' to end program.")
     while True:
         expression = input("Please enter an infix expression with full parentheses to be evaluated: ")
@@ -89,10 +151,11 @@ def main():
             break
         try:
             result = evaluate_infix_notation(expression)
-            print(f"The result of evaluating expression {expression} in infix notation is {result}.")
-        except (InvalidCharacterError, InvalidParenthesesError, MalformedInfixNotationError, ZeroDivisionError) as e:
+            print(f"The result of evaluating expression {expression} in infix notation is {format_value(result)}.")
+        except (InvalidCharacterError, InvalidParenthesesError, MalformedInfixNotationError, ArithmeticError) as e:
             print(f"Failed to evaluate expression: {e}")
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,62 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter
+
+# the values interpolated in the error messages (the quoted tokens, and the numbers), which vary from one expression
+# to the next while the template of the message doesn't
+_QUOTED_RE = re.compile(r"'[^']*'")
+_NUMBER_RE = re.compile(r"[0-9]+")
+
+
+def record_kind(record):
+    """Return the kind of an error record: the class of its exception, else the template of its message.
+
+    The messages are logged formatted, so their template is the message with its quoted values and numbers masked.
+    """
+    if record.exc_info and record.exc_info[0]:
+        return record.exc_info[0].__name__
+    return _NUMBER_RE.sub("*", _QUOTED_RE.sub("'*'", str(record.msg)))
+
+
+class ErrorLogSampler(logging.Filter):
+    """Rate limit the error records of the loggers it's added to, counting them by exception class.
+
+    Each kind of record (the class of its exception for logger.exception, else the template of its message) gets a
+    bucket of `burst` records, refilled with `rate` records per second: the records beyond it are dropped before any
+    handler formats them (and their traceback). The records of lower levels are always logged.
+    """
+
+    def __init__(self, rate=1.0, burst=10, clock=time.monotonic):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.logged = Counter()
+        self.suppressed = Counter()
+        self._buckets = {}  # kind -> (tokens, time of the last refill)
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < logging.ERROR:
+            return True
+        kind = record_kind(record)
+        now = self.clock()
+        with self._lock:
+            tokens, last = self._buckets.get(kind, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            allowed = tokens >= 1
+            self._buckets[kind] = (tokens - 1 if allowed else tokens, now)
+            (self.logged if allowed else self.suppressed)[kind] += 1
+        return allowed
+
+    def install(self, logger_names):
+        """Add the sampler to the loggers of these names."""
+        for name in logger_names:
+            logging.getLogger(name).addFilter(self)
+
+    def stats(self):
+        """Return the number of records logged and suppressed, by kind."""
+        with self._lock:
+            return {"logged": dict(self.logged), "suppressed": dict(self.suppressed)}
@@ -0,0 +1,158 @@
+import threading
+from bisect import bisect_left
+from threading import get_ident
+
+# latency buckets, in seconds
+DURATION_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# size buckets, in chars or bits
+SIZE_BUCKETS = (8, 16, 32, 64, 128, 256, 512, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def _format_labels(names, values, extra=""):
+    labels = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _ThreadShards:
+    """Values kept per thread, so that recording them takes no lock, and summed up when read.
+
+    The shards are keyed by thread identifier, which the new threads reuse, so they don't pile up with the threads.
+    """
+
+    def __init__(self):
+        self._shards = {}  # thread identifier -> {label values -> value}
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        with self._lock:
+            values = self._shards[get_ident()] = {}
+        return values
+
+    def _snapshots(self):
+        with self._lock:
+            return [dict(values) for values in self._shards.values()]
+
+
+class Counter(_ThreadShards):
+    """Counter with labels, rendered in the Prometheus text format."""
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__()
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+
+    def inc(self, *label_values, amount=1):
+        values = self._shards.get(get_ident())
+        if values is None:
+            values = self._shard()
+        values[label_values] = values.get(label_values, 0) + amount
+
+    def _totals(self):
+        totals = {}
+        for values in self._snapshots():
+            for label_values, value in values.items():
+                totals[label_values] = totals.get(label_values, 0) + value
+        return totals
+
+    def value(self, *label_values):
+        return self._totals().get(label_values, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self._totals().items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}")
+        return lines
+
+
+class Gauge:
+    """Gauge whose labelled values are read from a function when rendered."""
+
+    type = "gauge"
+
+    def __init__(self, name, documentation, read, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.read = read  # returns a {label values: value} dict
+        self.labels = labels
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for label_values, value in sorted(self.read().items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}")
+        return lines
+
+
+class CallbackCounter(Gauge):
+    """Counter whose labelled values are read from a function when rendered, for the counts kept elsewhere (e.g. by
+    the caches), which only ever increase."""
+
+    type = "counter"
+
+
+class Histogram(_ThreadShards):
+    """Histogram with labels and fixed buckets, rendered in the Prometheus text format."""
+
+    def __init__(self, name, documentation, buckets, labels=()):
+        super().__init__()
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labels = labels
+
+    def observe(self, value, *label_values):
+        values = self._shards.get(get_ident())
+        if values is None:
+            values = self._shard()
+        counts = values.get(label_values)
+        if counts is None:
+            counts = values[label_values] = [0] * (len(self.buckets) + 2)
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def _totals(self):
+        totals = {}  # label values -> [count per bucket (the last one being +Inf), sum]
+        for values in self._snapshots():
+            for label_values, counts in values.items():
+                total = totals.setdefault(label_values, [0] * (len(self.buckets) + 2))
+                for index, count in enumerate(list(counts)):
+                    total[index] += count
+        return totals
+
+    def count(self, *label_values):
+        counts = self._totals().get(label_values)
+        return sum(counts[:-1]) if counts else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for label_values, counts in sorted(self._totals().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(float(counts[-1]))}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """The metrics exposed together on a /metrics endpoint."""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Return all the metrics in the Prometheus text exposition format."""
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
@@ -0,0 +1,164 @@
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from collections import namedtuple
+
+from compiler import run_program
+from exceptions import EvaluationTimeoutError, ServerBusyError
+
+logger = logging.getLogger(__name__)
+
+# a worker process, and the connection used to send it programs and receive their results
+Worker = namedtuple("Worker", ["process", "connection"])
+
+
+def is_expensive(program, min_instructions=10000, min_literal_bits=64 * 1024):
+    """Pre-scan a compiled program to decide whether it's worth evaluating in a worker process.
+
+    Programs with many instructions, or with big literals (whose products are costly), are expensive.
+    """
+    if len(program.instructions) >= min_instructions:
+        return True
+    literals = (instruction for instruction in program.instructions if type(instruction) is int)
+    return any(literal.bit_length() >= min_literal_bits for literal in literals)
+
+
+def _work(connection):
+    """Loop of the worker processes: run the programs received on the connection and send back their results.
+
+    The programs come with the max_bits of their evaluation (see run_program).
+    """
+    while True:
+        try:
+            program, max_bits = connection.recv()
+        except EOFError:
+            return
+        try:
+            connection.send((True, run_program(program, max_bits=max_bits)))
+        except Exception as e:
+            connection.send((False, e))
+
+
+class EvaluationPool:
+    """Bounded pool of worker processes, which evaluate expensive programs without blocking the serving threads.
+
+    At most workers programs are evaluated at once, and up to max_queue more wait for a worker. Beyond that, a
+    ServerBusyError is raised straight away. A program not evaluated within the timeout is cancelled by killing
+    the worker process evaluating it (which is replaced), and an EvaluationTimeoutError is raised.
+    """
+
+    def __init__(self, workers=2, max_queue=16, timeout=30.0):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.pending = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self._started = 0
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._context = multiprocessing.get_context("spawn")
+
+    def _spawn(self):
+        connection, worker_connection = self._context.Pipe()
+        process = self._context.Process(target=_work, args=(worker_connection,), daemon=True)
+        process.start()
+        worker_connection.close()
+        return Worker(process, connection)
+
+    def start(self):
+        """Start all the worker processes now, instead of when they are first needed."""
+        with self._lock:
+            missing = self.workers - self._started
+            self._started = self.workers
+        for _ in range(missing):
+            self._idle.put(self._spawn())
+
+    def _acquire(self, deadline):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            spawn = self._started < self.workers
+            if spawn:
+                self._started += 1
+        if spawn:
+            return self._spawn()
+        try:
+            return self._idle.get(timeout=max(deadline - time.monotonic(), 0))
+        except queue.Empty:
+            self._timed_out("Timed out waiting for a worker to evaluate the expression.")
+
+    def _discard(self, worker):
+        worker.process.kill()
+        worker.process.join()
+        worker.connection.close()
+        with self._lock:
+            self._started -= 1
+
+    def _timed_out(self, error_mgs):
+        with self._lock:
+            self.timeouts += 1
+        logger.error(error_mgs)
+        raise EvaluationTimeoutError(error_mgs)
+
+    def run(self, program, timeout=None, max_bits=None):
+        """Evaluate the program in a worker process and return its result, or raise its error.
+
+        If max_bits is set, the evaluation is aborted as soon as a value gets longer than max_bits bits.
+        """
+        with self._lock:
+            if self.pending >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise ServerBusyError("Too many expressions are waiting to be evaluated.")
+            self.pending += 1
+
+        try:
+            deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+            worker = self._acquire(deadline)
+            try:
+                worker.connection.send((program, max_bits))
+                if not worker.connection.poll(max(deadline - time.monotonic(), 0)):
+                    self._discard(worker)
+                    worker = None
+                    self._timed_out("The evaluation of the expression timed out and was cancelled.")
+                succeeded, value = worker.connection.recv()
+            except (EOFError, OSError):
+                # the worker died, e.g. it ran out of memory
+                if worker is not None:
+                    self._discard(worker)
+                    worker = None
+                raise
+            finally:
+                if worker is not None:
+                    self._idle.put(worker)
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+        if not succeeded:
+            raise value
+        return value
+
+    def close(self):
+        """Stop the idle worker processes."""
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+    def stats(self):
+        """Return the counters of the pool."""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "started": self._started,
+                "pending": self.pending,
+                "max_queue": self.max_queue,
+                "timeouts": self.timeouts,
+                "rejected": self.rejected,
+            }
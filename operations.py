@@ -1,3 +1,8 @@
+try:
+    import numpy
+except ImportError:  # numpy is only needed by the vectorized operators
+    numpy = None
+
 PREFIX_OPERATORS = {
     "+": lambda a, b: a + b,
     "-": lambda a, b: a - b,
@@ -12,8 +17,40 @@ INFIX_OPERATORS = {
     "/": lambda a, b: b / a,
 }
 
+# Counterparts of the operators tables for numpy arrays, with the same operand order. Divisions return masked arrays
+# where the elements divided by zero are masked instead of raising, and the other operators propagate the mask.
+VECTORIZED_PREFIX_OPERATORS = {
+    "+": lambda a, b: a + b,
+    "-": lambda a, b: a - b,
+    "*": lambda a, b: a * b,
+    "/": lambda a, b: numpy.ma.divide(a, b),
+}
+
+VECTORIZED_INFIX_OPERATORS = {
+    "+": lambda a, b: b + a,
+    "-": lambda a, b: b - a,
+    "*": lambda a, b: b * a,
+    "/": lambda a, b: numpy.ma.divide(b, a),
+}
+
 
 def cast_float_to_int_if_no_decimals(value):
     """Casts floats with no decimals to their equivalent int values."""
 
     return int(value) if isinstance(value, float) and value.is_integer() else value
+
+
+def cast_float_array_to_int_if_no_decimals(values):
+    """Casts masked arrays of floats with no decimals to arrays of ints, as cast_float_to_int_if_no_decimals does.
+
+    The elements of an array share their dtype, so an array is only cast if none of its (unmasked) elements has
+    decimals or is out of the range of int64, else all its elements stay floats.
+    """
+    if values.dtype.kind != "f":
+        return values
+    filled = values.filled(0)
+    if not (numpy.all(numpy.isfinite(filled)) and numpy.all(filled == numpy.trunc(filled))):
+        return values
+    if filled.size and numpy.max(numpy.abs(filled)) >= 2**63:
+        return values
+    return numpy.ma.masked_array(filled.astype(numpy.int64), mask=numpy.ma.getmaskarray(values))
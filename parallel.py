@@ -0,0 +1,161 @@
+import heapq
+import logging
+import os
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from compiler import COMPILERS, NOTATION_OPERATORS, PREFIX, Program, check_value_size, run_program
+from governor import estimate_instructions
+from offload import EvaluationPool
+from operations import cast_float_to_int_if_no_decimals
+from tokenizer import Variable
+
+logger = logging.getLogger(__name__)
+
+# An independent subtree of a compiled program: its instructions are program.instructions[start:end], and is_float
+# tells whether its value is a float (which is known before evaluating it).
+Subtree = namedtuple("Subtree", ["start", "end", "cost", "is_float"])
+
+
+def split_program(program, min_cost, max_subtrees):
+    """Return up to max_subtrees independent subtrees of the program, each estimated to cost at least min_cost.
+
+    In postfix order, each subtree is a contiguous slice of the instructions. Starting from the whole tree, the
+    costliest subtree is replaced by its 2 operands until there are max_subtrees subtrees, or its operands all cost less
+    than min_cost, and the subtrees costing at least min_cost are returned in the order of their instructions.
+    Malformed and parametric programs are not split.
+    """
+    if program.error is not None or any(type(instruction) is Variable for instruction in program.instructions):
+        return []
+
+    starts = []  # the index of the first instruction of the subtree of each instruction
+    operands = {}  # operator index -> the indexes of its operands
+    totals = []  # the estimated cost of the subtree of each instruction
+    floats = []
+    stack = deque()  # using a double ended queue as a stack of instruction indexes
+    for index, (_, is_float, cost) in enumerate(estimate_instructions(program)):
+        if type(program.instructions[index]) is int:
+            starts.append(index)
+            totals.append(cost)
+        else:
+            last, first = stack.pop(), stack.pop()
+            operands[index] = (first, last)
+            starts.append(starts[first])
+            totals.append(totals[first] + totals[last] + cost)
+        floats.append(is_float)
+        stack.append(index)
+
+    frontier = [(-totals[-1], len(totals) - 1)]  # a heap of the subtrees, the costliest first
+    while len(frontier) < max_subtrees:
+        _, index = frontier[0]
+        if index not in operands or max(totals[operand] for operand in operands[index]) < min_cost:
+            break
+        first, last = operands[index]
+        heapq.heapreplace(frontier, (-totals[first], first))
+        heapq.heappush(frontier, (-totals[last], last))
+
+    return sorted(
+        Subtree(starts[index], index + 1, -cost, floats[index]) for cost, index in frontier if -cost >= min_cost
+    )
+
+
+class ParallelEvaluator:
+    """Evaluate the costly independent subtrees of big expressions in parallel, in a pool of worker processes.
+
+    The subtrees are evaluated by an EvaluationPool, and their results (big ints are pickled in their binary form)
+    are combined in this process, by the operators above them. The result is the same as run_program's: the values
+    of float subtrees are turned back into floats (the workers apply cast_float_to_int_if_no_decimals to them), and
+    errors are raised in the order of the instructions.
+    """
+
+    def __init__(self, workers=None, min_cost=10**6, timeout=30.0):
+        self.workers = workers or os.cpu_count() or 1
+        self.min_cost = min_cost
+        self.pool = EvaluationPool(workers=self.workers, max_queue=0, timeout=timeout)
+        # the subtrees wait for a worker in this executor, rather than being rejected by the pool
+        self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        self._futures = set()  # the subtrees submitted to the executor and not done yet, cancelled on close
+        self.parallel_runs = 0
+        self.subtrees = 0
+        self._lock = threading.Lock()
+
+    def _run_subtree(self, program, subtree, max_bits):
+        subprogram = Program(program.notation, program.instructions[subtree.start:subtree.end], None)
+        value = self.pool.run(subprogram, max_bits=max_bits)
+        return float(value) if subtree.is_float else value
+
+    def run(self, program, max_bits=None):
+        """Run a compiled program, evaluating its costly independent subtrees in parallel if it has at least 2.
+
+        If max_bits is set, the evaluation is aborted as soon as a value gets longer than max_bits bits, in the worker
+        processes as in this process.
+        """
+        subtrees = split_program(program, self.min_cost, self.workers)
+        if len(subtrees) < 2:
+            return run_program(program, max_bits=max_bits)
+
+        with self._lock:
+            self.parallel_runs += 1
+            self.subtrees += len(subtrees)
+        futures = {subtree.start: (subtree, self._submit(program, subtree, max_bits)) for subtree in subtrees}
+        try:
+            return self._combine(program, futures, max_bits)
+        finally:
+            for _, future in futures.values():
+                future.cancel()
+
+    def _submit(self, program, subtree, max_bits):
+        future = self._executor.submit(self._run_subtree, program, subtree, max_bits)
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._discard)
+        return future
+
+    def _discard(self, future):
+        with self._lock:
+            self._futures.discard(future)
+
+    def _combine(self, program, futures, max_bits):
+        operators = NOTATION_OPERATORS[program.notation]
+        stack = deque()  # using a double ended queue as a stack of values
+        index = 0
+        while index < len(program.instructions):
+            if index in futures:
+                subtree, future = futures[index]
+                stack.append(future.result())
+                index = subtree.end
+                continue
+            instruction = program.instructions[index]
+            if type(instruction) is int:
+                stack.append(instruction)
+            else:
+                try:
+                    value = operators[instruction](stack.pop(), stack.pop())
+                except ZeroDivisionError as e:
+                    logger.exception(e)
+                    raise
+                if max_bits is not None:
+                    check_value_size(value, max_bits)
+                stack.append(value)
+            index += 1
+        return cast_float_to_int_if_no_decimals(stack.pop())
+
+    def evaluate(self, expression, notation=PREFIX):
+        """Compile and evaluate the expression."""
+        return self.run(COMPILERS[notation](expression))
+
+    def close(self):
+        """Stop the worker processes and threads, cancelling the subtrees still waiting for a thread."""
+        with self._lock:
+            futures = list(self._futures)
+        for future in futures:
+            future.cancel()
+        self._executor.shutdown(wait=True)
+        self.pool.close()
+
+    def stats(self):
+        """Return the counters of the evaluator and of its pool."""
+        with self._lock:
+            stats = {"parallel_runs": self.parallel_runs, "subtrees": self.subtrees}
+        return {**stats, "pool": self.pool.stats()}
@@ -1,74 +1,159 @@
+import argparse
 import logging
+import sys
 from collections import deque
 
+from compiler import PREFIX, check_value_size
 from exceptions import InvalidCharacterError, MalformedPrefixNotationError
+from float64 import evaluate_float64
 from operations import PREFIX_OPERATORS, cast_float_to_int_if_no_decimals
+from streaming import open_expression
+from tokenizer import CHUNK_SIZE, StreamTokenizer, format_value, tokenize_reversed
 
 logger = logging.getLogger(__name__)
 
 
-def evaluate_prefix_notation(expression):
+def evaluate_prefix_notation(expression, float64=False):
     """Evaluate the input expression in prefix notation.
 
-    While traversing the expression in reverse order, read characters until a space is encountered.
-    If the section delimited by spaces comprises of digits, convert it to int, and push it to the stack.
-    (assumption used: the input literals are positive integers). If it's one of the supported operators,
-    pop the last 2 values from the stack and apply the operation on them, then push the result to the stack.
+    While traversing the tokens of the expression in reverse order, push literals to the stack (assumption used:
+    the input literals are positive integers). If it's one of the supported operators, pop the last 2 values from
+    the stack, apply the operation on them, then push the result to the stack.
     If it's neither of these, raise an error when finding an unsupported character.
     The implementation calculates in floating point domain.
     Assumption #2: each operator takes exactly 2 args, so it's raising an exception when the number of expected
     args for an operator is not enough (more exactly, when the stack is empty), or if there are more args than
-    needed by the operators (more exactly, there are values remaining in the stack when the traversal of the
+    needed by the operators (more exactly, there is more than one value in the stack when the traversal of the
     expression ends).
 
-    The implementation focus was on doing all the work in O(n), and does not raise errors for malformed expressions
-    e.g. tokens are not properly spaced (e.g. too many spaces, or no spaces)
+    The tokenizer converts each literal in one step once its boundaries are found, so the evaluation stays O(n)
+    even for very long literals. Runs of spaces only separate tokens.
+    With float64, the expression is evaluated with machine doubles instead (see float64.py), unless it's malformed,
+    has a literal above 2**53 or overflows the doubles.
     """
+    if float64:
+        value = evaluate_float64(expression, PREFIX)
+        if value is not None:
+            return value
+
     stack = deque()  # using a double ended queue as a stack of values
-    value = 0
-    power = 0
     if expression is None or len(expression) == 0:
         raise MalformedPrefixNotationError("The provided expression does not contain any characters.")
 
-    for c in expression[::-1]:
-        if c in PREFIX_OPERATORS.keys():
-            operation = PREFIX_OPERATORS[c]
-            # apply operator to the latest 2 values from the stack, but only push result to stack on next space char
+    for token in tokenize_reversed(expression):
+        if type(token) is int:
+            stack.append(token)
+        elif token in PREFIX_OPERATORS:
+            operation = PREFIX_OPERATORS[token]
+            # apply operator to the latest 2 values from the stack, and push the result to the stack
             try:
                 value = operation(stack.pop(), stack.pop())
             except IndexError as e:
                 # if the stack is empty, raise an error
                 logger.exception(e)
-                raise MalformedPrefixNotationError(f"There are not enough values to apply the operand '{c}' on.")
+                raise MalformedPrefixNotationError(f"There are not enough values to apply the operand '{token}' on.")
             except ZeroDivisionError as e:
                 logger.exception(e)
                 raise
+            stack.append(value)
         else:
-            if c.isdigit():
-                value += int(c) * 10 ** power
-                power += 1
-            elif c == " ":
-                # always push calculated value in the stack on the next space (while reading backwards)
-                stack.append(value)
-                value = 0
-                power = 0
-            else:
-                error_mgs = f"Invalid character found in expression: '{c}'."
-                logger.error(error_mgs)
-                raise InvalidCharacterError(error_mgs)
+            error_mgs = f"Invalid character found in expression: '{token}'."
+            logger.error(error_mgs)
+            raise InvalidCharacterError(error_mgs)
 
-    # if the stack is not empty at the end, raise an exception
-    if stack:
+    # if there is not exactly one value left in the stack at the end, raise an exception
+    if len(stack) > 1:
         error_mgs = "There were too many values and not enough operators."
         logger.error(error_mgs)
         raise MalformedPrefixNotationError(error_mgs)
+    if not stack:
+        error_mgs = "The provided expression does not contain any values."
+        logger.error(error_mgs)
+        raise MalformedPrefixNotationError(error_mgs)
+
+    return cast_float_to_int_if_no_decimals(stack.pop())
+
+
+def evaluate_prefix_stream(stream, chunk_size=CHUNK_SIZE, max_bits=None):
+    """Evaluate an expression in prefix notation read from a stream, in a single forward pass.
+
+    Instead of reversing the expression, keep a stack of pending operators, each with its left operand once known.
+    Every complete value (a literal, or the result of an operation) becomes the left operand of the latest pending
+    operator, or its right operand, in which case the operation is applied and its result is a complete value too.
+    Only the pending operators are kept in memory, so the memory used depends on the nesting depth of the
+    expression instead of its length.
+    As the expression is read in order, errors are raised for the first issue found from the start of the
+    expression (and not from its end as evaluate_prefix_notation does).
+    If max_bits is set, the evaluation is aborted as soon as a value gets longer than max_bits bits.
+    """
+    tokens = StreamTokenizer(stream, chunk_size)
+    pending = deque()  # using a double ended queue as a stack of [operator, left operand] pairs
+    value = None
+    done = False
+    for token in tokens:
+        if token in PREFIX_OPERATORS:
+            if done:
+                error_mgs = "There were too many values and not enough operators."
+                logger.error(error_mgs)
+                raise MalformedPrefixNotationError(error_mgs)
+            pending.append([token, None])
+            continue
+        if type(token) is not int:
+            error_mgs = f"Invalid character found in expression: '{token}'."
+            logger.error(error_mgs)
+            raise InvalidCharacterError(error_mgs)
+        if done:
+            error_mgs = "There were too many values and not enough operators."
+            logger.error(error_mgs)
+            raise MalformedPrefixNotationError(error_mgs)
+
+        value = token
+        while pending:
+            if pending[-1][1] is None:
+                pending[-1][1] = value
+                break
+            operator, left = pending.pop()
+            try:
+                value = PREFIX_OPERATORS[operator](left, value)
+            except ZeroDivisionError as e:
+                logger.exception(e)
+                raise
+            if max_bits is not None:
+                check_value_size(value, max_bits)
+        else:
+            done = True
+
+    if tokens.first_char is None:
+        raise MalformedPrefixNotationError("The provided expression does not contain any characters.")
+    if pending:
+        error_mgs = f"There are not enough values to apply the operand '{pending[-1][0]}' on."
+        logger.error(error_mgs)
+        raise MalformedPrefixNotationError(error_mgs)
+    if not done:
+        error_mgs = "The provided expression does not contain any values."
+        logger.error(error_mgs)
+        raise MalformedPrefixNotationError(error_mgs)
 
-    # return the latest calculated value - we haven't pushed it to the stack yet
-    # since there is no preceding "space" on which to do it
     return cast_float_to_int_if_no_decimals(value)
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Evaluate expressions in prefix notation.")
+    parser.add_argument(
+        "file",
+        nargs="?",
+        help="evaluate the expression in this file (- for stdin) in a single streaming pass, instead of prompting",
+    )
+    args = parser.parse_args()
+    if args.file:
+        with open_expression(args.file) as stream:
+            try:
+                print(format_value(evaluate_prefix_stream(stream)))
+            except (InvalidCharacterError, MalformedPrefixNotationError, ArithmeticError, UnicodeDecodeError) as e:
+                print(f"Failed to evaluate expression: {e}")
+                return 1
+        return 0
+
     print("Type 'exit' to end program.")
     while True:
         expression = input("Please enter a prefix expression to be evaluated: ")
@@ -76,10 +161,11 @@ def main():
             break
         try:
             result = evaluate_prefix_notation(expression)
-            print(f"The result of evaluating expression {expression} in prefix notation is {result}.")
-        except (InvalidCharacterError, MalformedPrefixNotationError, ZeroDivisionError) as e:
+            print(f"The result of evaluating expression {expression} in prefix notation is {format_value(result)}.")
+        except (InvalidCharacterError, MalformedPrefixNotationError, ArithmeticError) as e:
             print(f"Failed to evaluate expression: {e}")
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,147 @@
+import cProfile
+import logging
+from collections import deque
+from time import perf_counter
+
+from compiler import INFIX, NOTATION_OPERATORS, PREFIX, check_value_size, compile_tokens
+from operations import cast_float_to_int_if_no_decimals
+
+logger = logging.getLogger(__name__)
+
+# the operations on ints longer than this are big int arithmetic, the others fit in a few machine words
+BIG_INT_BITS = 64
+
+
+def op_stack_peak(tokens):
+    """Return the peak depth of the stack of operators and parentheses of the infix evaluator over the tokens."""
+    depth = peak = 0
+    for token in tokens:
+        if token == ")":
+            depth -= 2
+        elif type(token) is not int:
+            depth += 1
+            peak = max(peak, depth)
+    return peak
+
+
+class EvaluationProfiler:
+    """Evaluate an expression as the webapp does inline, recording where the time goes.
+
+    The summary has the time spent tokenizing (and compiling) the expression, applying the operators and, among
+    that time, in big int arithmetic (operations on ints longer than BIG_INT_BITS bits), the peak depth of the
+    stacks of the evaluator of the notation (stack for prefix, op_stack and val_stack for infix) and the size of the
+    largest int value.
+    """
+
+    def __init__(self, notation):
+        self.notation = notation
+        self.tokenize_seconds = 0.0
+        self.operator_seconds = 0.0
+        self.big_int_seconds = 0.0
+        self.instructions = 0
+        self.peak_depths = {}
+        self.max_bits = 0
+        self.path = None
+
+    def compile(self, compile_program, expression, read_tokens=None):
+        """Compile the expression, timing it.
+
+        With read_tokens (a function returning the list of tokens of the expression), an infix expression is compiled
+        from the tokens it returns, whose op_stack is measured too, so the expression is only tokenized once.
+        """
+        start = perf_counter()
+        if self.notation == INFIX and read_tokens is not None:
+            tokens = read_tokens(expression)
+            program = compile_tokens(self.notation, tokens)
+        else:
+            tokens = None
+            program = compile_program(self.notation, expression)
+        self.tokenize_seconds = perf_counter() - start
+        self.instructions = len(program.instructions)
+        if tokens is not None:
+            self.peak_depths["op_stack"] = op_stack_peak(tokens)
+        return program
+
+    def run(self, program, max_bits=None):
+        """Run the compiled program as run_program does, timing the operators and tracking the stack and values."""
+        operators = NOTATION_OPERATORS[program.notation]
+        stack = deque()  # using a double ended queue as a stack of values
+        peak_depth = 0
+        largest_bits = 0
+        big_int_seconds = 0.0
+        start = perf_counter()
+        try:
+            for instruction in program.instructions:
+                if type(instruction) is int:
+                    stack.append(instruction)
+                    if len(stack) > peak_depth:
+                        peak_depth = len(stack)
+                    if instruction.bit_length() > largest_bits:
+                        largest_bits = instruction.bit_length()
+                    continue
+                first, second = stack.pop(), stack.pop()
+                big = (
+                    type(first) is int
+                    and type(second) is int
+                    and max(first.bit_length(), second.bit_length()) > BIG_INT_BITS
+                )
+                operation_start = perf_counter() if big else 0.0
+                try:
+                    value = operators[instruction](first, second)
+                except ZeroDivisionError as e:
+                    logger.exception(e)
+                    raise
+                if big:
+                    big_int_seconds += perf_counter() - operation_start
+                if type(value) is int and value.bit_length() > largest_bits:
+                    largest_bits = value.bit_length()
+                if max_bits is not None:
+                    check_value_size(value, max_bits)
+                stack.append(value)
+        finally:
+            self.operator_seconds = perf_counter() - start
+            self.big_int_seconds = big_int_seconds
+            self.peak_depths["stack" if program.notation == PREFIX else "val_stack"] = peak_depth
+            self.max_bits = largest_bits
+
+        if program.error is not None:
+            error_type, error_msg = program.error
+            logger.error(error_msg)
+            raise error_type(error_msg)
+        return cast_float_to_int_if_no_decimals(stack.pop())
+
+    def evaluate(self, compile_program, expression, read_tokens=None, max_bits=None, check=None, path=None):
+        """Compile and run the expression, calling check (if any) on the program before running it.
+
+        With a path, the evaluation also runs under cProfile, whose stats are saved to the path (the pstats format,
+        which flame graph tools read), even if the evaluation raises an error. The timings then include the
+        overhead of cProfile.
+        """
+
+        def evaluate_program():
+            program = self.compile(compile_program, expression, read_tokens)
+            if check is not None:
+                check(program)
+            return self.run(program, max_bits)
+
+        if path is None:
+            return evaluate_program()
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(evaluate_program)
+        finally:
+            profile.dump_stats(path)
+            self.path = path
+
+    def summary(self):
+        """Return the summary of the evaluation, in seconds and bits."""
+        return {
+            "notation": self.notation,
+            "tokenize_seconds": self.tokenize_seconds,
+            "operator_seconds": self.operator_seconds,
+            "big_int_seconds": self.big_int_seconds,
+            "instructions": self.instructions,
+            "peak_stack_depth": self.peak_depths,
+            "max_bits": self.max_bits,
+            "profile": self.path,
+        }
@@ -0,0 +1,180 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from shared_cache import decode_result, encode_result, key_digest
+
+logger = logging.getLogger(__name__)
+
+# how many of the least recently used entries are read at once (through the results_used index) when evicting
+EVICT_BATCH = 64
+# the last use of an entry is only updated if it's older than this (in seconds), to spare a write per lookup
+TOUCH_INTERVAL = 60.0
+
+# the totals hold the running number and size of the entries, kept up to date by triggers (in every process) so the
+# bounds of the store are checked without scanning it; they're computed once when a database is created or upgraded
+_SCHEMA = """
+BEGIN IMMEDIATE;
+CREATE TABLE IF NOT EXISTS results (
+    digest BLOB PRIMARY KEY,
+    kind INTEGER NOT NULL,
+    payload BLOB NOT NULL,
+    used REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS results_used ON results (used);
+CREATE TABLE IF NOT EXISTS results_totals (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    entries INTEGER NOT NULL,
+    bytes INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO results_totals
+    SELECT 0, COUNT(*), COALESCE(SUM(LENGTH(payload)), 0) FROM results
+    WHERE NOT EXISTS (SELECT 1 FROM results_totals);
+CREATE TRIGGER IF NOT EXISTS results_inserted AFTER INSERT ON results BEGIN
+    UPDATE results_totals SET entries = entries + 1, bytes = bytes + LENGTH(new.payload);
+END;
+CREATE TRIGGER IF NOT EXISTS results_deleted AFTER DELETE ON results BEGIN
+    UPDATE results_totals SET entries = entries - 1, bytes = bytes - LENGTH(old.payload);
+END;
+CREATE TRIGGER IF NOT EXISTS results_replaced AFTER UPDATE OF payload ON results BEGIN
+    UPDATE results_totals SET bytes = bytes + LENGTH(new.payload) - LENGTH(old.payload);
+END;
+COMMIT;
+"""
+
+# an upsert rather than an INSERT OR REPLACE, whose implicit delete wouldn't fire the results_deleted trigger
+_PUT = """
+INSERT INTO results (digest, kind, payload, used) VALUES (?, ?, ?, ?)
+ON CONFLICT (digest) DO UPDATE SET kind = excluded.kind, payload = excluded.payload, used = excluded.used
+"""
+
+
+class PersistentResultStore:
+    """Result store in a SQLite database on disk, which keeps the results across restarts of the server.
+
+    Entries are keyed by the digest of the (notation, normalized expression) key, and hold the compact binary form
+    of their result (or error), as in the SharedResultCache. The least recently used entries are evicted as soon as
+    there are more than max_entries entries, or more than max_bytes bytes of results; results larger than max_bytes
+    alone aren't stored. The database is only opened on first use, by each process (in WAL mode, so the worker processes
+    of the server read it concurrently and serialize their writes), and each thread has its own connection.
+    It's used as a store of an ExpressionCache, looked up after its backing store.
+    """
+
+    def __init__(self, path, max_entries=1000000, max_bytes=1024 * 1024 * 1024, timeout=5.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.errors = 0
+        self._connections = threading.local()
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        # connections can't be shared with the processes forked after opening them
+        connection = getattr(self._connections, "connection", None)
+        if connection is None or self._connections.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            self._connections.connection, self._connections.pid = connection, os.getpid()
+        return connection
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, key):
+        """Return the (result, error) pair stored for the key, or None.
+
+        The store is a cache: when the database can't be read, the error is logged and the key is a miss.
+        """
+        digest = key_digest(key)
+        try:
+            connection = self._connection()
+            row = connection.execute("SELECT kind, payload, used FROM results WHERE digest = ?", (digest,)).fetchone()
+            if row is not None and time.time() - row[2] > TOUCH_INTERVAL:
+                connection.execute("UPDATE results SET used = ? WHERE digest = ?", (time.time(), digest))
+        except sqlite3.Error as e:
+            logger.exception(e)
+            self._count("errors")
+            return None
+        if row is None:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return decode_result(row[0], row[1])
+
+    def put(self, key, result, error):
+        """Store the result of the key (or its error), evicting the least recently used entries beyond the bounds."""
+        kind, payload = encode_result(result, error)
+        if len(payload) > self.max_bytes:
+            return
+        try:
+            connection = self._connection()
+            connection.execute(_PUT, (key_digest(key), kind, payload, time.time()))
+            self._count("stores")
+            self.evict()
+        except sqlite3.Error as e:
+            logger.exception(e)
+            self._count("errors")
+
+    def _excess(self, connection):
+        entries, size = connection.execute("SELECT entries, bytes FROM results_totals").fetchone()
+        return entries - self.max_entries, size - self.max_bytes
+
+    def evict(self):
+        """Delete the least recently used entries beyond the bounds of the store.
+
+        The bounds are checked against the running totals of the store, and the entries are read EVICT_BATCH at a
+        time from the least recently used, so neither scans the whole store.
+        """
+        connection = self._connection()
+        excess_entries, excess_bytes = self._excess(connection)
+        if excess_entries <= 0 and excess_bytes <= 0:
+            return
+        with connection:
+            # the totals are read again once the other processes can't write, as they may have evicted meanwhile
+            connection.execute("BEGIN IMMEDIATE")
+            excess_entries, excess_bytes = self._excess(connection)
+            while excess_entries > 0 or excess_bytes > 0:
+                rows = connection.execute(
+                    "SELECT digest, LENGTH(payload) FROM results ORDER BY used LIMIT ?", (EVICT_BATCH,)
+                ).fetchall()
+                if not rows:
+                    break
+                evicted = []
+                for digest, size in rows:
+                    if excess_entries <= 0 and excess_bytes <= 0:
+                        break
+                    evicted.append((digest,))
+                    excess_entries -= 1
+                    excess_bytes -= size
+                connection.executemany("DELETE FROM results WHERE digest = ?", evicted)
+
+    def stats(self):
+        """Return the counters of the store (of this process), and the number and size of its entries."""
+        try:
+            entries, size = self._connection().execute("SELECT entries, bytes FROM results_totals").fetchone()
+        except sqlite3.Error as e:
+            logger.exception(e)
+            entries, size = None, None
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "path": self.path,
+                "entries": entries,
+                "bytes": size or 0,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "errors": self.errors,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,232 @@
+import argparse
+import logging
+import os
+import random
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+from shared_cache import SharedResultCache
+from werkzeug.wsgi import ClosingIterator
+
+logger = logging.getLogger(__name__)
+
+
+class RequestCounter:
+    """WSGI middleware counting the requests served and in progress, to recycle and stop workers gracefully."""
+
+    def __init__(self, app, max_requests, on_limit):
+        self.app = app
+        self.max_requests = max_requests
+        self.on_limit = on_limit
+        self.served = 0
+        self.active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        with self._lock:
+            self.active += 1
+        try:
+            # the server closes the response once it's sent, streamed responses included
+            return ClosingIterator(self.app(environ, start_response), self._served)
+        except BaseException:
+            self._served()
+            raise
+
+    def _served(self):
+        with self._lock:
+            self.active -= 1
+            self.served += 1
+            limit_reached = self.max_requests and self.served == self.max_requests
+        if limit_reached:
+            self.on_limit()
+
+    def wait_idle(self, timeout):
+        """Wait for the requests in progress to be served, for up to timeout seconds."""
+        deadline = time.monotonic() + timeout
+        while self.active and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+
+def serve_worker(listener, shared_cache, max_requests, graceful_timeout):
+    """Serve the webapp on the listening socket shared with the other workers, until stopped or recycled.
+
+    The webapp is imported in the worker, after forking, so workers started by a reload run the current code.
+    """
+    from werkzeug.serving import make_server
+
+    import webapp
+
+    if shared_cache is not None:
+        webapp.expression_cache.backing = shared_cache
+
+    stopping = threading.Event()
+
+    def stop(*_):
+        if not stopping.is_set():
+            stopping.set()
+            # shutdown waits for serve_forever to return, so it can't be called from the thread running it
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+    counter = RequestCounter(webapp.app, max_requests, stop)
+    host, port = listener.getsockname()[:2]
+    server = make_server(host, port, counter, threaded=True, fd=listener.fileno())
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    server.serve_forever()
+    counter.wait_idle(graceful_timeout)
+
+
+class Master:
+    """Pre-fork server: bind the listening socket, then fork the workers which accept connections on it.
+
+    The master keeps `workers` workers running, replacing those which exit (e.g. recycled after max_requests
+    requests, with some jitter so they don't all restart at once). On SIGHUP, new workers are started and the
+    previous ones are stopped gracefully, finishing the requests in progress. On SIGTERM or SIGINT, all workers are
+    stopped gracefully, and killed if they're still running after graceful_timeout seconds.
+    The result cache shared by the workers is created before forking them.
+    """
+
+    def __init__(self, host, port, workers, max_requests=0, graceful_timeout=30, shared_cache=None):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.max_requests = max_requests
+        self.graceful_timeout = graceful_timeout
+        self.shared_cache = shared_cache
+        self.listener = None
+        self.children = {}  # pid of each running worker -> generation it was started in
+        self.generation = 0
+        self._reload = False
+        self._stop = False
+
+    def bind(self):
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind((self.host, self.port))
+        self.listener.listen(128)
+        self.listener.set_inheritable(True)
+        self.port = self.listener.getsockname()[1]
+
+    def spawn(self):
+        max_requests = self.max_requests + random.randint(0, self.max_requests // 10) if self.max_requests else 0
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                serve_worker(self.listener, self.shared_cache, max_requests, self.graceful_timeout)
+            except Exception:
+                logger.exception(f"Worker {os.getpid()} failed.")
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = self.generation
+        logger.info(f"Started worker {pid}.")
+
+    def signal_children(self, signum, before_generation=None):
+        """Send the signal to all the workers, or only to those started before the given generation."""
+        for pid, child_generation in list(self.children.items()):
+            if before_generation is None or child_generation < before_generation:
+                try:
+                    os.kill(pid, signum)
+                except ProcessLookupError:
+                    pass
+
+    def reap(self):
+        while self.children:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                return
+            if pid == 0:
+                return
+            self.children.pop(pid, None)
+            logger.info(f"Worker {pid} exited.")
+
+    def handle_reload(self, *_):
+        self._reload = True
+
+    def handle_stop(self, *_):
+        self._stop = True
+
+    def run(self):
+        if self.listener is None:
+            self.bind()
+        signal.signal(signal.SIGHUP, self.handle_reload)
+        signal.signal(signal.SIGTERM, self.handle_stop)
+        signal.signal(signal.SIGINT, self.handle_stop)
+        logger.info(f"Serving on {self.host}:{self.port} with {self.workers} workers.")
+
+        while not self._stop:
+            if self._reload:
+                self._reload = False
+                self.generation += 1
+                logger.info("Reloading workers.")
+            current = sum(1 for generation in self.children.values() if generation == self.generation)
+            for _ in range(self.workers - current):
+                self.spawn()
+            # the previous generations are stopped once the current one is started
+            self.signal_children(signal.SIGTERM, self.generation)
+            self.reap()
+            time.sleep(0.1)
+
+        self.signal_children(signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout
+        while self.children and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.05)
+        self.signal_children(signal.SIGKILL)
+        self.reap()
+        self.listener.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the calculator webapp with several worker processes.")
+    parser.add_argument("--host", default=os.environ.get("SERVER_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("SERVER_PORT", 3456)))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("SERVER_WORKERS", os.cpu_count() or 1)))
+    parser.add_argument(
+        "--max-requests",
+        type=int,
+        default=int(os.environ.get("SERVER_MAX_REQUESTS", 0)),
+        help="recycle each worker after about this many requests (0 never recycles them)",
+    )
+    parser.add_argument(
+        "--graceful-timeout", type=float, default=float(os.environ.get("SERVER_GRACEFUL_TIMEOUT", 30))
+    )
+    parser.add_argument(
+        "--shared-cache-slots",
+        type=int,
+        default=int(os.environ.get("SHARED_CACHE_SLOTS", 65536)),
+        help="number of results in the cache shared by the workers (0 disables it)",
+    )
+    parser.add_argument(
+        "--shared-cache-slot-size", type=int, default=int(os.environ.get("SHARED_CACHE_SLOT_SIZE", 256))
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    shared_cache = None
+    if args.shared_cache_slots:
+        shared_cache = SharedResultCache(slots=args.shared_cache_slots, slot_size=args.shared_cache_slot_size)
+    session_dir = None
+    if args.workers > 1 and not os.environ.get("SESSION_STORE_PATH"):
+        # the sessions are shared by the workers (imported after forking, they read it from the environment) in a
+        # database of a temporary directory, unless SESSION_STORE_PATH sets where
+        session_dir = tempfile.mkdtemp(prefix="calculator-sessions-")
+        os.environ["SESSION_STORE_PATH"] = os.path.join(session_dir, "sessions.db")
+    try:
+        Master(args.host, args.port, args.workers, args.max_requests, args.graceful_timeout, shared_cache).run()
+    finally:
+        if session_dir is not None:
+            shutil.rmtree(session_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
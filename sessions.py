@@ -0,0 +1,469 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+from compiler import INFIX, PREFIX, Program, check_value_size, compile_expression
+from exceptions import InvalidPatchError, ResourceLimitError, SessionNotFoundError
+from governor import CostLimits, check_cost
+from operations import PREFIX_OPERATORS, cast_float_to_int_if_no_decimals
+from tokenizer import format_literal, parse_literal
+
+logger = logging.getLogger(__name__)
+
+LEFT = 0
+RIGHT = 1
+
+
+class Node:
+    """A node of the tree of a session, with the memoized value of its subtree.
+
+    Leaves have no operator, and their value is their literal. The value of an operator node is its operator applied
+    to the values of its left and right children, in the written order, or None if evaluating its subtree raised an
+    error, in which case error holds the (exception type, message) pair of the first error run_program would raise.
+    """
+
+    __slots__ = ("operator", "children", "value", "error")
+
+    def __init__(self, operator=None, children=None, value=None):
+        self.operator = operator
+        self.children = children
+        self.value = value
+        self.error = None
+
+
+def _evaluate(node, notation, max_bits):
+    """Compute the value of an operator node from the memoized values of its children."""
+    left, right = node.children
+    # run_program evaluates the right operand of a prefix operator first, and the left operand of an infix one first
+    first, second = (right, left) if notation == PREFIX else (left, right)
+    node.error = first.error or second.error
+    node.value = None
+    if node.error is not None:
+        return
+    try:
+        node.value = PREFIX_OPERATORS[node.operator](left.value, right.value)
+        if max_bits is not None:
+            check_value_size(node.value, max_bits)
+    except (ArithmeticError, ResourceLimitError) as e:
+        # the error is kept, as a later patch may fix it (e.g. replacing the zero of a division)
+        node.error = (type(e), e.args[0])
+        node.value = None
+
+
+def build_tree(program, max_bits=None):
+    """Build the tree of a compiled program, memoizing the value of each subtree, in a single pass.
+
+    Malformed and parametric programs raise their error, as they can't be evaluated.
+    """
+    if program.error is not None:
+        error_type, error_msg = program.error
+        logger.error(error_msg)
+        raise error_type(error_msg)
+
+    stack = deque()  # using a double ended queue as a stack of nodes
+    for instruction in program.instructions:
+        if type(instruction) is int:
+            stack.append(Node(value=instruction))
+            continue
+        first, second = stack.pop(), stack.pop()
+        # the prefix operators apply to the latest value first, the infix ones to the latest value last
+        children = [first, second] if program.notation == PREFIX else [second, first]
+        node = Node(instruction, children)
+        _evaluate(node, program.notation, max_bits)
+        stack.append(node)
+    return stack.pop()
+
+
+def parse_subtree(notation, expression, max_bits=None, limits=None):
+    """Build the tree of a subexpression in the notation, which can be a single literal in both notations.
+
+    With limits, subexpressions whose estimated cost exceeds them raise a ResourceLimitError.
+    """
+    stripped = expression.strip() if expression else ""
+    if stripped.isdigit() and stripped.isascii():
+        return Node(value=parse_literal(stripped))
+    program = compile_expression(notation, expression)
+    if limits is not None:
+        check_cost(program, limits)
+    return build_tree(program, max_bits)
+
+
+class Session:
+    """An expression kept as a tree with memoized subtree values, which can be edited and re-evaluated.
+
+    Nodes are addressed by their path from the root: the list of the sides (0 for the left operand, 1 for the right
+    one, in the written order) followed to reach them. Replacing the subtree at a path only re-evaluates the
+    operators on the path to the root, one operation each.
+    With max_bits, the values longer than max_bits bits are errors, and with limits, so are the expressions and
+    patches whose estimated cost exceeds them.
+    """
+
+    def __init__(self, notation, root, max_bits=None, limits=None, source=None):
+        self.notation = notation
+        self.root = root
+        self.max_bits = max_bits
+        self.limits = limits
+        # the expression the session was started for
+        self.source = source
+        self.patches = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cls, notation, expression, max_bits=None, limits=None):
+        """Start a session for the expression, raising the error of a malformed one."""
+        return cls(notation, parse_subtree(notation, expression, max_bits, limits), max_bits, limits, expression)
+
+    def result(self):
+        """Return the value of the expression, or raise the error that evaluating it raises."""
+        if self.root.error is not None:
+            error_type, error_msg = self.root.error
+            raise error_type(error_msg)
+        return cast_float_to_int_if_no_decimals(self.root.value)
+
+    def patch(self, path, expression):
+        """Replace the subtree at path with the subexpression, and return the number of operations re-evaluated.
+
+        With limits, the subexpression, and then the whole patched expression, must be within them, or the patch is
+        undone and raises a ResourceLimitError.
+        """
+        subtree = parse_subtree(self.notation, expression, self.max_bits, self.limits)
+        with self._lock:
+            ancestors = []
+            node = self.root
+            for side in path:
+                # the floats and bools equal to the sides aren't sides
+                if type(side) is not int or side not in (LEFT, RIGHT) or node.operator is None:
+                    error_mgs = f"The path {list(path)} doesn't lead to a node of the expression."
+                    logger.error(error_mgs)
+                    raise InvalidPatchError(error_mgs)
+                ancestors.append((node, side))
+                node = node.children[side]
+
+            if not ancestors:
+                previous, self.root = self.root, subtree
+            else:
+                parent, side = ancestors[-1]
+                previous, parent.children[side] = parent.children[side], subtree
+            if self.limits is not None:
+                try:
+                    check_cost(self._program(), self.limits)
+                except ResourceLimitError:
+                    # the whole expression exceeds the limits, the patch is undone
+                    if not ancestors:
+                        self.root = previous
+                    else:
+                        parent.children[side] = previous
+                    raise
+            for node, _ in reversed(ancestors):
+                _evaluate(node, self.notation, self.max_bits)
+            self.patches += 1
+            return len(ancestors)
+
+    def _program(self):
+        # the instructions of the tree, in the order compile_expression would compile its expression in
+        instructions = []
+        pending = [self.root]
+        while pending:
+            node = pending.pop()
+            if type(node) is str:
+                instructions.append(node)
+            elif node.operator is None:
+                instructions.append(node.value)
+            else:
+                left, right = node.children
+                # the prefix programs run the right operand first, and the infix ones the left operand first
+                first, second = (right, left) if self.notation == PREFIX else (left, right)
+                pending.extend((node.operator, second, first))
+        return Program(self.notation, instructions, None)
+
+    def expression(self):
+        """Return the current expression, in the notation of the session."""
+        tokens = []
+        pending = [self.root]
+        with self._lock:
+            while pending:
+                node = pending.pop()
+                if isinstance(node, str):
+                    tokens.append(node)
+                elif node.operator is None:
+                    tokens.append(format_literal(node.value))
+                elif self.notation == INFIX:
+                    left, right = node.children
+                    pending.extend((")", right, node.operator, left, "("))
+                else:
+                    left, right = node.children
+                    pending.extend((right, left, node.operator))
+        return " ".join(tokens)
+
+
+class SessionStore:
+    """A bounded store of sessions, which expire ttl seconds after they were last used.
+
+    When max_sessions sessions are stored, creating one evicts the least recently used.
+    """
+
+    def __init__(self, max_sessions=1024, ttl=600.0, clock=time.monotonic):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+        self._clock = clock
+        self._sessions = OrderedDict()  # id -> (session, expiry time), the least recently used first
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        while self._sessions:
+            session_id, (_, expires) = next(iter(self._sessions.items()))
+            if expires > now:
+                return
+            del self._sessions[session_id]
+            self.expired += 1
+
+    def add(self, session):
+        """Store the session and return its id."""
+        session_id = uuid.uuid4().hex
+        with self._lock:
+            now = self._clock()
+            self._expire(now)
+            while len(self._sessions) >= self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evicted += 1
+            self._sessions[session_id] = (session, now + self.ttl)
+            self.created += 1
+        return session_id
+
+    def get(self, session_id):
+        """Return the session with this id, extending its lifetime, or raise a SessionNotFoundError."""
+        with self._lock:
+            now = self._clock()
+            self._expire(now)
+            if session_id not in self._sessions:
+                raise SessionNotFoundError(f"No session with id '{session_id}', it may have expired.")
+            session, _ = self._sessions.pop(session_id)
+            self._sessions[session_id] = (session, now + self.ttl)
+            return session
+
+    def delete(self, session_id):
+        """Remove the session with this id, or raise a SessionNotFoundError."""
+        with self._lock:
+            if self._sessions.pop(session_id, None) is None:
+                raise SessionNotFoundError(f"No session with id '{session_id}', it may have expired.")
+
+    def patch(self, session_id, path, expression):
+        """Patch the session with this id (see Session.patch), and return it with the number of operations
+        re-evaluated."""
+        session = self.get(session_id)
+        return session, session.patch(path, expression)
+
+    def stats(self):
+        """Return the counters of the store."""
+        with self._lock:
+            self._expire(self._clock())
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "ttl": self.ttl,
+                "created": self.created,
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
+
+
+# how often (in patches of a session) its expression is rewritten to fold its patches in, and the patches deleted
+COMPACT_EVERY = 64
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    notation TEXT NOT NULL,
+    expression TEXT NOT NULL,
+    max_bits INTEGER,
+    limit_bits INTEGER,
+    limit_cost INTEGER,
+    base INTEGER NOT NULL,
+    patches INTEGER NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires);
+CREATE TABLE IF NOT EXISTS session_patches (
+    session TEXT NOT NULL REFERENCES sessions (id) ON DELETE CASCADE,
+    number INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    expression TEXT NOT NULL,
+    PRIMARY KEY (session, number)
+) WITHOUT ROWID;
+"""
+
+
+class SharedSessionStore:
+    """A bounded store of sessions in a SQLite database, shared by the worker processes of the server.
+
+    The database holds the expression each session was started for and the log of its patches, and each process
+    keeps the trees of the sessions it served: before using one, it applies the patches the other processes logged
+    since (or rebuilds the tree, if it never served the session), so a patch still only re-evaluates the path to the
+    root. Every COMPACT_EVERY patches, the expression of a session is rewritten with its patches folded in.
+    Sessions expire ttl seconds after they were last used, and when max_sessions sessions are stored, creating one
+    evicts the least recently used. The database is opened as the one of the PersistentResultStore is (per process
+    and thread, in WAL mode), and the sessions are used by one thread of a process at a time.
+    """
+
+    def __init__(self, path, max_sessions=1024, ttl=600.0, timeout=5.0, clock=time.time):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.timeout = timeout
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+        self._clock = clock
+        self._sessions = OrderedDict()  # id -> session served by this process, the least recently used first
+        self._connections = threading.local()
+        self._lock = threading.RLock()
+
+    def _connection(self):
+        # connections can't be shared with the processes forked after opening them
+        connection = getattr(self._connections, "connection", None)
+        if connection is None or self._connections.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA foreign_keys=ON")
+            connection.executescript(_SCHEMA)
+            self._connections.connection, self._connections.pid = connection, os.getpid()
+        return connection
+
+    def _cache(self, session_id, session):
+        self._sessions[session_id] = session
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def add(self, session):
+        """Store the session and return its id."""
+        session_id = uuid.uuid4().hex
+        limits = session.limits or CostLimits(None, None)
+        with self._lock:
+            connection = self._connection()
+            now = self._clock()
+            with connection:
+                connection.execute("BEGIN IMMEDIATE")
+                expired = connection.execute("DELETE FROM sessions WHERE expires <= ?", (now,)).rowcount
+                (count,) = connection.execute("SELECT COUNT(*) FROM sessions").fetchone()
+                evicted = 0
+                if count >= self.max_sessions:
+                    evicted = connection.execute(
+                        "DELETE FROM sessions WHERE id IN (SELECT id FROM sessions ORDER BY expires LIMIT ?)",
+                        (count - self.max_sessions + 1,),
+                    ).rowcount
+                connection.execute(
+                    "INSERT INTO sessions VALUES (?, ?, ?, ?, ?, ?, 0, 0, ?)",
+                    (
+                        session_id,
+                        session.notation,
+                        session.source,
+                        session.max_bits,
+                        limits.max_bits,
+                        limits.max_cost,
+                        now + self.ttl,
+                    ),
+                )
+            self.expired += expired
+            self.evicted += evicted
+            self.created += 1
+            self._cache(session_id, session)
+        return session_id
+
+    def _load(self, connection, session_id):
+        """Return the session with this id up to date with its patches, extending its lifetime."""
+        now = self._clock()
+        row = connection.execute(
+            "SELECT notation, expression, max_bits, limit_bits, limit_cost, base, patches, expires FROM sessions "
+            "WHERE id = ?",
+            (session_id,),
+        ).fetchone()
+        if row is None or row[7] <= now:
+            # the expired sessions are deleted (and counted) when sessions are added
+            self._sessions.pop(session_id, None)
+            raise SessionNotFoundError(f"No session with id '{session_id}', it may have expired.")
+        notation, expression, max_bits, limit_bits, limit_cost, base, patches, _ = row
+        connection.execute("UPDATE sessions SET expires = ? WHERE id = ?", (now + self.ttl, session_id))
+
+        session = self._sessions.get(session_id)
+        if session is None or session.patches < base:
+            limits = CostLimits(limit_bits, limit_cost) if limit_bits is not None or limit_cost is not None else None
+            # the expression was valid when stored, under the same limits
+            session = Session(notation, parse_subtree(notation, expression, max_bits), max_bits, limits, expression)
+            session.patches = base
+        if session.patches < patches:
+            for path, patch in connection.execute(
+                "SELECT path, expression FROM session_patches WHERE session = ? AND number > ? ORDER BY number",
+                (session_id, session.patches),
+            ).fetchall():
+                session.patch(json.loads(path), patch)
+        self._cache(session_id, session)
+        return session
+
+    def get(self, session_id):
+        """Return the session with this id, extending its lifetime, or raise a SessionNotFoundError."""
+        with self._lock:
+            connection = self._connection()
+            with connection:
+                connection.execute("BEGIN IMMEDIATE")
+                return self._load(connection, session_id)
+
+    def patch(self, session_id, path, expression):
+        """Patch the session with this id (see Session.patch), log the patch for the other processes, and return
+        the session with the number of operations re-evaluated."""
+        with self._lock:
+            connection = self._connection()
+            try:
+                with connection:
+                    connection.execute("BEGIN IMMEDIATE")
+                    session = self._load(connection, session_id)
+                    recomputed = session.patch(path, expression)
+                    connection.execute(
+                        "INSERT INTO session_patches VALUES (?, ?, ?, ?)",
+                        (session_id, session.patches, json.dumps(list(path)), expression),
+                    )
+                    connection.execute("UPDATE sessions SET patches = ? WHERE id = ?", (session.patches, session_id))
+                    if session.patches % COMPACT_EVERY == 0:
+                        connection.execute(
+                            "UPDATE sessions SET expression = ?, base = ? WHERE id = ?",
+                            (session.expression(), session.patches, session_id),
+                        )
+                        connection.execute("DELETE FROM session_patches WHERE session = ?", (session_id,))
+            except sqlite3.Error:
+                # the patch may have been applied to the tree and not logged
+                self._sessions.pop(session_id, None)
+                raise
+            return session, recomputed
+
+    def delete(self, session_id):
+        """Remove the session with this id, or raise a SessionNotFoundError."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            with self._connection() as connection:
+                if connection.execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount == 0:
+                    raise SessionNotFoundError(f"No session with id '{session_id}', it may have expired.")
+
+    def stats(self):
+        """Return the counters of the store (of this process), and the number of sessions stored."""
+        with self._lock:
+            (sessions,) = self._connection().execute(
+                "SELECT COUNT(*) FROM sessions WHERE expires > ?", (self._clock(),)
+            ).fetchone()
+            return {
+                "path": self.path,
+                "sessions": sessions,
+                "max_sessions": self.max_sessions,
+                "ttl": self.ttl,
+                "created": self.created,
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
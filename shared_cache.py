@@ -0,0 +1,144 @@
+import hashlib
+import mmap
+import multiprocessing
+import struct
+
+from exceptions import (
+    InvalidCharacterError,
+    InvalidParenthesesError,
+    MalformedInfixNotationError,
+    MalformedPrefixNotationError,
+)
+
+# the errors which can be cached, by name
+ERRORS = {
+    error_type.__name__: error_type
+    for error_type in (
+        InvalidCharacterError,
+        InvalidParenthesesError,
+        MalformedInfixNotationError,
+        MalformedPrefixNotationError,
+        ZeroDivisionError,
+    )
+}
+
+# counters at the start of the map: hits, misses, stores, evictions, and the clock used to find the least recently
+# used slot of a set
+_COUNTERS = struct.Struct("<5Q")
+_HEADER_SIZE = 64
+# each slot starts with the digest of its key, the kind of value it holds, when it was last used and the length
+# of the value
+_SLOT = struct.Struct("<16sB3xQI")
+
+_EMPTY, _INT, _FLOAT, _ERROR = range(4)
+
+
+def key_digest(key):
+    """Return a 16 bytes digest of a (notation, normalized expression or binary payload) cache key.
+
+    The payloads are hashed after another separator than the expressions, so a payload never has the digest of the
+    expression made of the same bytes.
+    """
+    notation, expression = key
+    if isinstance(expression, bytes):
+        return hashlib.blake2b(f"{notation}\1".encode("utf-8") + expression, digest_size=16).digest()
+    return hashlib.blake2b(f"{notation}\0{expression}".encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+
+def encode_result(result, error):
+    """Return the kind and compact binary form of a result (big ints included), or of the error it raised."""
+    if error is not None:
+        error_type, error_msg = error
+        return _ERROR, f"{error_type.__name__}\0{error_msg}".encode("utf-8", "surrogatepass")
+    if isinstance(result, float):
+        return _FLOAT, struct.pack("<d", result)
+    return _INT, result.to_bytes(result.bit_length() // 8 + 1, "little", signed=True)
+
+
+def decode_result(kind, payload):
+    """Return the (result, error) pair of a result encoded by encode_result."""
+    if kind == _ERROR:
+        error_name, error_msg = payload.decode("utf-8", "surrogatepass").split("\0", 1)
+        return None, (ERRORS[error_name], error_msg)
+    if kind == _FLOAT:
+        return struct.unpack("<d", payload)[0], None
+    return int.from_bytes(payload, "little", signed=True), None
+
+
+class SharedResultCache:
+    """Result cache in an anonymous shared memory map, shared by the processes forked after creating it.
+
+    The map is split into fixed size slots, grouped in sets of `ways` slots: a key can only be stored in the set
+    its digest maps to, replacing the least recently used slot of the set. Results (big ints included) are stored
+    in their compact binary form, and the ones which don't fit in a slot are not cached.
+    It's used as the backing store of an ExpressionCache, so the result computed by any process is reused by all
+    the others.
+    """
+
+    def __init__(self, slots=65536, slot_size=256, ways=4):
+        self.sets = max(slots // ways, 1)
+        self.ways = ways
+        self.slot_size = slot_size
+        self.max_value_size = slot_size - _SLOT.size
+        self._map = mmap.mmap(-1, _HEADER_SIZE + self.sets * ways * slot_size)
+        self._lock = multiprocessing.get_context("fork").Lock()
+
+    def _slots(self, digest):
+        first = _HEADER_SIZE + (int.from_bytes(digest[:8], "little") % self.sets) * self.ways * self.slot_size
+        return range(first, first + self.ways * self.slot_size, self.slot_size)
+
+    def _tick(self, *increments):
+        counters = list(_COUNTERS.unpack_from(self._map, 0))
+        for counter in increments:
+            counters[counter] += 1
+        counters[4] += 1
+        _COUNTERS.pack_into(self._map, 0, *counters)
+        return counters[4]
+
+    def get(self, key):
+        """Return the (result, error) pair cached for the key, or None."""
+        digest = key_digest(key)
+        with self._lock:
+            for offset in self._slots(digest):
+                slot_digest, kind, _, length = _SLOT.unpack_from(self._map, offset)
+                if kind != _EMPTY and slot_digest == digest:
+                    stamp = self._tick(0)
+                    _SLOT.pack_into(self._map, offset, digest, kind, stamp, length)
+                    payload = self._map[offset + _SLOT.size:offset + _SLOT.size + length]
+                    return decode_result(kind, payload)
+            self._tick(1)
+        return None
+
+    def put(self, key, result, error):
+        """Cache the result of the key (or its error), if it fits in a slot."""
+        kind, payload = encode_result(result, error)
+        if len(payload) > self.max_value_size:
+            return
+        digest = key_digest(key)
+        with self._lock:
+            victim, victim_stamp = None, None
+            for offset in self._slots(digest):
+                slot_digest, slot_kind, stamp, _ = _SLOT.unpack_from(self._map, offset)
+                if slot_kind == _EMPTY or slot_digest == digest:
+                    victim, victim_stamp = offset, 0
+                    break
+                if victim is None or stamp < victim_stamp:
+                    victim, victim_stamp = offset, stamp
+            stamp = self._tick(2, 3) if victim_stamp else self._tick(2)
+            _SLOT.pack_into(self._map, victim, digest, kind, stamp, len(payload))
+            self._map[victim + _SLOT.size:victim + _SLOT.size + len(payload)] = payload
+
+    def stats(self):
+        """Return the counters of the cache."""
+        with self._lock:
+            hits, misses, stores, evictions, _ = _COUNTERS.unpack_from(self._map, 0)
+        lookups = hits + misses
+        return {
+            "slots": self.sets * self.ways,
+            "slot_size": self.slot_size,
+            "hits": hits,
+            "misses": misses,
+            "stores": stores,
+            "evictions": evictions,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,24 @@
+import mmap
+import sys
+from contextlib import contextmanager
+
+
+@contextmanager
+def open_expression(path):
+    """Open the file at path as a memory map (or stdin for "-"), to be read by the stream evaluators.
+
+    Mapping the file lets the evaluators read it in chunks without copying it into memory first.
+    """
+    if path == "-":
+        yield sys.stdin.buffer
+        return
+
+    with open(path, "rb") as file:
+        try:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files can't be mapped
+            yield file
+            return
+        with mapped:
+            yield mapped
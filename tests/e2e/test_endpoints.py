@@ -1,6 +1,14 @@
+import io
+import json
+import threading
+import time
+
 import pytest
 
-from webapp import app
+import webapp
+from binary_format import MIMETYPE, decode_response, encode_expression
+from tokenizer import parse_literal
+from webapp import app, expression_cache
 
 
 @pytest.fixture
@@ -164,3 +172,761 @@ def test_infix_calculator_endpoint_raises_exception(client, expression, expected
     # ... the expected exceptions are processed and the expected status code and message are returned
     assert response.status_code == expected_status_code
     assert response.json == {"message": exception_msg}
+
+
+@pytest.mark.parametrize("cache_enabled", (True, False))
+@pytest.mark.parametrize(
+    "route, expression, expected_status_code, expected",
+    (
+        ["/calculator/prefix/", "+ 1 2", 200, {"result": 3}],
+        ["/calculator/infix/", "( 1 + 2 )", 200, {"result": 3}],
+        [
+            "/calculator/prefix/",
+            "+ 1",
+            400,
+            {
+                "message": "Please check the provided expression is in the prefix notation: There are not enough "
+                "values to apply the operand '+' on."
+            },
+        ],
+        ["/calculator/infix/", "( 5 / 0 )", 500, {"message": "Zero division not supported."}],
+    ),
+)
+def test_calculator_endpoints_with_and_without_expression_cache(
+    client, cache_enabled, route, expression, expected_status_code, expected
+):
+    # given
+    # ... the expression cache enabled or disabled
+    app.config["EXPRESSION_CACHE_ENABLED"] = cache_enabled
+    try:
+        # when
+        # ... the same expression is posted twice
+        responses = [client.post(route, json={"expression": expression}) for _ in range(2)]
+    finally:
+        app.config["EXPRESSION_CACHE_ENABLED"] = True
+    # then
+    # ... both responses are the same
+    for response in responses:
+        assert response.status_code == expected_status_code
+        assert response.json == expected
+
+
+def test_cache_endpoint_success(client):
+    # given
+    # ... an expression evaluated twice
+    expression_cache.clear()
+    for _ in range(2):
+        client.post("/calculator/prefix/", json={"expression": "* 7 6"})
+    # when
+    # ... the /calculator/cache/ endpoint is called
+    response = client.get("/calculator/cache/")
+    # then
+    # ... the counters of the cache are returned
+    assert response.status_code == 200
+    assert response.json["enabled"] is True
+    # ... the result is keyed by the expression and by the digest of its canonical tree
+    assert response.json["entries"] == 2
+    assert response.json["hits"] >= 1
+
+
+@pytest.mark.parametrize(
+    "route, data, content_type",
+    (
+        ["/calculator/prefix/batch/", '["+ 1 2", {"expression": "+ 1"}, "/ 2 0"]', "application/json"],
+        [
+            "/calculator/prefix/batch/",
+            '"+ 1 2"\n{"expression": "+ 1"}\n{"expression": "/ 2 0"}\n',
+            "application/x-ndjson",
+        ],
+    ),
+)
+def test_prefix_batch_endpoint_success(client, route, data, content_type):
+    # given
+    # ... the prefix batch endpoint and a running app
+    # when
+    # ... the /calculator/prefix/batch/ endpoint is called with a JSON array or NDJSON
+    response = client.post(route, data=data, content_type=content_type)
+    # then
+    # ... one NDJSON record is returned per expression, in input order, errors included
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert records == [
+        {"index": 0, "result": 3},
+        {
+            "index": 1,
+            "error": "MalformedPrefixNotationError",
+            "message": "Please check the provided expression is in the prefix notation: There are not enough values "
+            "to apply the operand '+' on.",
+            "status": 400,
+        },
+        {"index": 2, "error": "ZeroDivisionError", "message": "Zero division not supported.", "status": 500},
+    ]
+
+
+def test_infix_batch_endpoint_success(client):
+    # given
+    # ... the infix batch endpoint and a running app
+    # when
+    # ... the /calculator/infix/batch/ endpoint is called with an invalid JSON array
+    response = client.post("/calculator/infix/batch/", data='["( 1 + 2 )", "6 + 5", ', content_type="application/json")
+    # then
+    # ... the records of the readable expressions are followed by an error record
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert records[0] == {"index": 0, "result": 3}
+    assert records[1]["error"] == "InvalidParenthesesError"
+    assert records[2] == {
+        "index": 2,
+        "error": "InvalidBatchError",
+        "message": "The batch is not a complete JSON array.",
+        "status": 400,
+    }
+
+
+@pytest.mark.parametrize(
+    "route, data, expected_status_code, expected",
+    (
+        ["/calculator/prefix/stream/", b"+ 5000 / 1000000 + 1000 0", 200, {"result": 6000}],
+        ["/calculator/infix/stream/", b"( 4 * ( ( ( 6 + 1 ) - 2 ) + 6 ) )\n", 200, {"result": 44}],
+        ["/calculator/prefix/stream/", b"/ 2 0", 500, {"message": "Zero division not supported."}],
+        [
+            "/calculator/prefix/stream/",
+            b"+ 1 \xff",
+            400,
+            {
+                "message": "Please check the provided expression is in the prefix notation: The expression isn't valid "
+                "utf-8: 'utf-8' codec can't decode byte 0xff in position 4: invalid start byte"
+            },
+        ],
+        [
+            "/calculator/infix/stream/",
+            f"( 1{'0' * 400} / 3 )".encode(),
+            422,
+            {"message": "The expression can't be evaluated: integer division result too large for a float"},
+        ],
+        [
+            "/calculator/infix/stream/",
+            b"6 + 5",
+            400,
+            {
+                "message": "Please check the provided expression is in the infix notation: Invalid parentheses "
+                "configuration in input string."
+            },
+        ],
+    ),
+)
+def test_stream_endpoints(client, route, data, expected_status_code, expected):
+    # given
+    # ... the stream endpoints and a running app
+    # when
+    # ... they are called with the expression as a chunked request body
+    response = client.post(
+        route,
+        input_stream=io.BytesIO(data),
+        headers={"Transfer-Encoding": "chunked"},
+        environ_overrides={"wsgi.input_terminated": True},
+    )
+    # then
+    # ... the expression is evaluated from the request stream
+    assert response.status_code == expected_status_code
+    assert response.json == expected
+
+
+
+@pytest.mark.parametrize(
+    "route, data",
+    (
+        ["/calculator/prefix/stream/", f"+ 1 * {2 ** 100} {2 ** 100}".encode()],
+        ["/calculator/infix/stream/", f"( 1 + ( {2 ** 100} * {2 ** 100} ) )".encode()],
+    ),
+)
+def test_stream_endpoints_abort_values_past_the_max_bits_of_the_route(client, monkeypatch, route, data):
+    # given
+    # ... stream routes whose values can't exceed 128 bits
+    limits = webapp.CostLimits(max_bits=128, max_cost=None)
+    monkeypatch.setitem(app.config["COST_LIMITS"], "prefix_stream_calculator", limits)
+    monkeypatch.setitem(app.config["COST_LIMITS"], "infix_stream_calculator", limits)
+    # when
+    # ... an expression computing a 201 bits value is streamed
+    response = client.post(route, data=data)
+    # then
+    # ... its evaluation is aborted
+    assert response.status_code == 422
+    assert response.json == {
+        "message": "The expression exceeds the resource limits of the server: An intermediate value of 201 bits is "
+        "above the limit of 128 bits."
+    }
+
+
+@pytest.mark.parametrize(
+    "route, expression",
+    (
+        ["/calculator/prefix/", f"* {'9' * 3000} {'9' * 3000}"],
+        ["/calculator/infix/", f"( {'9' * 3000} * {'9' * 3000} )"],
+    ),
+)
+def test_calculator_endpoints_return_results_of_more_digits_than_the_int_str_limit(client, route, expression):
+    # given
+    # ... an expression whose result has 6000 digits, more than the 4300 digits str() converts by default
+    # when
+    # ... it's posted to the single expression route and to the batch route
+    response = client.post(route, json={"expression": expression})
+    batch = client.post(f"{route}batch/", json=[expression])
+    # then
+    # ... the results are JSON numbers, which need parse_literal to be read back in python
+    expected = 10**6000 - 2 * 10**3000 + 1
+    assert response.status_code == 200
+    assert json.loads(response.get_data(as_text=True), parse_int=parse_literal) == {"result": expected}
+    assert json.loads(batch.get_data(as_text=True), parse_int=parse_literal) == {"index": 0, "result": expected}
+
+
+@pytest.fixture
+def offload_client(client):
+    app.config.update(OFFLOAD_ENABLED=True, OFFLOAD_MIN_INSTRUCTIONS=3, OFFLOAD_WORKERS=1, OFFLOAD_MAX_QUEUE=0)
+    yield client
+    app.config.update(OFFLOAD_ENABLED=False, OFFLOAD_MIN_INSTRUCTIONS=10000)
+    webapp.get_evaluation_pool().close()
+    webapp.evaluation_pool = None
+
+
+@pytest.mark.parametrize(
+    "route, expression, expected_status_code, expected",
+    (
+        ["/calculator/prefix/", "+ 1 * 2 3", 200, {"result": 7}],
+        ["/calculator/infix/", "( ( 2 * 3 ) - 1 )", 200, {"result": 5}],
+        ["/calculator/prefix/", "+ 1 / 2 0", 500, {"message": "Zero division not supported."}],
+    ),
+)
+def test_calculator_endpoints_offload_expensive_expressions(
+    offload_client, route, expression, expected_status_code, expected
+):
+    # given
+    # ... offloading enabled for expressions with 3 instructions or more
+    # when
+    # ... an expensive expression is posted
+    response = offload_client.post(route, json={"expression": expression})
+    # then
+    # ... it's evaluated by the evaluation pool
+    assert response.status_code == expected_status_code
+    assert response.json == expected
+    assert offload_client.get("/calculator/offload/").json["started"] == 1
+
+
+
+def test_calculator_endpoints_bound_the_offloaded_evaluations(offload_client, monkeypatch):
+    # given
+    # ... offloaded evaluations whose values can't exceed 128 bits
+    monkeypatch.setitem(app.config, "MAX_INTERMEDIATE_BITS", 128)
+    # when
+    # ... an expression computing a 201 bits value is posted
+    response = offload_client.post("/calculator/prefix/", json={"expression": f"* {2 ** 100} {2 ** 100}"})
+    # then
+    # ... its evaluation is aborted by the worker process
+    assert response.status_code == 422
+    assert response.json == {
+        "message": "The expression exceeds the resource limits of the server: An intermediate value of 201 bits is "
+        "above the limit of 128 bits."
+    }
+
+
+@pytest.fixture
+def parallel_client(client):
+    app.config.update(PARALLEL_ENABLED=True, PARALLEL_WORKERS=2, PARALLEL_MIN_COST=1, EXPRESSION_CACHE_ENABLED=False)
+    yield client
+    app.config.update(PARALLEL_ENABLED=False, EXPRESSION_CACHE_ENABLED=True)
+    webapp.get_parallel_evaluator().close()
+    webapp.parallel_evaluator = None
+
+
+@pytest.mark.parametrize(
+    "route, expression, expected_status_code, expected",
+    (
+        ["/calculator/prefix/", "+ * 9 9 / 9 2", 200, {"result": 85.5}],
+        ["/calculator/infix/", "( ( 9 * 9 ) - ( 8 / 2 ) )", 200, {"result": 77}],
+        ["/calculator/prefix/", "+ * 9 9 / 9 0", 500, {"message": "Zero division not supported."}],
+    ),
+)
+def test_calculator_endpoints_evaluate_subtrees_in_parallel(
+    parallel_client, route, expression, expected_status_code, expected
+):
+    # given
+    # ... parallel evaluation enabled for all the subtrees
+    # when
+    # ... an expression with 2 independent subtrees is posted
+    response = parallel_client.post(route, json={"expression": expression})
+    # then
+    # ... its subtrees are evaluated by the worker processes
+    assert response.status_code == expected_status_code
+    assert response.json == expected
+    assert parallel_client.get("/calculator/parallel/").json["subtrees"] == 2
+
+
+def test_calculator_endpoints_return_503_when_the_evaluation_pool_is_busy(offload_client, monkeypatch):
+    # given
+    # ... an evaluation pool with no room left
+    monkeypatch.setattr(webapp.get_evaluation_pool(), "pending", 1)
+    # when
+    # ... an expensive expression is posted
+    response = offload_client.post("/calculator/prefix/", json={"expression": "+ 1 * 2 30"})
+    # then
+    # ... the client is asked to retry later
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert response.json == {"message": "The server is busy, please retry later."}
+
+
+def test_metrics_endpoint(client):
+    # given
+    # ... a few requests, one of them failing
+    requests = webapp.REQUESTS.value("/calculator/prefix/", 200)
+    errors = webapp.ERRORS.value("ZeroDivisionError")
+    evaluated = webapp.PHASE_SECONDS.count("evaluate")
+    client.post("/calculator/prefix/", json={"expression": "+ 1 2"})
+    client.post("/calculator/prefix/", json={"expression": "/ 1 0"})
+    # when
+    # ... the /metrics endpoint is called
+    response = client.get("/metrics")
+    # then
+    # ... the requests, errors and phases are counted, and exposed in the prometheus text format
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    assert webapp.REQUESTS.value("/calculator/prefix/", 200) == requests + 1
+    assert webapp.ERRORS.value("ZeroDivisionError") == errors + 1
+    assert webapp.PHASE_SECONDS.count("evaluate") >= evaluated + 1
+    metrics = response.get_data(as_text=True)
+    assert 'calculator_requests_total{route="/calculator/prefix/",status="200"}' in metrics
+    assert 'calculator_errors_total{error="ZeroDivisionError"}' in metrics
+    assert 'calculator_phase_duration_seconds_count{phase="serialize"}' in metrics
+    assert 'calculator_expression_length_chars_bucket{notation="prefix",le="8"}' in metrics
+    assert 'calculator_cache_hit_ratio{cache="local"}' in metrics
+
+
+@pytest.mark.parametrize(
+    "route, expression, expected_status_code, expected",
+    (
+        ["/calculator/prefix/", "* + 3 4 + 3 4", 200, {"result": 49}],
+        ["/calculator/infix/", "( ( 5 / 0 ) + ( 5 / 0 ) )", 500, {"message": "Zero division not supported."}],
+    ),
+)
+def test_calculator_endpoints_with_deduplication(client, route, expression, expected_status_code, expected):
+    # given
+    # ... the deduplication of repeated subexpressions enabled, and the expression cache disabled
+    app.config["DEDUPLICATION_ENABLED"] = True
+    app.config["EXPRESSION_CACHE_ENABLED"] = False
+    deduplicated = webapp.DEDUPLICATED_NODES.value()
+    try:
+        # when
+        # ... an expression with repeated subexpressions is posted
+        response = client.post(route, json={"expression": expression})
+    finally:
+        app.config["DEDUPLICATION_ENABLED"] = False
+        app.config["EXPRESSION_CACHE_ENABLED"] = True
+    # then
+    # ... the response is the same as without deduplication, and the deduplicated nodes are counted
+    assert response.status_code == expected_status_code
+    assert response.json == expected
+    assert webapp.DEDUPLICATED_NODES.value() == deduplicated + 3
+
+
+def test_calculator_endpoints_coalesce_identical_concurrent_requests(client, monkeypatch):
+    # given
+    # ... a slow evaluation, and the expression cache disabled
+    started, release = threading.Event(), threading.Event()
+    evaluate_expression = webapp.evaluate_expression
+
+    def slow_evaluate_expression(notation, expression, limits):
+        started.set()
+        release.wait(5)
+        return evaluate_expression(notation, expression, limits)
+
+    monkeypatch.setattr(webapp, "evaluate_expression", slow_evaluate_expression)
+    monkeypatch.setitem(app.config, "EXPRESSION_CACHE_ENABLED", False)
+    coalesced = client.get("/calculator/coalescing/").json["coalesced"]
+    # when
+    # ... the same expression is posted by several clients while it's evaluated
+    responses = []
+
+    def post():
+        responses.append(app.test_client().post("/calculator/prefix/", json={"expression": "* 6 7"}))
+
+    threads = [threading.Thread(target=post)]
+    threads[0].start()
+    started.wait(5)
+    threads += [threading.Thread(target=post) for _ in range(2)]
+    for thread in threads[1:]:
+        thread.start()
+    time.sleep(0.2)
+    release.set()
+    for thread in threads:
+        thread.join()
+    # then
+    # ... they all get the result of the single evaluation
+    assert [(response.status_code, response.json) for response in responses] == [(200, {"result": 42})] * 3
+    assert client.get("/calculator/coalescing/").json["coalesced"] == coalesced + 2
+
+
+@pytest.mark.parametrize(
+    "endpoint, route, limits, expression, exception_msg",
+    (
+        [
+            "prefix_calculator",
+            "/calculator/prefix/",
+            webapp.CostLimits(max_bits=2000, max_cost=None),
+            f"+ 1 * {2 ** 1000} {2 ** 1000}",
+            "The values of the expression could reach 2003 bits, above the limit of 2000 bits.",
+        ],
+        [
+            "infix_calculator",
+            "/calculator/infix/",
+            webapp.CostLimits(max_bits=None, max_cost=10),
+            f"( {2 ** 1000} * {2 ** 1000} )",
+            "The estimated cost of the expression (1156) is above the limit of 10.",
+        ],
+    ),
+)
+def test_calculator_endpoints_reject_expressions_exceeding_the_resource_limits(
+    client, monkeypatch, endpoint, route, limits, expression, exception_msg
+):
+    # given
+    # ... the resource limits of the route
+    monkeypatch.setitem(app.config["COST_LIMITS"], endpoint, limits)
+    # when
+    # ... an expression exceeding them is posted
+    response = client.post(route, json={"expression": expression})
+    # then
+    # ... it's rejected before being evaluated
+    assert response.status_code == 422
+    assert response.json == {"message": f"The expression exceeds the resource limits of the server: {exception_msg}"}
+
+
+def test_batch_endpoints_apply_their_own_resource_limits(client, monkeypatch):
+    # given
+    # ... batch routes with a lower cost limit than the single expression routes
+    limits = webapp.CostLimits(max_bits=None, max_cost=10)
+    monkeypatch.setitem(app.config["COST_LIMITS"], "prefix_batch_calculator", limits)
+    expression = f"* {2 ** 1000} {2 ** 1000}"
+    # when
+    # ... the same expression is posted to both (first to the batch one, as the cached results are not limited)
+    batch = client.post("/calculator/prefix/batch/", json=[expression, "+ 1 2"])
+    single = client.post("/calculator/prefix/", json={"expression": expression})
+    # then
+    # ... it's only rejected by the batch route
+    assert single.status_code == 200
+    records = [json.loads(line) for line in batch.get_data(as_text=True).splitlines()]
+    assert records[0]["status"] == 422
+    assert records[1] == {"index": 1, "result": 3}
+
+
+def test_session_endpoints_reevaluate_patched_expressions(client):
+    # given
+    # ... a session for an expression dividing by zero
+    data = {"notation": "infix", "expression": "( ( 2 * 3 ) + ( 4 / 0 ) )"}
+    response = client.post("/calculator/sessions/", json=data)
+    assert response.status_code == 201
+    session = response.json["session"]
+    assert response.json["error"] == "ZeroDivisionError"
+    # when
+    # ... the zero is replaced
+    response = client.patch(f"/calculator/sessions/{session}/", json={"path": [1, 1], "expression": "2"})
+    # then
+    # ... the expression is re-evaluated
+    assert response.status_code == 200
+    assert response.json == {"session": session, "recomputed": 2, "result": 8}
+    response = client.get(f"/calculator/sessions/{session}/")
+    assert response.json == {"session": session, "expression": "( ( 2 * 3 ) + ( 4 / 2 ) )", "result": 8}
+
+
+@pytest.mark.parametrize(
+    "method, route, json, expected_status_code",
+    (
+        ["post", "/calculator/sessions/", {"notation": "postfix", "expression": "1 2 +"}, 400],
+        ["post", "/calculator/sessions/", {"expression": "+ 1"}, 400],
+        ["patch", "/calculator/sessions/{session}/", {"path": [0, 0], "expression": "1"}, 400],
+        ["patch", "/calculator/sessions/{session}/", {"path": [0], "expression": "+ 1"}, 400],
+        ["post", "/calculator/sessions/", {"expression": 12}, 400],
+        ["patch", "/calculator/sessions/{session}/", {"path": [0], "expression": 1}, 400],
+        ["patch", "/calculator/sessions/{session}/", {"path": [1.0], "expression": "1"}, 400],
+        ["patch", "/calculator/sessions/{session}/", {"path": [True], "expression": "1"}, 400],
+        ["patch", "/calculator/sessions/unknown/", {"path": [0], "expression": "1"}, 404],
+        ["delete", "/calculator/sessions/unknown/", None, 404],
+    ),
+)
+def test_session_endpoints_reject_invalid_requests(client, method, route, json, expected_status_code):
+    session = client.post("/calculator/sessions/", json={"expression": "+ 1 2"}).json["session"]
+    response = getattr(client, method)(route.format(session=session), json=json)
+    assert response.status_code == expected_status_code
+    assert client.get(f"/calculator/sessions/{session}/").json["result"] == 3
+
+
+@pytest.mark.parametrize(
+    "route, expression, expected_status_code, expected",
+    (
+        ["/calculator/prefix/", f"* {3 ** 5000} - 0 {2 ** 3000}", 200, {"result": -(3**5000) * 2**3000}],
+        ["/calculator/infix/", "( 7 / 2 )", 200, {"result": 3.5}],
+        [
+            "/calculator/infix/",
+            "( 1 + 2",
+            400,
+            {"message": "Please check the provided expression is in the infix notation: Invalid parentheses configuration in input string."},
+        ],
+        ["/calculator/prefix/", "/ 1 0", 500, {"message": "Zero division not supported."}],
+    ),
+)
+@pytest.mark.parametrize("cache_enabled", (True, False))
+def test_calculator_endpoints_with_binary_payloads(
+    client, monkeypatch, cache_enabled, route, expression, expected_status_code, expected
+):
+    # given
+    # ... the expression cache enabled or disabled, along with the features compiling the expressions
+    for feature in ("EXPRESSION_CACHE_ENABLED", "METRICS_ENABLED", "GOVERNOR_ENABLED"):
+        monkeypatch.setitem(app.config, feature, cache_enabled)
+    # when
+    # ... the tokens of the expression are posted in the binary format, asking for a binary response
+    response = client.post(
+        route, data=encode_expression(expression), content_type=MIMETYPE, headers={"Accept": MIMETYPE}
+    )
+    # then
+    # ... the response is in the binary format
+    assert response.status_code == expected_status_code
+    assert response.mimetype == MIMETYPE
+    assert decode_response(response.get_data()) == expected
+
+
+@pytest.mark.parametrize(
+    "accept, expected_mimetype",
+    (
+        [None, "application/json"],
+        ["*/*", "application/json"],
+        [f"application/json, {MIMETYPE}", "application/json"],
+        [f"application/json;q=0.5, {MIMETYPE}", MIMETYPE],
+        [MIMETYPE, MIMETYPE],
+    ),
+)
+def test_calculator_endpoints_negotiate_the_format_of_the_response(client, accept, expected_mimetype):
+    # when
+    # ... a JSON expression is posted
+    headers = {"Accept": accept} if accept else {}
+    response = client.post("/calculator/prefix/", json={"expression": "+ 1 2"}, headers=headers)
+    # then
+    # ... the response is in the format preferred by the Accept header, JSON by default
+    assert response.status_code == 200
+    assert response.mimetype == expected_mimetype
+    assert decode_response(response.get_data()) == {"result": 3} if expected_mimetype == MIMETYPE else response.json
+
+
+def test_calculator_endpoints_reject_truncated_binary_payloads(client):
+    # when
+    # ... a payload whose last literal is truncated is posted
+    payload = encode_expression(f"+ 1 {2 ** 100}")[:-1]
+    response = client.post("/calculator/prefix/", data=payload, content_type=MIMETYPE)
+    # then
+    assert response.status_code == 400
+    assert response.json == {
+        "message": "Please check the provided expression is in the prefix notation: The literal at byte 7 of the "
+        "payload is truncated: 13 bytes expected."
+    }
+
+
+@pytest.mark.parametrize(
+    "server_token, request_token",
+    (
+        # profiling is disabled without a token
+        ["", "secret"],
+        ["", ""],
+        ["secret", "wrong"],
+    ),
+)
+def test_calculator_endpoints_reject_profiling_requests_without_the_token(
+    client, monkeypatch, server_token, request_token
+):
+    # given
+    # ... the profiling token of the server
+    monkeypatch.setitem(app.config, "PROFILING_TOKEN", server_token)
+    # when
+    response = client.post(
+        "/calculator/prefix/", json={"expression": "+ 1 2"}, headers={"X-Profiling-Token": request_token}
+    )
+    # then
+    assert response.status_code == 403
+    assert response.json == {"message": "Profiling requires the profiling token of the server."}
+    assert "X-Profile" not in response.headers
+
+
+@pytest.mark.parametrize(
+    "route, expression, expected_status_code, expected_depths",
+    (
+        ["/calculator/prefix/", f"+ * {2 ** 100} {2 ** 200} 1", 200, {"stack": 3}],
+        ["/calculator/infix/", "( 1 + ( 2 / 0 ) )", 500, {"op_stack": 4, "val_stack": 3}],
+    ),
+)
+def test_calculator_endpoints_profile_evaluations(
+    client, monkeypatch, tmp_path, route, expression, expected_status_code, expected_depths
+):
+    # given
+    # ... a profiling token, and a directory for the profiles
+    monkeypatch.setitem(app.config, "PROFILING_TOKEN", "secret")
+    monkeypatch.setitem(app.config, "PROFILE_DIR", str(tmp_path))
+    # when
+    # ... an expression is posted with the token (after being cached, which profiling bypasses)
+    client.post(route, json={"expression": expression})
+    response = client.post(route, json={"expression": expression}, headers={"X-Profiling-Token": "secret"})
+    # then
+    # ... the summary of its evaluation is sent back, and its profile saved
+    assert response.status_code == expected_status_code
+    summary = json.loads(response.headers["X-Profile"])
+    assert summary["peak_stack_depth"] == expected_depths
+    assert summary["tokenize_seconds"] > 0 and summary["operator_seconds"] > 0
+    assert summary["profile"] == str(next(tmp_path.iterdir()))
+    # ... and the requests without the token aren't profiled
+    assert "X-Profile" not in client.post(route, json={"expression": expression}).headers
+
+
+def test_calculator_endpoints_reject_malformed_expressions_without_evaluating_them(client, monkeypatch):
+    # given
+    # ... a compiler which fails if it's reached
+    def compile_request(notation, expression):
+        raise AssertionError(expression)
+
+    monkeypatch.setattr(webapp, "compile_request", compile_request)
+    before = client.get("/calculator/errors/").json["errors"].get("InvalidCharacterError", 0)
+    # when
+    response = client.post("/calculator/infix/", json={"expression": "( a + b )"})
+    # then
+    # ... the expression is rejected by the validation, with the same response, and its error is counted
+    assert response.status_code == 400
+    assert response.json == {
+        "message": "Please check the provided expression is in the infix notation: Invalid character found in "
+        "expression: 'a'."
+    }
+    assert client.get("/calculator/errors/").json["errors"]["InvalidCharacterError"] == before + 1
+
+
+def test_calculator_endpoints_only_validate_the_expressions_missing_from_the_cache(client, monkeypatch):
+    # given
+    # ... an empty cache, and a validation counting the expressions it validates
+    expression_cache.clear()
+    validated = []
+
+    def validate(notation, expression):
+        validated.append(expression)
+        return None
+
+    monkeypatch.setattr(webapp, "validate", validate)
+    # when
+    # ... an expression is posted twice
+    responses = [client.post("/calculator/prefix/", json={"expression": "+ 19 23"}) for _ in range(2)]
+    # then
+    # ... it's only validated before being evaluated, not when it's found in the cache
+    assert [response.json for response in responses] == [{"result": 42}, {"result": 42}]
+    assert validated == ["+ 19 23"]
+
+
+def test_calculator_endpoints_evaluate_malformed_expressions_dividing_first(client):
+    # when
+    # ... a malformed expression whose division is applied before its error is found is posted
+    response = client.post("/calculator/prefix/", json={"expression": "5 / 1 0"})
+    # then
+    # ... it's evaluated, raising the zero division first
+    assert response.status_code == 500
+    assert response.json == {"message": "Zero division not supported."}
+
+
+@pytest.mark.parametrize(
+    "json, expected_status_code, expected",
+    (
+        [{"expression": "+ 1 2"}, 200, {"valid": True}],
+        [
+            {"notation": "infix", "expression": "( 6 10 )"},
+            200,
+            {
+                "valid": False,
+                "code": "not_enough_operators",
+                "message": "Not enough operators/parentheses to perform the operation.",
+                "position": 7,
+            },
+        ],
+        [{"notation": "postfix", "expression": "1 2 +"}, 400, {"message": "The notation must be 'prefix' or 'infix'."}],
+        [{"notation": "infix", "expression": 5}, 400, {"message": "The expression must be a string."}],
+    ),
+)
+def test_validate_endpoint(client, json, expected_status_code, expected):
+    response = client.post("/calculator/validate/", json=json)
+    assert response.status_code == expected_status_code
+    assert response.json == expected
+
+
+@pytest.mark.parametrize("route", ("/calculator/prefix/", "/calculator/infix/", "/calculator/algebraic/"))
+@pytest.mark.parametrize("expression", (5, None, ["+", 1, 2]))
+def test_calculator_endpoints_reject_expressions_which_arent_strings(client, route, expression):
+    # when
+    response = client.post(route, json={"expression": expression})
+    # then
+    # ... they're rejected as by the sessions and batch endpoints
+    assert response.status_code == 400
+    assert response.json == {"message": "The expression must be a string."}
+
+
+@pytest.mark.parametrize(
+    "expression, expected_status_code, expected",
+    (
+        ["1 + 2 * 3", 200, {"result": 7}],
+        ["( 1 + 2 ) * 3 - 4 / 8", 200, {"result": 8.5}],
+        ["( ( 1 + 2 ) * 3 )", 200, {"result": 9}],
+        [
+            "( 1 + 2",
+            400,
+            {
+                "message": "Please check the provided expression is in the algebraic notation: Invalid parentheses "
+                "configuration in input string."
+            },
+        ],
+        ["1 / 0", 500, {"message": "Zero division not supported."}],
+    ),
+)
+def test_algebraic_calculator_endpoint(client, expression, expected_status_code, expected):
+    # given
+    # ... an infix expression with operator precedence, not necessarily fully parenthesized
+    # when
+    # ... the /calculator/algebraic/ endpoint is called
+    response = client.post("/calculator/algebraic/", json={"expression": expression})
+    # then
+    # ... the expression is evaluated with operator precedence
+    assert response.status_code == expected_status_code
+    assert response.json == expected
+
+
+def test_batch_endpoints_keep_streaming_after_an_overflow(client):
+    # given
+    # ... a batch whose second item overflows the floats
+    data = json.dumps(["+ 1 2", f"/ {10 ** 400} 3", "+ 3 4"])
+    # when
+    # ... the /calculator/prefix/batch/ endpoint is called
+    response = client.post("/calculator/prefix/batch/", data=data, content_type="application/json")
+    records = [json.loads(line) for line in response.data.decode().splitlines()]
+    # then
+    # ... the overflow is the error record of its item, and the next items are evaluated
+    assert [record["index"] for record in records] == [0, 1, 2]
+    assert records[1]["error"] == "OverflowError"
+    assert records[1]["status"] == 422
+    assert records[2]["result"] == 7
+
+
+@pytest.mark.parametrize(
+    "route, expression",
+    (
+        ["/calculator/prefix/", f"/ {10 ** 400} 3"],
+        ["/calculator/infix/", f"( {10 ** 400} / 3 )"],
+        ["/calculator/algebraic/", f"{10 ** 400} / 3"],
+    ),
+    ids=("prefix", "infix", "algebraic"),
+)
+def test_calculator_endpoints_report_overflows_as_the_batch_endpoints_do(client, route, expression):
+    # when
+    # ... an expression whose division overflows the floats is posted
+    response = client.post(route, json={"expression": expression})
+    # then
+    # ... it can't be evaluated, as in a batch
+    assert response.status_code == 422
+    assert response.json == {
+        "message": "The expression can't be evaluated: integer division result too large for a float"
+    }
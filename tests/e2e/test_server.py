@@ -0,0 +1,94 @@
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def post(port, route, expression, method="POST", **fields):
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{port}{route}",
+        data=json.dumps({"expression": expression, **fields}).encode(),
+        headers={"Content-Type": "application/json"},
+        method=method,
+    )
+    with urllib.request.urlopen(request, timeout=5) as response:
+        return json.loads(response.read())
+
+
+def wait_until_serving(port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/status/", timeout=1):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+@pytest.fixture
+def server(unused_port):
+    process = subprocess.Popen(
+        [sys.executable, "server.py", "--host", "127.0.0.1", "--port", str(unused_port), "--workers", "2"],
+        cwd=ROOT,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    wait_until_serving(unused_port)
+    yield process
+    if process.poll() is None:
+        process.kill()
+        process.wait()
+
+
+@pytest.fixture
+def unused_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="the pre-fork server needs os.fork")
+def test_server_serves_reloads_and_stops_gracefully(server, unused_port):
+    # given
+    # ... the pre-fork server running 2 workers
+    # when
+    # ... expressions are posted, before and after a reload
+    assert post(unused_port, "/calculator/prefix/", "+ 1 2") == {"result": 3}
+    server.send_signal(signal.SIGHUP)
+    time.sleep(1)
+    results = [post(unused_port, "/calculator/infix/", "( 1 + 2 )") for _ in range(20)]
+    # then
+    # ... they keep being served, and the server stops on SIGTERM
+    assert results == [{"result": 3}] * 20
+    server.send_signal(signal.SIGTERM)
+    assert server.wait(timeout=10) == 0
+    logs = server.stderr.read()
+    assert logs.count("Reloading workers.") == 1
+    assert logs.count("Started worker") == logs.count("exited.") == 4
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="the pre-fork server needs os.fork")
+def test_server_shares_the_sessions_between_its_workers(server, unused_port):
+    # given
+    # ... a session started on one of the 2 workers
+    session = post(unused_port, "/calculator/sessions/", "+ 0 0")["session"]
+    # when
+    # ... it's patched and read many times, by either worker
+    responses = []
+    for value in range(1, 21):
+        post(unused_port, f"/calculator/sessions/{session}/", str(value), method="PATCH", path=[0])
+        with urllib.request.urlopen(f"http://127.0.0.1:{unused_port}/calculator/sessions/{session}/") as response:
+            responses.append(json.loads(response.read()))
+    # then
+    # ... every request sees the latest patch
+    assert [response["result"] for response in responses] == list(range(1, 21))
@@ -0,0 +1,78 @@
+import io
+import json
+
+import pytest
+
+from batch import InvalidBatchError, dumps_record, evaluate_batch, iter_json_array, iter_ndjson
+from expression_cache import EVALUATION_ERRORS
+from prefix_calculator import evaluate_prefix_notation
+from tokenizer import parse_literal
+
+
+@pytest.mark.parametrize("chunk_size", (1, 2, 7, 1024))
+@pytest.mark.parametrize(
+    "body, expected",
+    (
+        ['["+ 1 2", {"expression": "3"}, 12345, "é"]', ["+ 1 2", {"expression": "3"}, 12345, "é"]],
+        [' [ ] ', []],
+        ['\n[\n"1"\n,\n"2"\n]\n', ["1", "2"]],
+    ),
+)
+def test_iter_json_array(chunk_size, body, expected):
+    assert list(iter_json_array(io.BytesIO(body.encode()), chunk_size=chunk_size)) == expected
+
+
+@pytest.mark.parametrize("body", ('{"expression": "1"}', '["1" "2"]', '["1", ', '["1", x]'))
+def test_iter_json_array_when_it_raises_exception(body):
+    with pytest.raises(InvalidBatchError):
+        list(iter_json_array(io.BytesIO(body.encode()), chunk_size=3))
+
+
+def test_iter_ndjson():
+    items = list(iter_ndjson(io.BytesIO(b'"+ 1 2"\n\n{"expression": "3"}\nnot json\n')))
+    assert items[:2] == ["+ 1 2", {"expression": "3"}]
+    assert isinstance(items[2], InvalidBatchError)
+
+
+def test_iter_ndjson_rejects_long_lines():
+    # given
+    # ... a NDJSON stream with a line longer than the max item size between 2 valid ones
+    stream = io.BytesIO(b'"+ 1 2"\n"' + b"1" * 100 + b'"\n"3"\n')
+    # when
+    # ... its items are read
+    items = list(iter_ndjson(stream, max_item_size=50))
+    # then
+    # ... the long line yields an error, and the next one is read
+    assert items[0] == "+ 1 2"
+    assert isinstance(items[1], InvalidBatchError)
+    assert items[2] == "3"
+
+
+def test_evaluate_batch_turns_errors_into_records():
+    # given
+    # ... a batch of valid and invalid expressions
+    items = ["+ 1 2", "+ 1", {"expression": "/ 1 0"}, 5, InvalidBatchError("The batch item is not valid JSON.")]
+    # when
+    # ... the batch is evaluated
+    lines = evaluate_batch(
+        items,
+        evaluate_prefix_notation,
+        lambda e: ({"message": str(e)}, 500 if isinstance(e, ZeroDivisionError) else 400),
+        EVALUATION_ERRORS,
+    )
+    records = [json.loads(line) for line in lines]
+    # then
+    # ... every item gets a record, in input order
+    assert [record["index"] for record in records] == [0, 1, 2, 3, 4]
+    assert records[0] == {"index": 0, "result": 3}
+    assert records[1]["error"] == "MalformedPrefixNotationError"
+    assert records[1]["status"] == 400
+    assert records[2] == {"index": 2, "error": "ZeroDivisionError", "message": "division by zero", "status": 500}
+    assert records[3]["error"] == records[4]["error"] == "InvalidBatchError"
+
+
+@pytest.mark.parametrize("result", (3, 2.5, 10**5000, -(10**5000) + 1), ids=("int", "float", "long", "negative_long"))
+def test_dumps_record_writes_results_of_any_size(result):
+    line = dumps_record({"index": 0, "result": result})
+    parse_int = lambda digits: -parse_literal(digits[1:]) if digits[0] == "-" else parse_literal(digits)
+    assert json.loads(line, parse_int=parse_int) == {"index": 0, "result": result}
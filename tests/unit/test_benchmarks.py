@@ -0,0 +1,164 @@
+import pytest
+
+from benchmarks.generators import random_infix_expression, random_prefix_expression
+from benchmarks.load import ClientTransport, check, generate_traffic, parse_mix, percentile
+from benchmarks.load import run as run_load
+from benchmarks.precedence import minimal_parentheses
+from benchmarks.suite import compare, measure
+from benchmarks.suite import _evaluator as suite_evaluator
+from compiler import compile_infix_notation
+from infix_calculator import evaluate_algebraic_notation, evaluate_infix_notation
+from prefix_calculator import evaluate_prefix_notation
+
+
+@pytest.mark.parametrize(
+    "tokens, depth, literal_digits, operators",
+    (
+        [3, 1, 3, "+"],
+        [15, 4, 2, "+-*/"],
+        [201, 100, 1, "+-"],
+        [31, 5, 50, {"+": 8, "*": 1}],
+    ),
+)
+def test_random_expressions_are_valid_and_equivalent(tokens, depth, literal_digits, operators):
+    # given
+    # ... a prefix and an infix expression generated with the same seed and shape
+    prefix = random_prefix_expression(7, tokens, depth, literal_digits, operators)
+    infix = random_infix_expression(7, tokens, depth, literal_digits, operators)
+    # when
+    # ... they're evaluated
+    # then
+    # ... they have the requested number of tokens and the same value
+    assert len(prefix.split()) == tokens
+    assert len([token for token in infix.split() if token not in "()"]) == tokens
+    assert evaluate_prefix_notation(prefix) == evaluate_infix_notation(infix)
+
+
+def test_random_expressions_respect_the_depth():
+    infix = random_infix_expression(3, tokens=63, depth=6)
+    depth = max_depth = 0
+    for token in infix.split():
+        depth += {"(": 1, ")": -1}.get(token, 0)
+        max_depth = max(max_depth, depth)
+    assert max_depth == 6
+    assert random_infix_expression(3, tokens=63, depth=6) == infix
+    assert random_infix_expression(4, tokens=63, depth=6) != infix
+
+
+def test_compare_reports_regressions_past_the_threshold():
+    # given
+    # ... a baseline, and results slower by 5% in a case and by 20% (and using more memory) in another
+    baseline = {
+        "results": {
+            "small": {"prefix_evaluator": {"ops_per_sec": 1000, "peak_bytes": 1000}},
+            "long": {"prefix_evaluator": {"ops_per_sec": 100, "peak_bytes": 1000}},
+        }
+    }
+    current = {
+        "results": {
+            "small": {"prefix_evaluator": {"ops_per_sec": 950, "peak_bytes": 900}},
+            "long": {"prefix_evaluator": {"ops_per_sec": 80, "peak_bytes": 1500}},
+            "deep": {"prefix_evaluator": {"ops_per_sec": 1, "peak_bytes": 1}},
+        }
+    }
+    # when
+    # ... they're compared with a 10% threshold
+    regressions = compare(baseline, current, threshold=0.1)
+    # then
+    # ... only the metrics regressing by more than 10% are reported
+    assert regressions == [
+        "long prefix_evaluator ops_per_sec: 100 -> 80 (-20.0%)",
+        "long prefix_evaluator peak_bytes: 1000 -> 1500 (+50.0%)",
+    ]
+
+
+def test_failing_routes_are_not_measured():
+    # given
+    # ... the prefix route, answering a division by zero with a 500
+    post, _ = suite_evaluator("prefix_route")
+    # when
+    # ... it's measured on the division by zero
+    result = measure(post, "/ 1 0", repeat=1, min_time=0.01)
+    # then
+    # ... the failure is recorded instead of the metrics, and reported when compared with a baseline
+    assert result["ops_per_sec"] is None and result["peak_bytes"] is None
+    assert result["failure"] == "500 Zero division not supported."
+    baseline = {"results": {"small": {"prefix_route": {"ops_per_sec": 1000, "peak_bytes": 1000}}}}
+    assert compare(baseline, {"results": {"small": {"prefix_route": result}}}) == [
+        "small prefix_route failed: 500 Zero division not supported."
+    ]
+
+
+@pytest.mark.parametrize(
+    "expression, expected",
+    (
+        ["( ( 1 + 2 ) * 3 )", "( 1 + 2 ) * 3"],
+        ["( ( 1 * 2 ) + 3 )", "1 * 2 + 3"],
+        ["( 8 - ( 2 - 1 ) )", "8 - ( 2 - 1 )"],
+        ["( ( 8 - 2 ) - 1 )", "8 - 2 - 1"],
+    ),
+)
+def test_minimal_parentheses(expression, expected):
+    assert minimal_parentheses(compile_infix_notation(expression)) == expected
+
+
+def test_minimal_parentheses_keep_the_value_of_random_expressions():
+    infix = random_infix_expression(5, tokens=201, depth=100, operators="+-*")
+    algebraic = minimal_parentheses(compile_infix_notation(infix))
+    assert algebraic.count("(") < infix.count("(")
+    assert evaluate_algebraic_notation(algebraic) == evaluate_infix_notation(infix)
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert [percentile(values, fraction) for fraction in (0.5, 0.95, 0.99, 1.0)] == [50, 95, 99, 100]
+    assert percentile([7], 0.99) == 7
+    assert percentile([], 0.5) is None
+
+
+def test_generate_traffic_follows_the_mix():
+    # given
+    # ... a mix of well formed prefix requests and malformed ones
+    mix = parse_mix("prefix=3,malformed=1")
+    # when
+    # ... the requests are generated
+    requests = generate_traffic(mix, pool=400, seed=1)
+    # then
+    # ... there are about 3 times more prefix requests, and the same arguments generate the same requests
+    kinds = [request.kind for request in requests]
+    assert 250 < kinds.count("prefix") < 350
+    assert kinds.count("prefix") + kinds.count("malformed") == 400
+    assert generate_traffic(mix, pool=400, seed=1) == requests
+
+
+def test_load_run_reports_latencies_and_errors():
+    # given
+    # ... a mix of every kind of requests, sent to the webapp in process
+    requests = generate_traffic(parse_mix("prefix,infix,algebraic,malformed,big_int"), pool=50)
+    # when
+    # ... 100 requests are sent from 4 threads
+    report = run_load(ClientTransport(), requests, concurrency=4, duration=60, max_requests=100)
+    # then
+    # ... every request got its expected status code (400 for the malformed ones), and is in the report
+    assert report["requests"] == 100
+    assert report["error_rate"] == 0
+    assert sum(kind["requests"] for kind in report["kinds"].values()) == 100
+    assert report["kinds"]["malformed"]["status_codes"] == {"400": report["kinds"]["malformed"]["requests"]}
+    latencies = report["latency_seconds"]
+    assert 0 < latencies["p50"] <= latencies["p95"] <= latencies["p99"] <= latencies["max"]
+    assert check(report, max_error_rate=0.01, max_p99=latencies["p99"]) == []
+    assert len(check(report, max_p99=latencies["p99"] / 2)) == 1
+
+
+def test_load_run_at_a_target_rate():
+    # given
+    # ... well formed requests, scheduled at 200 requests per second for half a second
+    requests = generate_traffic(parse_mix("prefix"), pool=10)
+    # when
+    # ... they're sent to the webapp in process
+    report = run_load(ClientTransport(), requests, concurrency=2, duration=0.5, rate=200)
+    # then
+    # ... the requests scheduled within the duration were sent
+    assert report["requests"] == 100
+    assert report["rate"] == 200
+    assert report["error_rate"] == 0
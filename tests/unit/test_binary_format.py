@@ -0,0 +1,64 @@
+import pytest
+
+from binary_format import decode_response, decode_tokens, encode_expression, encode_response, encode_tokens
+from exceptions import InvalidPayloadError
+
+
+@pytest.mark.parametrize(
+    "tokens",
+    (
+        ["+", 1, 2],
+        ["(", 0, "*", 255, ")"],
+        ["-", 2**4000, 3**9000],
+        # the bytes which aren't literals are decoded as chars, valid or not
+        ["+", "a", 1],
+    ),
+)
+def test_decode_tokens_returns_the_encoded_tokens(tokens):
+    assert decode_tokens(encode_tokens(tokens)) == tokens
+
+
+def test_encode_expression():
+    # given
+    # ... an expression with a literal of 2 bytes
+    expression = "( 1 + 256 )"
+    # when
+    payload = encode_expression(expression)
+    # then
+    # ... its tokens are encoded without separators
+    assert payload == b"(\x00\x00\x00\x00\x01\x01+\x00\x00\x00\x00\x02\x01\x00)"
+    assert decode_tokens(payload) == ["(", 1, "+", 256, ")"]
+
+
+@pytest.mark.parametrize(
+    "payload, exception_msg",
+    (
+        [b"+\x00\x00\x01", "The length of the literal at byte 1 of the payload is truncated."],
+        [b"+\x00\x00\x00\x00\x02\x01", "The literal at byte 1 of the payload is truncated: 2 bytes expected."],
+    ),
+)
+def test_decode_tokens_when_a_literal_is_truncated(payload, exception_msg):
+    with pytest.raises(InvalidPayloadError) as error:
+        decode_tokens(payload)
+
+    assert error.value.args[0] == exception_msg
+
+
+@pytest.mark.parametrize(
+    "body",
+    (
+        {"result": 0},
+        {"result": -1},
+        {"result": 128},
+        {"result": -(3**9000)},
+        {"result": 1.5},
+        {"message": "Zero division not supported."},
+    ),
+)
+def test_decode_response_returns_the_encoded_body(body):
+    assert decode_response(encode_response(body)) == body
+
+
+def test_decode_response_of_an_unknown_type():
+    with pytest.raises(InvalidPayloadError):
+        decode_response(b"\x07")
@@ -0,0 +1,105 @@
+import io
+import json
+from concurrent.futures import Future
+
+import pytest
+
+from bulk import BulkEvaluation, evaluate_chunk, main, read_chunks
+
+EXPRESSIONS = b"+ 1 2\n\n/ 1 0\n+ 1\n/ 7 2\n" + b"* " + b"9" * 5000 + b" 1\n"
+
+
+class UnseekableStream(io.BytesIO):
+    def seekable(self):
+        return False
+
+
+def test_evaluate_chunk_returns_records_with_offsets():
+    # given
+    # ... a chunk of expressions starting at byte 10, with an empty line
+    # when
+    records, expressions, errors = evaluate_chunk("prefix", 10, EXPRESSIONS)
+    # then
+    # ... there's a record per expression, with its offset, and ints too big for json.dumps are JSON numbers
+    records = records.splitlines()
+    assert [json.loads(record) for record in records[:-1]] == [
+        {"offset": 10, "result": 3},
+        {"offset": 17, "error": "ZeroDivisionError", "message": "division by zero"},
+        {
+            "offset": 23,
+            "error": "MalformedPrefixNotationError",
+            "message": "There are not enough values to apply the operand '+' on.",
+        },
+        {"offset": 27, "result": 3.5},
+    ]
+    assert records[-1] == '{"offset": 33, "result": ' + "9" * 5000 + "}"
+    assert expressions == 5
+    assert errors == {"ZeroDivisionError": 1, "MalformedPrefixNotationError": 1}
+
+
+@pytest.mark.parametrize("stream_type", (io.BytesIO, UnseekableStream))
+def test_read_chunks_splits_whole_lines_from_the_offset(stream_type):
+    chunks = list(read_chunks(stream_type(EXPRESSIONS), offset=7, chunk_bytes=8))
+    assert chunks[0] == (7, b"/ 1 0\n+ 1\n")
+    assert b"".join(chunk for _, chunk in chunks) == EXPRESSIONS[7:]
+    assert [start for start, _ in chunks] == [7, 17]
+
+
+@pytest.mark.parametrize("keep_order", (True, False))
+def test_bulk_evaluation_in_worker_processes(tmp_path, keep_order):
+    # given
+    # ... a file of expressions, split in many chunks
+    path = tmp_path / "expressions.txt"
+    path.write_bytes(EXPRESSIONS * 20)
+    expected, _, _ = evaluate_chunk("prefix", 0, EXPRESSIONS * 20)
+    # when
+    # ... it's evaluated by 2 worker processes
+    output = io.StringIO()
+    bulk = BulkEvaluation(output, workers=2, keep_order=keep_order, chunk_bytes=64)
+    try:
+        bulk.evaluate_file(str(path))
+    finally:
+        bulk.close()
+    # then
+    # ... all the records are written (in order with keep_order), and the whole file can't be resumed
+    if keep_order:
+        assert output.getvalue() == expected
+    else:
+        assert sorted(output.getvalue().splitlines()) == sorted(expected.splitlines())
+    assert bulk.summary(1.0)["expressions"] == 100
+    assert bulk.summary(1.0)["errors"] == 40
+    assert bulk.resume_offset == len(EXPRESSIONS) * 20
+
+
+def test_bulk_evaluation_cancels_the_pending_chunks_on_close():
+    # given
+    # ... worker processes with a chunk still waiting to be evaluated, as after an interruption
+    bulk = BulkEvaluation(io.StringIO(), workers=2)
+    waiting = Future()
+    bulk._pending.append((0, 10, waiting))
+    # when
+    bulk.close()
+    # then
+    # ... it's cancelled instead of being evaluated
+    assert waiting.cancelled()
+
+
+def test_main_resumes_from_an_offset_and_reports_the_totals(tmp_path, capsys):
+    # given
+    # ... a file of expressions
+    path = tmp_path / "expressions.txt"
+    path.write_bytes(EXPRESSIONS)
+    output = tmp_path / "results.jsonl"
+    # when
+    # ... it's evaluated from the offset of its 4th expression
+    exit_code = main([str(path), "--workers", "1", "--offset", "17", "--output", str(output)])
+    # then
+    # ... the records of the last 2 expressions are written, and the summary is printed to stderr
+    assert exit_code == 0
+    # (the big result can't be read back as an int)
+    assert [json.loads(line, parse_int=str)["offset"] for line in output.read_text().splitlines()] == ["17", "23"]
+    summary = json.loads(capsys.readouterr().err)
+    assert summary["expressions"] == 2
+    assert summary["errors"] == 0
+    assert summary["interrupted"] is False
+    assert summary["resume_offset"] == len(EXPRESSIONS)
@@ -0,0 +1,73 @@
+import pytest
+
+from canonical import canonical_digest, canonical_expression, canonical_tree
+from compiler import compile_infix_notation, compile_prefix_notation
+
+
+def digest(expression):
+    compile_notation = compile_infix_notation if expression.startswith("(") else compile_prefix_notation
+    return canonical_digest(compile_notation(expression, variables=True))
+
+
+@pytest.mark.parametrize(
+    "expression, equivalent",
+    (
+        ["+ 2 3", "+ 3 2"],
+        ["+ 2 3", "+   2 3"],
+        ["+ 2 3", "( 3 + 2 )"],
+        ["* + 1 2 - 5 4", "( ( 5 - 4 ) * ( 2 + 1 ) )"],
+        ["- * 2 x / y 4", "( ( x * 2 ) - ( y / 4 ) )"],
+    ),
+)
+def test_equivalent_expressions_have_the_same_digest(expression, equivalent):
+    assert digest(expression) == digest(equivalent)
+
+
+@pytest.mark.parametrize(
+    "expression, other",
+    (
+        ["- 2 3", "- 3 2"],
+        ["/ 2 3", "( 3 / 2 )"],
+        ["+ 2 3", "* 2 3"],
+        ["+ 1 + 2 3", "+ + 1 2 3"],
+        ["+ x 1", "+ y 1"],
+    ),
+)
+def test_different_expressions_have_different_digests(expression, other):
+    assert digest(expression) != digest(other)
+
+
+def test_malformed_expressions_have_no_digest():
+    assert canonical_digest(compile_prefix_notation("+ 1")) is None
+    assert canonical_digest(compile_infix_notation("( 1 + 2")) is None
+
+
+def test_canonical_expression_maps_both_notations_to_the_same_prefix_expression():
+    # given
+    # ... the same computation in both notations, with the operands of + in different orders
+    prefix_tree, _ = canonical_tree(compile_prefix_notation("- + 10 2 / 9 3"))
+    infix_tree, _ = canonical_tree(compile_infix_notation("( ( 2 + 10 ) - ( 9 / 3 ) )"))
+    # when
+    # ... the canonical trees are written as expressions
+    # then
+    # ... they're the same, with the operands of - and / in their original order
+    assert prefix_tree == infix_tree
+    assert canonical_expression(prefix_tree) in ("- + 10 2 / 9 3", "- + 2 10 / 9 3")
+
+
+def test_canonical_tree_of_deep_expressions_with_long_literals():
+    # given
+    # ... a deep chain of additions, and the same chain with the operands of each addition swapped
+    literal = "9" * 10000
+    expression = "+ 1 " * 20000 + literal
+    swapped = " ".join(["+"] * 20000 + [literal] + ["1"] * 20000)
+    # when
+    # ... their canonical trees are built
+    tree, digest = canonical_tree(compile_prefix_notation(expression))
+    # then
+    # ... they're the same, and the canonical expression (with the long literal) has the same tree
+    # (comparing the digests, as comparing deep trees would exceed the recursion limit)
+    swapped_tree, swapped_digest = canonical_tree(compile_prefix_notation(swapped))
+    assert swapped_digest == digest
+    assert canonical_expression(swapped_tree) == canonical_expression(tree)
+    assert canonical_tree(compile_prefix_notation(canonical_expression(tree)))[1] == digest
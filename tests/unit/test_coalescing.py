@@ -0,0 +1,112 @@
+import threading
+import time
+
+import pytest
+
+from coalescing import SingleFlight
+from exceptions import MalformedPrefixNotationError
+
+
+def start_waiter(single_flight, key, function, outcomes):
+    def wait():
+        try:
+            outcomes.append(single_flight.do(key, function))
+        except Exception as e:
+            outcomes.append(e)
+
+    thread = threading.Thread(target=wait)
+    thread.start()
+    return thread
+
+
+def wait_until_running(started):
+    started.wait(5)
+    time.sleep(0.1)
+
+
+def test_single_flight_shares_the_result_of_the_call_in_progress():
+    # given
+    # ... a slow call in progress
+    single_flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 42
+
+    outcomes = []
+    leader = start_waiter(single_flight, "key", slow, outcomes)
+    wait_until_running(started)
+    # when
+    # ... identical calls arrive while it runs, and a different one
+    waiters = [start_waiter(single_flight, "key", slow, outcomes) for _ in range(3)]
+    time.sleep(0.1)
+    assert single_flight.do("other key", lambda: 7) == 7
+    release.set()
+    for thread in [leader] + waiters:
+        thread.join()
+    # then
+    # ... the function ran once for the identical calls, which all got its result
+    assert outcomes == [42] * 4
+    assert len(calls) == 1
+    assert single_flight.stats() == {"calls": 2, "coalesced": 3, "timeouts": 0, "in_progress": 0}
+
+
+def test_single_flight_shares_the_error_of_the_call_in_progress():
+    single_flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise MalformedPrefixNotationError("There were too many values and not enough operators.")
+
+    outcomes = []
+    threads = [start_waiter(single_flight, "key", failing, outcomes)]
+    wait_until_running(started)
+    threads.append(start_waiter(single_flight, "key", failing, outcomes))
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert [type(outcome) for outcome in outcomes] == [MalformedPrefixNotationError] * 2
+    assert outcomes[0] is not outcomes[1]
+    assert single_flight.stats()["coalesced"] == 1
+
+
+def test_single_flight_waiters_call_the_function_themselves_after_the_timeout():
+    # given
+    # ... a call stuck for longer than the timeout of the waiters
+    single_flight = SingleFlight(timeout=0.1)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def stuck():
+        calls.append(1)
+        if len(calls) == 1:
+            started.set()
+            release.wait(5)
+        return len(calls)
+
+    outcomes = []
+    leader = start_waiter(single_flight, "key", stuck, outcomes)
+    wait_until_running(started)
+    # when
+    # ... an identical call arrives
+    result = single_flight.do("key", stuck)
+    release.set()
+    leader.join()
+    # then
+    # ... it gives up waiting and calls the function itself
+    assert result == 2
+    assert single_flight.stats()["timeouts"] == 1
+
+
+def test_single_flight_raises_the_error_of_the_leader():
+    single_flight = SingleFlight()
+    with pytest.raises(ZeroDivisionError):
+        single_flight.do("key", lambda: 1 / 0)
+    assert single_flight.stats()["in_progress"] == 0
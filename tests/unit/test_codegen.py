@@ -0,0 +1,84 @@
+import pytest
+
+from benchmarks.generators import random_infix_expression, random_prefix_expression
+from codegen import TemplateCache, evaluate, generate_source, template_shape
+from compiler import COMPILERS, compile_prefix_notation, run_program
+from exceptions import MalformedPrefixNotationError, UnboundVariableError
+
+
+def outcome(run):
+    try:
+        value = run()
+    except Exception as e:
+        return type(e), e.args
+    return type(value), value
+
+
+@pytest.mark.parametrize(
+    "notation, expression, bindings",
+    (
+        ["prefix", "- 10 / 4 2", None],
+        ["prefix", "+ / 1 0 - 1 / 2 0", None],
+        ["prefix", "+ 1", None],
+        ["prefix", "* + x 2 / y 4", {"x": 1, "y": 2}],
+        ["prefix", "+ y / 1 0", {}],
+        ["infix", "( ( 7 / 2 ) * 2 )", None],
+        ["infix", "( ( 2 - 3 ) / ( x - ( 1 / 0 ) ) )", {}],
+        ["infix", "( ( 2 - 3 ) / ( x - ( 1 / 0 ) ) )", {"x": 1}],
+        *[["prefix", random_prefix_expression(seed, tokens=63, depth=8), None] for seed in range(5)],
+        *[["infix", random_infix_expression(seed, tokens=63, depth=8), None] for seed in range(5)],
+        # parametric expressions without variables, whose constant subtrees are all folded
+        *[["prefix", random_prefix_expression(seed, tokens=63, depth=8), {}] for seed in range(5)],
+        *[["infix", random_infix_expression(seed, tokens=63, depth=8), {}] for seed in range(5)],
+        ["prefix", random_prefix_expression(0, tokens=2001, depth=1000, literal_digits=1, operators="+-"), None],
+        ["infix", random_infix_expression(0, tokens=2001, depth=1000, literal_digits=1, operators="+-"), None],
+    ),
+)
+def test_templates_return_the_results_of_run_program(notation, expression, bindings):
+    # the expressions with bindings are parametric
+    variables = bindings is not None
+    program = COMPILERS[notation](expression, variables)
+    assert outcome(lambda: evaluate(expression, notation, bindings, variables, cache=TemplateCache())) == outcome(
+        lambda: run_program(program, bindings)
+    )
+
+
+def test_templates_are_shared_by_expressions_with_other_literals():
+    # given
+    # ... a cache of templates
+    cache = TemplateCache(max_entries=2)
+    # when
+    # ... expressions of the same shape, with other literals, are evaluated
+    results = [evaluate(expression, cache=cache) for expression in ("+ 1 * 2 3", "+ 4 * 5 6", "+ 7 * 8 0")]
+    # then
+    # ... they're evaluated by the same function
+    assert results == [7, 34, 7]
+    assert cache.stats() == {"entries": 1, "hits": 2, "misses": 1}
+    # ... and the least recently used templates are evicted
+    evaluate("- 1 2", cache=cache)
+    evaluate("* 1 2", cache=cache)
+    assert cache.stats() == {"entries": 2, "hits": 2, "misses": 3}
+
+
+def test_constant_subtrees_of_parametric_expressions_are_folded():
+    # given
+    # ... a parametric expression whose literals are constants
+    program = compile_prefix_notation("+ x - * 2 3 / 1 0", variables=True)
+    # when
+    # ... its function is generated
+    source, constants, slots, folded = generate_source(program.notation, template_shape(program, literal_slots=False))
+    # then
+    # ... the product is folded, but not the division by zero, which still raises when the function runs
+    assert folded == 1
+    assert slots == 0
+    assert 6 in constants.values()
+    assert " / " in source and " * " not in source
+    with pytest.raises(ZeroDivisionError):
+        evaluate("+ x - * 2 3 / 1 0", bindings={"x": 1}, variables=True)
+
+
+def test_malformed_expressions_raise_their_error():
+    with pytest.raises(MalformedPrefixNotationError):
+        evaluate("+ 1 2 3")
+    with pytest.raises(UnboundVariableError):
+        evaluate("+ x 1", variables=True)
@@ -0,0 +1,232 @@
+import pytest
+
+from compiler import (
+    COMPILERS,
+    compile_algebraic_notation,
+    compile_infix_notation,
+    compile_prefix_notation,
+    compile_tokens,
+    run_program,
+)
+from exceptions import (
+    InvalidCharacterError,
+    InvalidParenthesesError,
+    MalformedInfixNotationError,
+    MalformedPrefixNotationError,
+    UnboundVariableError,
+)
+from tokenizer import tokenize
+
+
+@pytest.mark.parametrize(
+    "expression, expected",
+    (
+        ["3", 3],
+        ["+ 1 2", 3],
+        ["- 0 3", -3],
+        ["/ 3 2", 1.5],
+        ["- / 10 + 1 1 * 1 2", 3],
+        ["* / + - 12 987 323 111 1023", (((12 - 987) + 323) / 111) * 1023],
+        ["+ 5000 / 1000000 + 1000 0", 6000],
+        # runs of spaces only separate tokens
+        ["+  1   2", 3],
+    ),
+)
+def test_compile_prefix_notation_success(expression, expected):
+    assert run_program(compile_prefix_notation(expression)) == expected
+
+
+@pytest.mark.parametrize(
+    "expression, expected",
+    (
+        ["( 1 + 2 )", 3],
+        ["( ( ( 1 + 1 ) / 10 ) - ( 1 * 2 ) )", -1.8],
+        ["( 4 * ( ( ( 6 + 1 ) - 2 ) + 6 ) )", 44],
+        ["( 5000 + ( ( 1000000 / 1000 ) + 0 ) )", 6000],
+        ["( ( 0 + 0 ) - ( ( 0 + 0 ) + ( 1 / 1 ) ) )", -1],
+    ),
+)
+def test_compile_infix_notation_success(expression, expected):
+    assert run_program(compile_infix_notation(expression)) == expected
+
+
+def test_prefix_and_infix_compile_to_the_same_instructions_shape():
+    # given
+    # ... the same computation in both notations
+    # when
+    # ... both are compiled
+    prefix_program = compile_prefix_notation("- 10 3")
+    infix_program = compile_infix_notation("( 10 - 3 )")
+    # then
+    # ... both are postfix programs, the prefix one having the operands in reverse order
+    assert prefix_program.instructions == (3, 10, "-")
+    assert infix_program.instructions == (10, 3, "-")
+    assert run_program(prefix_program) == run_program(infix_program) == 7
+
+
+@pytest.mark.parametrize(
+    "expression, exception_type, exception_msg",
+    (
+        ["* / + - 12 98.7 323 111 10,23", InvalidCharacterError, "Invalid character found in expression: ','."],
+        ["* a b", InvalidCharacterError, "Invalid character found in expression: 'b'."],
+        ["", MalformedPrefixNotationError, "The provided expression does not contain any characters."],
+        [None, MalformedPrefixNotationError, "The provided expression does not contain any characters."],
+        ["   ", MalformedPrefixNotationError, "The provided expression does not contain any values."],
+        ["+ 3 1 2 *", MalformedPrefixNotationError, "There are not enough values to apply the operand '*' on."],
+        ["5 + + 1 2 - 4 3", MalformedPrefixNotationError, "There were too many values and not enough operators."],
+        ["/ 5 0", ZeroDivisionError, "division by zero"],
+        # the zero division is found before the extra values while traversing the expression in reverse order
+        ["5 / 1 0", ZeroDivisionError, "division by zero"],
+    ),
+)
+def test_compile_prefix_notation_when_it_raises_exception(expression, exception_type, exception_msg):
+    program = compile_prefix_notation(expression)
+    with pytest.raises(exception_type) as error:
+        run_program(program)
+
+    assert error.value.args[0] == exception_msg
+
+
+@pytest.mark.parametrize(
+    "expression, exception_type, exception_msg",
+    (
+        ["6 + 5", InvalidParenthesesError, "Invalid parentheses configuration in input string."],
+        ["( ( 1 + 2,5 ) * 3 )", InvalidCharacterError, "Invalid character found in expression: ','."],
+        ["", MalformedInfixNotationError, "The provided expression does not contain any characters."],
+        ["( ( ( ( ( ( 1 + 1 ) ) ) ) ) )", MalformedInfixNotationError, "Expected operator or parenthesis not found."],
+        ["( 6 10 )", MalformedInfixNotationError, "Not enough operators/parentheses to perform the operation."],
+        ["( + 4 )", MalformedInfixNotationError, "Not enough values to apply the operand '+' on."],
+        [
+            "( 6000 6 + ( 4 * ( 2 + 3 ) ) )",
+            MalformedInfixNotationError,
+            "There were too many values / operators / parentheses.",
+        ],
+        ["( 5 / 0 )", ZeroDivisionError, "division by zero"],
+    ),
+)
+def test_compile_infix_notation_when_it_raises_exception(expression, exception_type, exception_msg):
+    program = compile_infix_notation(expression)
+    with pytest.raises(exception_type) as error:
+        run_program(program)
+
+    assert error.value.args[0] == exception_msg
+
+
+@pytest.mark.parametrize(
+    "expression, expected",
+    (
+        ["3", 3],
+        ["1 + 2 * 3", 7],
+        ["( 1 + 2 ) * 3", 9],
+        # operators of the same precedence are left associative
+        ["8 - 2 - 1", 5],
+        ["8 / 2 * 4", 16],
+        ["8 - ( 2 - 1 )", 7],
+        ["2*(3+4)-5/(1+1)", 11.5],
+        ["( ( ( 7 ) ) )", 7],
+        ["( 5000 + ( ( 1000000 / 1000 ) + 0 ) )", 6000],
+    ),
+)
+def test_compile_algebraic_notation_success(expression, expected):
+    assert run_program(compile_algebraic_notation(expression)) == expected
+
+
+@pytest.mark.parametrize(
+    "expression",
+    (
+        "( 1 + 2 )",
+        "( ( ( 1 + 1 ) / 10 ) - ( 1 * 2 ) )",
+        "( 4 * ( ( ( 6 + 1 ) - 2 ) + 6 ) )",
+        "( ( 0 + 0 ) - ( ( 0 + 0 ) + ( 1 / 1 ) ) )",
+    ),
+)
+def test_compile_algebraic_notation_of_fully_parenthesized_expressions(expression):
+    # given
+    # ... a fully parenthesized infix expression
+    # when
+    # ... it's compiled with operator precedence, and without
+    # then
+    # ... both programs are the same
+    assert compile_algebraic_notation(expression) == compile_infix_notation(expression)
+
+
+@pytest.mark.parametrize(
+    "expression, exception_type, exception_msg",
+    (
+        ["1 + 2,5", InvalidCharacterError, "Invalid character found in expression: ','."],
+        ["", MalformedInfixNotationError, "The provided expression does not contain any characters."],
+        ["  ", MalformedInfixNotationError, "The provided expression does not contain any values."],
+        ["( )", MalformedInfixNotationError, "The provided expression does not contain any values."],
+        ["( 1 + 2", InvalidParenthesesError, "Invalid parentheses configuration in input string."],
+        ["1 + 2 )", InvalidParenthesesError, "Invalid parentheses configuration in input string."],
+        ["6 10", MalformedInfixNotationError, "Expected operator or parenthesis not found."],
+        ["6 ( 10 )", MalformedInfixNotationError, "Expected operator or parenthesis not found."],
+        ["+ 4", MalformedInfixNotationError, "Not enough values to apply the operand '+' on."],
+        ["4 * + 2", MalformedInfixNotationError, "Not enough values to apply the operand '*' on."],
+        ["( 4 - ) * 2", MalformedInfixNotationError, "Not enough values to apply the operand '-' on."],
+        ["4 * ( ) + 2", MalformedInfixNotationError, "Expected value not found."],
+        ["5 / 0", ZeroDivisionError, "division by zero"],
+        # malformed expressions compile into no instructions, so their error comes before any zero division
+        ["5 / 0 +", MalformedInfixNotationError, "Not enough values to apply the operand '+' on."],
+    ),
+)
+def test_compile_algebraic_notation_when_it_raises_exception(expression, exception_type, exception_msg):
+    program = compile_algebraic_notation(expression)
+    with pytest.raises(exception_type) as error:
+        run_program(program)
+
+    assert error.value.args[0] == exception_msg
+
+
+@pytest.mark.parametrize(
+    "program",
+    (
+        compile_prefix_notation("* + x y z", variables=True),
+        compile_infix_notation("( ( x + y ) * z )", variables=True),
+        compile_algebraic_notation("( x + y ) * z", variables=True),
+    ),
+)
+def test_run_program_with_bindings(program):
+    assert run_program(program, {"x": 1, "y": 2, "z": 4}) == 12
+    assert run_program(program, {"x": 1, "y": 1, "z": 0.5}) == 1
+
+
+def test_run_program_when_a_variable_is_not_bound():
+    with pytest.raises(UnboundVariableError) as error:
+        run_program(compile_prefix_notation("+ x 1", variables=True), {})
+
+    assert error.value.args[0] == "No value bound to variable 'x'."
+
+
+@pytest.mark.parametrize(
+    "notation, expression",
+    (
+        ["prefix", "- / 10 + 1 1 * 1 2"],
+        ["prefix", "5 + + 1 2 - 4 3"],
+        ["prefix", "* a b"],
+        ["prefix", "/ 5 0"],
+        ["infix", "( ( 1 + 2 ) * 3 )"],
+        ["infix", "6 + 5"],
+        ["infix", "( ( ( ( ( ( 1 + 1 ) ) ) ) ) )"],
+        ["infix", "( 6000 6 + ( 4 * ( 2 + 3 ) ) )"],
+        ["algebraic", "1 + 2 * ( 3 - 4 )"],
+        ["algebraic", "1 + 2 )"],
+    ),
+)
+def test_compile_tokens_compiles_the_program_of_the_expression(notation, expression):
+    assert compile_tokens(notation, list(tokenize(expression))) == COMPILERS[notation](expression)
+
+
+@pytest.mark.parametrize(
+    "notation, exception_type",
+    (
+        ["prefix", MalformedPrefixNotationError],
+        ["infix", MalformedInfixNotationError],
+        ["algebraic", MalformedInfixNotationError],
+    ),
+)
+def test_compile_tokens_without_tokens(notation, exception_type):
+    with pytest.raises(exception_type) as error:
+        run_program(compile_tokens(notation, []))
+
+    assert error.value.args[0] == "The provided expression does not contain any characters."
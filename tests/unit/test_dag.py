@@ -0,0 +1,66 @@
+import pytest
+
+from benchmarks.generators import random_infix_expression, random_prefix_expression
+from compiler import INFIX, PREFIX, compile_infix_notation, compile_prefix_notation, run_program
+from dag import build_dag, compile_dag, run_dag
+from exceptions import InvalidCharacterError, MalformedPrefixNotationError, UnboundVariableError
+
+
+@pytest.mark.parametrize(
+    "expression, expected, deduplicated",
+    (
+        ["+ 1 2", 3, 0],
+        ["+ 2 2", 4, 1],
+        # the repeated product is a single node, its 2 copies sharing the same children
+        ["- * 12 34 * 12 34", 0, 3],
+        ["/ + 1 2 + 2 1", 1, 2],
+        ["* + * 3 3 * 3 3 + * 3 3 * 3 3", 324, 11],
+    ),
+)
+def test_compile_dag_deduplicates_identical_subtrees(expression, expected, deduplicated):
+    dag = compile_dag(expression)
+    assert run_dag(dag) == expected
+    assert dag.deduplicated == deduplicated
+
+
+def test_operand_order_is_part_of_the_node():
+    dag = compile_dag("( ( 10 - 4 ) / ( 4 - 10 ) )", INFIX)
+    assert run_dag(dag) == -1
+    assert dag.deduplicated == 2
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_run_dag_matches_run_program(seed):
+    # given
+    # ... random expressions with few distinct literals, so they have repeated subtrees
+    prefix = random_prefix_expression(seed, tokens=101, depth=8, literal_digits=1, operators="+-*")
+    infix = random_infix_expression(seed, tokens=101, depth=8, literal_digits=1, operators="+-*")
+    # when
+    # ... they're evaluated through their DAG
+    # then
+    # ... the results are the same as evaluating every subtree
+    assert run_dag(compile_dag(prefix)) == run_program(compile_prefix_notation(prefix))
+    assert run_dag(compile_dag(infix, INFIX)) == run_program(compile_infix_notation(infix))
+
+
+@pytest.mark.parametrize(
+    "expression, exception, exception_msg",
+    (
+        # the zero division is raised before the error found further in the reverse traversal
+        ["+ & / 1 0", ZeroDivisionError, "division by zero"],
+        ["+ & / 1 1", InvalidCharacterError, "Invalid character found in expression: '&'."],
+        ["+ 1 1 1", MalformedPrefixNotationError, "There were too many values and not enough operators."],
+    ),
+)
+def test_run_dag_raises_errors_as_run_program(expression, exception, exception_msg):
+    with pytest.raises(exception, match=exception_msg):
+        run_dag(compile_dag(expression))
+
+
+def test_run_dag_binds_variables():
+    dag = build_dag(compile_prefix_notation("* + x 1 + x 1", variables=True))
+    assert dag.deduplicated == 3
+    assert run_dag(dag, {"x": 4}) == 25
+    with pytest.raises(UnboundVariableError):
+        run_dag(dag, {"y": 4})
+    assert compile_dag("+ x x", PREFIX, variables=True).deduplicated == 1
@@ -0,0 +1,99 @@
+import pytest
+
+from compiler import INFIX, PREFIX, run_program
+from exceptions import MalformedPrefixNotationError
+from expression_cache import ExpressionCache
+
+
+def test_expression_cache_counts_hits_and_misses():
+    # given
+    # ... an empty cache
+    cache = ExpressionCache()
+    # when
+    # ... the same expression is evaluated twice, the second time with extra spaces
+    first = cache.evaluate(PREFIX, "+ 1 2")
+    second = cache.evaluate(PREFIX, "+  1  2")
+    # then
+    # ... the normalized expression is only evaluated once
+    assert first == second == 3
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["hits"] == 1
+    assert len(cache) == 1
+
+
+def test_expression_cache_keys_by_notation():
+    cache = ExpressionCache()
+    cache.evaluate(PREFIX, "3")
+
+    with pytest.raises(Exception):
+        cache.evaluate(INFIX, "3")
+    assert cache.stats()["misses"] == 2
+
+
+def test_expression_cache_raises_cached_errors_on_every_hit():
+    cache = ExpressionCache()
+    for _ in range(2):
+        with pytest.raises(MalformedPrefixNotationError) as error:
+            cache.evaluate(PREFIX, "+ 1")
+        assert error.value.args[0] == "There are not enough values to apply the operand '+' on."
+
+    assert cache.stats()["hits"] == 1
+
+
+def test_expression_cache_evicts_least_recently_used_entry():
+    # given
+    # ... a cache with room for 2 entries
+    cache = ExpressionCache(max_entries=2)
+    cache.evaluate(PREFIX, "+ 1 2")
+    cache.evaluate(PREFIX, "+ 1 3")
+    # when
+    # ... the first entry is used again, then a third entry is added
+    cache.evaluate(PREFIX, "+ 1 2")
+    cache.evaluate(PREFIX, "+ 1 4")
+    # then
+    # ... the least recently used entry is the one evicted
+    assert cache.stats()["evictions"] == 1
+    cache.evaluate(PREFIX, "+ 1 2")
+    assert cache.stats()["hits"] == 2
+    cache.evaluate(PREFIX, "+ 1 3")
+    assert cache.stats()["misses"] == 4
+
+
+def test_expression_cache_bounds_bytes():
+    cache = ExpressionCache(max_bytes=2000)
+    for i in range(100):
+        cache.evaluate(PREFIX, f"+ 1 {i}")
+
+    assert 0 < cache.stats()["bytes"] <= 2000
+    assert len(cache) < 100
+
+
+def test_expression_cache_does_not_store_entries_larger_than_max_bytes():
+    cache = ExpressionCache(max_bytes=100)
+    assert cache.evaluate(PREFIX, f"* {'9' * 500} {'9' * 500}") == int("9" * 500) ** 2
+    assert len(cache) == 0
+
+
+def test_expression_cache_reuses_the_results_of_equivalent_expressions():
+    # given
+    # ... a cache keying the results by their canonical tree too
+    cache = ExpressionCache(canonicalize=True)
+    evaluated = []
+
+    def run(program):
+        evaluated.append(program)
+        return run_program(program)
+
+    # when
+    # ... the same computation is evaluated in both notations, with the operands of + swapped, then a different one
+    results = [
+        cache.evaluate(PREFIX, "* + 1 2 4", run),
+        cache.evaluate(INFIX, "( 4 * ( 2 + 1 ) )", run),
+        cache.evaluate(PREFIX, "- 4 + 1 2", run),
+    ]
+    # then
+    # ... the second one reuses the result of the first one
+    assert results == [12, 12, 1]
+    assert len(evaluated) == 2
+    assert cache.stats()["canonical_hits"] == 1
+    assert cache.stats()["misses"] == 3
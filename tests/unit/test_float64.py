@@ -0,0 +1,106 @@
+from array import array
+
+import pytest
+
+from benchmarks.generators import random_infix_expression, random_prefix_expression
+from exceptions import InvalidCharacterError, MalformedInfixNotationError, MalformedPrefixNotationError
+from float64 import compile_float64, evaluate_float64, run_float64, stack_buffer
+from infix_calculator import evaluate_infix_notation
+from prefix_calculator import evaluate_prefix_notation
+
+
+@pytest.mark.parametrize(
+    "notation, expression",
+    (
+        ["prefix", "- 10 / 4 2"],
+        ["prefix", "+ 1 * 2 3"],
+        ["prefix", "/ 7 2"],
+        ["infix", "( ( 7 / 2 ) * 2 )"],
+        ["infix", "( 1 - ( 2 * 3 ) )"],
+        *[["prefix", random_prefix_expression(seed, 63, 8, literal_digits=2, operators="+-")] for seed in range(5)],
+        *[["infix", random_infix_expression(seed, 63, 8, literal_digits=2, operators="+-")] for seed in range(5)],
+    ),
+)
+def test_float64_results_are_the_exact_results_of_small_expressions(notation, expression):
+    evaluate = evaluate_prefix_notation if notation == "prefix" else evaluate_infix_notation
+    assert evaluate_float64(expression, notation) == evaluate(expression)
+    assert evaluate(expression, float64=True) == evaluate(expression)
+
+
+@pytest.mark.parametrize(
+    "notation, expression",
+    (
+        # a literal which a double doesn't hold exactly
+        ["prefix", f"+ 1 {2**53 + 1}"],
+        ["infix", f"( 1 + {2**53 + 1} )"],
+        # malformed expressions
+        ["prefix", "+ 1 2 3"],
+        ["prefix", "+ 1 a"],
+        ["infix", "( 1 + 2"],
+        ["infix", "( ( 1 + 2 ) )"],
+        # results which overflow the doubles
+        ["prefix", "* " * 19 + f"{2**53} " * 20],
+        ["infix", "(" * 19 + f"{2**53}" + f" * {2**53} )" * 19],
+    ),
+)
+def test_float64_mode_leaves_some_expressions_to_the_exact_evaluators(notation, expression):
+    assert evaluate_float64(expression, notation) is None
+
+
+def test_evaluators_in_float64_mode_raise_their_errors():
+    with pytest.raises(MalformedPrefixNotationError):
+        evaluate_prefix_notation("+ 1 2 3", float64=True)
+    with pytest.raises(InvalidCharacterError):
+        evaluate_prefix_notation("+ 1 a", float64=True)
+    with pytest.raises(MalformedInfixNotationError):
+        evaluate_infix_notation("( ( 1 + 2 ) )", float64=True)
+    with pytest.raises(ZeroDivisionError):
+        evaluate_prefix_notation("/ 1 - 2 2", float64=True)
+    with pytest.raises(ZeroDivisionError):
+        evaluate_infix_notation("( 1 / ( 2 - 2 ) )", float64=True)
+    # ... and evaluate exactly the expressions with big literals
+    assert evaluate_prefix_notation(f"+ 1 {2**64}", float64=True) == 2**64 + 1
+
+
+def test_stack_buffer_is_reused_across_evaluations():
+    # given
+    # ... the buffer of the thread
+    buffer = stack_buffer(10)
+    # when
+    # ... programs are run
+    program = compile_float64("+ 1 * 2 3")
+    results = [run_float64(program), run_float64(program)]
+    # then
+    # ... they run in the same buffer, unless a bigger one is needed
+    assert results == [7.0, 7.0]
+    assert stack_buffer(program.max_depth) is buffer
+    assert stack_buffer(len(buffer) + 1) is not buffer
+
+
+def test_given_buffer_must_hold_the_stack_of_the_program():
+    # given
+    # ... a program whose stack holds 3 values at once, and a buffer of 2 doubles
+    program = compile_float64("+ * 2 3 1")
+    buffer = array("d", bytes(16))
+    # when
+    # ... it's run in that buffer
+    with pytest.raises(ValueError) as e:
+        run_float64(program, buffer)
+    # then
+    # ... it's rejected before running, with the size it needs
+    assert program.max_depth == 3
+    assert str(e.value) == "The stack buffer holds 2 doubles, the program needs 3."
+    assert run_float64(program, array("d", bytes(24))) == 7.0
+
+
+def test_infix_buffer_grows_with_the_depth_of_the_expression():
+    # given
+    # ... a buffer of a single double, and an expression whose values stack deeper than that
+    buffer = array("d", bytes(8))
+    expression = "( 1 + " * 99 + "1" + " )" * 99
+    # when
+    value = evaluate_float64(expression, "infix", buffer)
+    # then
+    # ... the given buffer is grown in place
+    assert value == 100
+    assert len(buffer) >= 2
@@ -0,0 +1,60 @@
+import pytest
+
+from benchmarks.generators import random_prefix_expression
+from compiler import compile_infix_notation, compile_prefix_notation, run_program
+from dag import compile_dag, run_dag
+from exceptions import ResourceLimitError
+from governor import CostLimits, check_cost, estimate_cost, multiplication_cost
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_estimated_bits_are_upper_bounds(seed):
+    # given
+    # ... random expressions with long literals and no divisions
+    expression = random_prefix_expression(seed, tokens=41, depth=8, literal_digits=30, operators="+-*")
+    program = compile_prefix_notation(expression)
+    # when
+    # ... their cost is estimated
+    estimate = estimate_cost(program)
+    # then
+    # ... the result is not longer than estimated
+    assert abs(run_program(program)).bit_length() <= estimate.result_bits <= estimate.max_bits
+
+
+def test_estimate_cost_of_products_and_divisions():
+    literal = 2**1000 - 1
+    product = estimate_cost(compile_prefix_notation(f"* {literal} {literal}"))
+    assert product.result_bits == product.max_bits == 2000
+    assert product.cost == multiplication_cost(1000, 1000)
+    # the division returns a float, so the product of the quotient costs next to nothing
+    division = estimate_cost(compile_infix_notation(f"( ( {literal} / {literal} ) * {literal} )"))
+    assert division.result_bits == 64
+    assert division.cost == multiplication_cost(1000, 1000) + 1
+
+
+def test_multiplication_cost_grows_slower_than_quadratic_above_the_karatsuba_cutoff():
+    assert multiplication_cost(30 * 10, 30 * 10) == 11 * 11
+    assert multiplication_cost(300000, 300000) < multiplication_cost(30000, 30000) * 100 / 2
+
+
+@pytest.mark.parametrize(
+    "limits, exception_msg",
+    (
+        [CostLimits(max_bits=3000, max_cost=None), "could reach 4000 bits, above the limit of 3000 bits"],
+        [CostLimits(max_bits=None, max_cost=100), "The estimated cost of the expression"],
+    ),
+)
+def test_check_cost_raises_before_running(limits, exception_msg):
+    program = compile_prefix_notation(f"* {2 ** 1999} * {2 ** 999} {2 ** 999}")
+    with pytest.raises(ResourceLimitError, match=exception_msg):
+        check_cost(program, limits)
+    assert check_cost(program, CostLimits(max_bits=None, max_cost=None)).max_bits == 4000
+
+
+def test_evaluation_is_aborted_when_a_value_exceeds_max_bits():
+    expression = f"+ 1 * {2 ** 999} {2 ** 999}"
+    assert run_program(compile_prefix_notation(expression), max_bits=2000) == 2**1998 + 1
+    with pytest.raises(ResourceLimitError, match="An intermediate value of 1999 bits is above the limit of 1000 bits."):
+        run_program(compile_prefix_notation(expression), max_bits=1000)
+    with pytest.raises(ResourceLimitError):
+        run_dag(compile_dag(expression), max_bits=1000)
@@ -5,7 +5,7 @@ from exceptions import (
     InvalidParenthesesError,
     MalformedInfixNotationError,
 )
-from infix_calculator import evaluate_infix_notation
+from infix_calculator import evaluate_algebraic_notation, evaluate_infix_notation
 
 
 @pytest.mark.parametrize(
@@ -87,3 +87,16 @@ def test_infix_calculator_when_it_raises_exception(expression, exception_type, e
     # then
     # ... the expected error type and message are raised
     assert error.value.args[0] == exception_msg
+
+
+@pytest.mark.parametrize(
+    "expression, expected",
+    (
+        ["1 + 2 * 3", 7],
+        ["( 1 + 2 ) * 3", 9],
+        ["12 - 987 + 323", -652],
+        ["( ( 1 * 2 ) + 3 )", 5],
+    ),
+)
+def test_algebraic_calculator_success(expression, expected):
+    assert evaluate_algebraic_notation(expression) == expected
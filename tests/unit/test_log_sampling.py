@@ -0,0 +1,74 @@
+import logging
+
+import pytest
+
+from log_sampling import ErrorLogSampler, record_kind
+
+
+def make_record(level=logging.ERROR, error=None, message="message"):
+    exc_info = (type(error), error, None) if error is not None else None
+    return logging.LogRecord("compiler", level, __file__, 1, message, (), exc_info)
+
+
+def test_error_log_sampler_rate_limits_each_kind_of_record():
+    # given
+    # ... a sampler logging 2 records at once, then 1 per second, by kind
+    now = [0.0]
+    sampler = ErrorLogSampler(rate=1.0, burst=2, clock=lambda: now[0])
+    # when
+    # ... records of 2 kinds are logged at once, then a second later
+    first = [sampler.filter(make_record(error=ZeroDivisionError())) for _ in range(3)]
+    other = [sampler.filter(make_record()) for _ in range(3)]
+    now[0] = 1.0
+    later = [sampler.filter(make_record(error=ZeroDivisionError())) for _ in range(2)]
+    # then
+    # ... each kind has its own limit
+    assert first == other == [True, True, False]
+    assert later == [True, False]
+    assert sampler.stats() == {
+        "logged": {"ZeroDivisionError": 3, "message": 2},
+        "suppressed": {"ZeroDivisionError": 2, "message": 1},
+    }
+
+
+@pytest.mark.parametrize(
+    "record, expected_kind",
+    (
+        [make_record(error=ZeroDivisionError("division by zero")), "ZeroDivisionError"],
+        [
+            make_record(message="Invalid character found in expression: 'a'."),
+            "Invalid character found in expression: '*'.",
+        ],
+        [
+            make_record(message="An intermediate value of 2049 bits is above the limit of 2048 bits."),
+            "An intermediate value of * bits is above the limit of * bits.",
+        ],
+    ),
+)
+def test_error_log_sampler_keys_the_records_by_exception_class_or_message_template(record, expected_kind):
+    assert record_kind(record) == expected_kind
+
+
+def test_error_log_sampler_limits_the_messages_of_a_logger_separately():
+    # given
+    # ... a sampler logging a single record at once by kind
+    sampler = ErrorLogSampler(rate=0.0, burst=1)
+    # when
+    # ... different errors are logged by the same logger, one of them for different tokens
+    logged = [
+        sampler.filter(make_record(message=message))
+        for message in (
+            "Invalid character found in expression: 'a'.",
+            "Invalid character found in expression: 'b'.",
+            "There were too many values and not enough operators.",
+        )
+    ]
+    # then
+    # ... the other error isn't suppressed by the first one
+    assert logged == [True, False, True]
+
+
+def test_error_log_sampler_always_logs_lower_levels():
+    sampler = ErrorLogSampler(rate=0.0, burst=0)
+    assert sampler.filter(make_record(level=logging.WARNING))
+    assert not sampler.filter(make_record())
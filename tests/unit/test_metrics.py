@@ -0,0 +1,88 @@
+import threading
+
+from metrics import CallbackCounter, Counter, Gauge, Histogram, Registry
+
+
+def test_counter_renders_a_sample_per_label_values():
+    # given
+    # ... a counter incremented with different label values
+    counter = Counter("errors_total", "Errors.", ("error",))
+    counter.inc("ZeroDivisionError")
+    counter.inc("ZeroDivisionError")
+    counter.inc("InvalidCharacterError", amount=3)
+    # when
+    # ... the counter is rendered
+    lines = counter.render()
+    # then
+    # ... there is a sample for each label values, sorted
+    assert lines == [
+        "# HELP errors_total Errors.",
+        "# TYPE errors_total counter",
+        'errors_total{error="InvalidCharacterError"} 3',
+        'errors_total{error="ZeroDivisionError"} 2',
+    ]
+    assert counter.value("ZeroDivisionError") == 2
+    assert counter.value("MalformedPrefixNotationError") == 0
+
+
+def test_histogram_renders_cumulative_buckets():
+    # given
+    # ... a histogram with observations in several buckets, one above the last bound
+    histogram = Histogram("length_chars", "Length.", (10, 100))
+    for value in (5, 10, 50, 1000):
+        histogram.observe(value)
+    # when
+    # ... the histogram is rendered
+    lines = histogram.render()
+    # then
+    # ... the buckets count the observations up to their bound (included)
+    assert lines[2:] == [
+        'length_chars_bucket{le="10"} 2',
+        'length_chars_bucket{le="100"} 3',
+        'length_chars_bucket{le="+Inf"} 4',
+        "length_chars_sum 1065.0",
+        "length_chars_count 4",
+    ]
+    assert histogram.count() == 4
+
+
+def test_metrics_sum_up_the_values_recorded_by_each_thread():
+    # given
+    # ... a counter and a histogram recorded in several threads
+    counter = Counter("requests_total", "Requests.", ("route",))
+    histogram = Histogram("length_chars", "Length.", (10,))
+
+    def record():
+        for _ in range(100):
+            counter.inc("/calculator/prefix/")
+            histogram.observe(5)
+
+    threads = [threading.Thread(target=record) for _ in range(4)]
+    # when
+    # ... the threads are done
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # then
+    # ... the values of all the threads are counted
+    assert counter.value("/calculator/prefix/") == 400
+    assert histogram.count() == 400
+    assert histogram.render()[-2:] == ["length_chars_sum 2000.0", "length_chars_count 400"]
+
+
+def test_registry_renders_all_the_metrics():
+    registry = Registry()
+    registry.register(Gauge("hit_ratio", "Hit ratio.", lambda: {("local",): 0.5}, ("cache",)))
+    registry.register(Counter("requests_total", "Requests."))
+    registry.register(CallbackCounter("lookups_total", "Lookups.", lambda: {("local",): 3}, ("cache",)))
+    assert registry.render() == (
+        "# HELP hit_ratio Hit ratio.\n"
+        "# TYPE hit_ratio gauge\n"
+        'hit_ratio{cache="local"} 0.5\n'
+        "# HELP requests_total Requests.\n"
+        "# TYPE requests_total counter\n"
+        "# HELP lookups_total Lookups.\n"
+        "# TYPE lookups_total counter\n"
+        'lookups_total{cache="local"} 3\n'
+    )
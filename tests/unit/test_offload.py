@@ -0,0 +1,89 @@
+import threading
+
+import pytest
+
+from compiler import compile_infix_notation, compile_prefix_notation
+from exceptions import EvaluationTimeoutError, MalformedPrefixNotationError, ResourceLimitError, ServerBusyError
+from offload import EvaluationPool, is_expensive
+
+
+def expensive_program(copies=64, digits=20000):
+    literal = "9" * digits
+    expression = literal
+    for _ in range(copies.bit_length() - 1):
+        expression = f"( {expression} * {expression} )"
+    return compile_infix_notation(expression)
+
+
+@pytest.fixture
+def pool():
+    pool = EvaluationPool(workers=1, max_queue=0, timeout=30)
+    pool.start()
+    yield pool
+    pool.close()
+
+
+@pytest.mark.parametrize(
+    "program, expected",
+    (
+        [compile_prefix_notation("+ 1 2"), False],
+        [compile_prefix_notation("+ 1 " * 5000 + "1"), True],
+        [compile_prefix_notation(f"* {'9' * 20000} 2"), True],
+    ),
+)
+def test_is_expensive(program, expected):
+    assert is_expensive(program) == expected
+
+
+def test_evaluation_pool_returns_results_and_errors(pool):
+    assert pool.run(compile_prefix_notation(f"* {2 ** 100} 2")) == 2 ** 101
+
+    with pytest.raises(MalformedPrefixNotationError) as error:
+        pool.run(compile_prefix_notation("+ 1"))
+    assert error.value.args[0] == "There are not enough values to apply the operand '+' on."
+
+    with pytest.raises(ZeroDivisionError):
+        pool.run(compile_prefix_notation("/ 1 0"))
+
+
+def test_evaluation_pool_aborts_evaluations_past_max_bits(pool):
+    with pytest.raises(ResourceLimitError) as error:
+        pool.run(compile_prefix_notation(f"* {2 ** 100} {2 ** 100}"), max_bits=128)
+    assert error.value.args[0] == "An intermediate value of 201 bits is above the limit of 128 bits."
+    assert pool.run(compile_prefix_notation(f"* {2 ** 100} 2"), max_bits=128) == 2 ** 101
+
+
+def test_evaluation_pool_cancels_evaluations_which_time_out(pool):
+    # given
+    # ... an expensive expression
+    program = expensive_program()
+    # when
+    # ... it's evaluated with a short timeout
+    with pytest.raises(EvaluationTimeoutError):
+        pool.run(program, timeout=0.05)
+    # then
+    # ... the worker is replaced, and the pool keeps evaluating expressions
+    assert pool.stats()["timeouts"] == 1
+    assert pool.run(compile_prefix_notation("+ 1 2")) == 3
+    assert pool.stats()["pending"] == 0
+
+
+def test_evaluation_pool_rejects_expressions_beyond_its_queue(pool):
+    # given
+    # ... the only worker of the pool busy with an expensive expression
+    def run_expensive_program():
+        with pytest.raises(EvaluationTimeoutError):
+            pool.run(expensive_program(), timeout=0.5)
+
+    running = threading.Thread(target=run_expensive_program)
+    running.start()
+    while pool.stats()["pending"] == 0:
+        pass
+    # when
+    # ... another expression is submitted
+    # then
+    # ... it's rejected straight away
+    with pytest.raises(ServerBusyError):
+        pool.run(compile_prefix_notation("+ 1 2"))
+    running.join()
+    assert pool.stats()["rejected"] == 1
@@ -0,0 +1,112 @@
+from concurrent.futures import Future
+
+import pytest
+
+from benchmarks.generators import random_infix_expression, random_prefix_expression
+from compiler import compile_infix_notation, compile_prefix_notation, run_program
+from exceptions import MalformedPrefixNotationError, ResourceLimitError
+from parallel import ParallelEvaluator, Subtree, split_program
+
+
+@pytest.fixture(scope="module")
+def evaluator():
+    evaluator = ParallelEvaluator(workers=2, min_cost=1)
+    yield evaluator
+    evaluator.close()
+
+
+def outcome(run, program):
+    try:
+        value = run(program)
+    except Exception as e:
+        return type(e), e.args
+    return type(value), value
+
+
+@pytest.mark.parametrize(
+    "expression, min_cost, max_subtrees, expected",
+    (
+        ["+ * 9 9 * 9 9", 1, 4, [Subtree(0, 3, 1, False), Subtree(3, 6, 1, False)]],
+        ["+ * 9 9 / 9 9", 1, 4, [Subtree(0, 3, 1, True), Subtree(3, 6, 1, False)]],
+        ["+ * 9 9 * 9 9", 1, 1, [Subtree(0, 7, 3, False)]],
+        ["+ * 9 9 * 9 9", 100, 4, []],
+        ["+ * 9 9", 1, 4, []],
+        ["+ x 1", 1, 4, []],
+    ),
+)
+def test_split_program(expression, min_cost, max_subtrees, expected):
+    program = compile_prefix_notation(expression, variables=True)
+    assert split_program(program, min_cost, max_subtrees) == expected
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize(
+    "generate, compile_program",
+    ((random_prefix_expression, compile_prefix_notation), (random_infix_expression, compile_infix_notation)),
+)
+def test_parallel_evaluator_returns_the_results_of_run_program(evaluator, seed, generate, compile_program):
+    # given
+    # ... a random expression with big literals and divisions
+    program = compile_program(generate(seed, tokens=63, depth=8, literal_digits=30))
+    # when
+    # ... its subtrees are evaluated in parallel
+    # then
+    # ... the result has the same value and type as when it's evaluated by run_program
+    assert outcome(evaluator.run, program) == outcome(run_program, program)
+
+
+@pytest.mark.parametrize(
+    "expression, expected",
+    (
+        ["* / 7 2 * 2 2", (int, 14)],
+        ["/ * 3 3 * 3 3", (int, 1)],
+        ["+ / 1 0 / 1 3", (ZeroDivisionError, ("division by zero",))],
+        [
+            "+ + / 1 1 1 + 1",
+            (MalformedPrefixNotationError, ("There are not enough values to apply the operand '+' on.",)),
+        ],
+    ),
+)
+def test_parallel_evaluator_casts_results_and_raises_errors_in_order(evaluator, expression, expected):
+    program = compile_prefix_notation(expression)
+    assert outcome(evaluator.run, program) == expected
+    assert outcome(run_program, program) == expected
+
+
+def test_parallel_evaluator_bounds_the_values_it_combines(evaluator):
+    # given
+    # ... 2 products of 64 bits values
+    program = compile_prefix_notation(f"* * {2 ** 63} 2 * {2 ** 63} 2")
+    # when
+    # ... they're combined with a limit of 100 bits
+    # then
+    # ... the evaluation is aborted
+    with pytest.raises(ResourceLimitError):
+        evaluator.run(program, max_bits=100)
+    assert evaluator.stats()["parallel_runs"] > 0
+
+
+def test_parallel_evaluator_bounds_the_values_of_the_subtrees(evaluator):
+    # given
+    # ... 2 products of 128 bits values, in independent subtrees
+    program = compile_prefix_notation(f"- * {2 ** 127} 2 * {2 ** 127} 2")
+    # when
+    # ... they're evaluated with a limit of 100 bits
+    # then
+    # ... the workers abort the evaluation of the subtrees
+    with pytest.raises(ResourceLimitError) as error:
+        evaluator.run(program, max_bits=100)
+    assert error.value.args[0] == "An intermediate value of 129 bits is above the limit of 100 bits."
+
+
+def test_parallel_evaluator_cancels_the_waiting_subtrees_on_close():
+    # given
+    # ... an evaluator with a subtree still waiting for a thread
+    evaluator = ParallelEvaluator(workers=2, min_cost=1)
+    waiting = Future()
+    evaluator._futures.add(waiting)
+    # when
+    evaluator.close()
+    # then
+    # ... it's cancelled instead of being evaluated
+    assert waiting.cancelled()
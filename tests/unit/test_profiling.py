@@ -0,0 +1,109 @@
+import pstats
+
+import pytest
+
+from compiler import compile_expression, run_program
+from profiling import EvaluationProfiler, op_stack_peak
+from tokenizer import tokenize
+
+
+@pytest.mark.parametrize(
+    "notation, expression",
+    (
+        ["prefix", "- / 10 + 1 1 * 1 2"],
+        ["prefix", f"* {2 ** 100} {3 ** 100}"],
+        ["infix", "( ( 1 + 2 ) * ( 3 / 4 ) )"],
+    ),
+)
+def test_profiler_returns_the_results_of_run_program(notation, expression):
+    assert EvaluationProfiler(notation).evaluate(compile_expression, expression) == run_program(
+        compile_expression(notation, expression)
+    )
+
+
+def test_profiler_summary_of_a_prefix_expression():
+    # given
+    # ... an expression multiplying big ints
+    expression = f"+ * {2 ** 100} {2 ** 200} 1"
+    profiler = EvaluationProfiler("prefix")
+    # when
+    profiler.evaluate(compile_expression, expression)
+    # then
+    # ... the summary has the depth of the stack, the largest value and the time of the big int product
+    summary = profiler.summary()
+    assert summary["instructions"] == 5
+    assert summary["peak_stack_depth"] == {"stack": 3}
+    assert summary["max_bits"] == 301
+    assert 0 < summary["big_int_seconds"] <= summary["operator_seconds"]
+    assert summary["profile"] is None
+
+
+def test_profiler_summary_of_an_infix_expression():
+    # given
+    # ... a right nested expression
+    expression = "( 1 + ( 2 + ( 3 + 4 ) ) )"
+    profiler = EvaluationProfiler("infix")
+    # when
+    value = profiler.evaluate(compile_expression, expression, lambda text: list(tokenize(text)))
+    # then
+    # ... both stacks of the infix evaluator are measured, and no operation is on big ints
+    assert value == 10
+    summary = profiler.summary()
+    assert summary["peak_stack_depth"] == {"op_stack": 6, "val_stack": 4}
+    assert summary["big_int_seconds"] == 0
+
+
+def test_profiler_tokenizes_an_infix_expression_once():
+    # given
+    # ... a reader of the tokens of the expression, counting its calls
+    expression = "( ( 1 + 2 ) * ( 3 + 4 ) )"
+    reads = []
+
+    def read_tokens(text):
+        reads.append(text)
+        return list(tokenize(text))
+
+    def compile_program(notation, text):
+        raise AssertionError("The expression is compiled from its tokens.")
+
+    profiler = EvaluationProfiler("infix")
+    # when
+    value = profiler.evaluate(compile_program, expression, read_tokens)
+    # then
+    # ... the program and the op_stack are both measured on the same tokens
+    assert value == 21
+    assert reads == [expression]
+    assert profiler.summary()["peak_stack_depth"] == {"op_stack": 4, "val_stack": 3}
+
+
+def test_op_stack_peak():
+    assert op_stack_peak(tokenize("( ( 1 + 2 ) * ( 3 + 4 ) )")) == 4
+    assert op_stack_peak(tokenize("( 1 + ( 2 + ( 3 + 4 ) ) )")) == 6
+
+
+def test_profiler_saves_cprofile_stats_even_when_the_evaluation_raises(tmp_path):
+    # given
+    # ... an expression dividing by zero
+    path = str(tmp_path / "evaluation.prof")
+    profiler = EvaluationProfiler("prefix")
+    # when
+    with pytest.raises(ZeroDivisionError):
+        profiler.evaluate(compile_expression, "/ 1 - 2 2", path=path)
+    # then
+    # ... the stats are saved, and the summary covers the evaluation up to the error
+    assert profiler.summary()["profile"] == path
+    assert profiler.summary()["peak_stack_depth"] == {"stack": 2}
+    assert any(function == "run" for _, _, function in pstats.Stats(path).stats)
+
+
+def test_profiler_checks_the_program_before_running_it():
+    # given
+    # ... a check rejecting every program
+    def check(program):
+        raise ValueError(len(program.instructions))
+
+    # when
+    with pytest.raises(ValueError) as error:
+        EvaluationProfiler("prefix").evaluate(compile_expression, "+ 1 2", check=check)
+    # then
+    assert error.value.args[0] == 3
@@ -0,0 +1,154 @@
+import itertools
+import multiprocessing
+import os
+import sqlite3
+
+import pytest
+
+import result_store
+from compiler import INFIX, PREFIX
+from exceptions import MalformedPrefixNotationError
+from expression_cache import ExpressionCache
+from result_store import PersistentResultStore
+from shared_cache import SharedResultCache
+
+
+@pytest.mark.parametrize(
+    "result, error",
+    (
+        [3, None],
+        [-(2**9876), None],
+        [1.5, None],
+        [None, (MalformedPrefixNotationError, "There are not enough values to apply the operand '+' on.")],
+        [None, (ZeroDivisionError, "division by zero")],
+    ),
+)
+def test_persistent_result_store_round_trip(tmp_path, result, error):
+    store = PersistentResultStore(str(tmp_path / "results.db"))
+    store.put((PREFIX, "key"), result, error)
+    assert store.get((PREFIX, "key")) == (result, error)
+    assert store.get((INFIX, "key")) is None
+    assert store.stats()["hits"] == store.stats()["misses"] == 1
+
+
+def test_persistent_result_store_keeps_the_results_across_restarts(tmp_path):
+    # given
+    # ... a store, only opened on first use
+    path = str(tmp_path / "results.db")
+    ExpressionCache(store=PersistentResultStore(path)).evaluate(PREFIX, f"* {2 ** 100} {3 ** 100}")
+    # when
+    # ... a new cache (as after a restart) gets the same store
+    store = PersistentResultStore(path)
+    cache = ExpressionCache(store=store)
+    # then
+    # ... the result is read from the store, without evaluating the expression
+    assert cache.evaluate(PREFIX, f"*  {2 ** 100} {3 ** 100}") == 6**100
+    assert cache.evaluate(PREFIX, "+ 1 2") == 3
+    assert store.stats()["hits"] == 1
+    assert store.stats()["entries"] == 2
+
+
+def test_persistent_result_store_is_opened_on_first_use(tmp_path):
+    path = tmp_path / "results.db"
+    store = PersistentResultStore(str(path))
+    assert not path.exists()
+    store.get((PREFIX, "key"))
+    assert path.exists()
+
+
+def test_persistent_result_store_fills_the_backing_store(tmp_path):
+    # given
+    # ... a result in the persistent store, missing from the shared cache
+    store = PersistentResultStore(str(tmp_path / "results.db"))
+    store.put((PREFIX, "+ 1 2"), 3, None)
+    backing = SharedResultCache(slots=16)
+    # when
+    ExpressionCache(backing=backing, store=store).evaluate(PREFIX, "+ 1 2")
+    # then
+    # ... the shared cache gets it
+    assert backing.get((PREFIX, "+ 1 2")) == (3, None)
+
+
+@pytest.mark.parametrize(
+    "max_entries, max_bytes, expected_keys",
+    (
+        # the least recently used entries are evicted first
+        [3, 10**6, {"4", "1", "3"}],
+        # the int results are 1 byte, except the 99 bytes one of "4"
+        [10, 100, {"4", "1"}],
+    ),
+)
+def test_persistent_result_store_evicts_least_recently_used_entries(
+    tmp_path, monkeypatch, max_entries, max_bytes, expected_keys
+):
+    # given
+    # ... a store, whose entries are last used in the order 2, 3, 1, 4
+    clock = itertools.count(1000, 100)
+    monkeypatch.setattr(result_store.time, "time", lambda: next(clock))
+    store = PersistentResultStore(str(tmp_path / "results.db"), max_entries=max_entries, max_bytes=max_bytes)
+    for key in ("1", "2", "3"):
+        store.put((PREFIX, key), int(key), None)
+    store.get((PREFIX, "1"))
+    store.put((PREFIX, "4"), 2**790, None)
+    # when
+    store.evict()
+    # then
+    assert {key for key in ("1", "2", "3", "4") if store.get((PREFIX, key)) is not None} == expected_keys
+
+
+def test_persistent_result_store_keeps_running_totals_of_its_entries(tmp_path):
+    # given
+    # ... two stores on the same database, as the workers of the server have
+    path = str(tmp_path / "results.db")
+    first, second = PersistentResultStore(path, max_entries=3), PersistentResultStore(path, max_entries=3)
+    # when
+    # ... entries are stored, replaced by bigger results, looked up and evicted by either store
+    for index in range(5):
+        (first if index % 2 else second).put((PREFIX, str(index)), index, None)
+    first.put((PREFIX, "4"), 2**790, None)
+    second.get((PREFIX, "4"))
+    # then
+    # ... both report the number and size of the entries actually stored
+    connection = sqlite3.connect(path)
+    expected = connection.execute("SELECT COUNT(*), SUM(LENGTH(payload)) FROM results").fetchone()
+    assert expected == (3, 101)
+    assert (first.stats()["entries"], first.stats()["bytes"]) == expected
+    assert (second.stats()["entries"], second.stats()["bytes"]) == expected
+
+
+def test_persistent_result_store_computes_the_totals_of_an_older_database(tmp_path):
+    # given
+    # ... a database of entries stored without running totals
+    path = str(tmp_path / "results.db")
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE results (digest BLOB PRIMARY KEY, kind INTEGER, payload BLOB, used REAL)")
+    connection.executemany(
+        "INSERT INTO results VALUES (?, 0, ?, ?)", [(bytes([index]), bytes(index), index) for index in range(1, 5)]
+    )
+    connection.commit()
+    connection.close()
+    # when
+    # ... it's opened by a store bounded below its size
+    store = PersistentResultStore(path, max_bytes=8)
+    store.evict()
+    # then
+    # ... the least recently used entries are evicted as its totals are computed once opened
+    assert (store.stats()["entries"], store.stats()["bytes"]) == (2, 7)
+
+
+def test_persistent_result_store_is_shared_with_other_processes(tmp_path):
+    # given
+    # ... a store used by this process before forking
+    store = PersistentResultStore(str(tmp_path / "results.db"))
+    store.put((PREFIX, "+ 1 2"), 3, None)
+    # when
+    # ... an expression is evaluated in a forked process
+    process = multiprocessing.get_context("fork").Process(
+        target=lambda: os._exit(ExpressionCache(store=store).evaluate(PREFIX, "* 6 7") != 42)
+    )
+    process.start()
+    process.join()
+    # then
+    # ... its result is found by this process
+    assert process.exitcode == 0
+    assert store.get((PREFIX, "* 6 7")) == (42, None)
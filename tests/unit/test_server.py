@@ -0,0 +1,20 @@
+from server import RequestCounter
+
+
+def test_request_counter_calls_on_limit_once_the_response_is_closed():
+    # given
+    # ... a wsgi app recycled after 2 requests
+    limits = []
+    counter = RequestCounter(lambda environ, start_response: [b"body"], 2, lambda: limits.append(True))
+    # when
+    # ... 2 requests are served
+    for _ in range(2):
+        response = counter({}, None)
+        assert counter.active == 1
+        assert list(response) == [b"body"]
+        response.close()
+    # then
+    # ... on_limit is called once, and no request is in progress
+    assert limits == [True]
+    assert counter.active == 0
+    assert counter.served == 2
@@ -0,0 +1,202 @@
+import pytest
+
+from benchmarks.generators import random_infix_expression, random_prefix_expression
+from compiler import compile_expression, run_program
+from exceptions import InvalidPatchError, MalformedInfixNotationError, ResourceLimitError, SessionNotFoundError
+from governor import CostLimits
+from sessions import COMPACT_EVERY, Session, SessionStore, SharedSessionStore
+
+
+def outcome(evaluate):
+    try:
+        value = evaluate()
+    except Exception as e:
+        return type(e), e.args
+    return type(value), value
+
+
+@pytest.mark.parametrize(
+    "notation, expression",
+    (
+        ["prefix", "+ / 1 0 - 1 / 2 0"],
+        ["prefix", "* / 7 2 2"],
+        ["infix", "( ( 1 / 0 ) + ( 2 / 0 ) )"],
+        ["infix", "( ( 7 / 2 ) * 2 )"],
+        *[["prefix", random_prefix_expression(seed, tokens=31, depth=6)] for seed in range(5)],
+        *[["infix", random_infix_expression(seed, tokens=31, depth=6)] for seed in range(5)],
+    ),
+)
+def test_session_results_match_run_program(notation, expression):
+    session = Session.create(notation, expression)
+    assert outcome(session.result) == outcome(lambda: run_program(compile_expression(notation, expression)))
+    assert session.expression() == " ".join(expression.split())
+
+
+@pytest.mark.parametrize(
+    "notation, expression, path, replacement, expected_expression, expected_recomputed",
+    (
+        ["prefix", "+ * 2 3 / 4 0", [1, 1], "2", "+ * 2 3 / 4 2", 2],
+        ["prefix", "+ * 2 3 / 4 0", [0], "- 10 1", "+ - 10 1 / 4 0", 1],
+        ["prefix", "+ * 2 3 / 4 0", [], "7", "7", 0],
+        ["infix", "( ( 2 * 3 ) - ( 4 / 2 ) )", [0, 0], "( 5 + 5 )", "( ( ( 5 + 5 ) * 3 ) - ( 4 / 2 ) )", 2],
+    ),
+)
+def test_session_patches_recompute_the_path_to_the_root(
+    notation, expression, path, replacement, expected_expression, expected_recomputed
+):
+    # given
+    # ... a session
+    session = Session.create(notation, expression)
+    # when
+    # ... a subtree is replaced
+    recomputed = session.patch(path, replacement)
+    # then
+    # ... only the operators on its path are recomputed, and the result is the one of the new expression
+    assert recomputed == expected_recomputed
+    assert session.expression() == expected_expression
+    expected = outcome(lambda: run_program(compile_expression(notation, expected_expression)))
+    assert outcome(session.result) == expected
+
+
+@pytest.mark.parametrize("path", ([0, 0], [2], [1, 1, 0], [1.0], [True]))
+def test_session_patches_reject_paths_outside_the_expression(path):
+    session = Session.create("prefix", "+ 1 * 2 3")
+    with pytest.raises(InvalidPatchError):
+        session.patch(path, "4")
+    assert session.result() == 7
+
+
+def test_session_patches_are_checked_like_expressions():
+    session = Session.create("infix", "( 1 + 2 )", max_bits=64, limits=CostLimits(max_bits=1000, max_cost=10**6))
+    with pytest.raises(MalformedInfixNotationError):
+        session.patch([0], "( 1 + )")
+    with pytest.raises(ResourceLimitError):
+        session.patch([0], f"( {2 ** 999} * {2 ** 999} )")
+    # the values too large are errors of the session, which a later patch can fix
+    session.patch([0], f"( {2 ** 63} * 2 )")
+    with pytest.raises(ResourceLimitError):
+        session.result()
+    session.patch([0, 1], "1")
+    assert session.result() == 2**63 + 2
+
+
+def test_session_patches_are_undone_when_the_whole_expression_exceeds_the_limits():
+    # given
+    # ... a session within a limit of 1000 bits
+    session = Session.create("prefix", f"* 1 {2 ** 600}", limits=CostLimits(max_bits=1000, max_cost=None))
+    # when
+    # ... a patch within the limits alone makes the product exceed them
+    with pytest.raises(ResourceLimitError) as error:
+        session.patch([0], str(2**600))
+    # then
+    # ... the patch is undone
+    assert error.value.args[0] == "The values of the expression could reach 1202 bits, above the limit of 1000 bits."
+    assert session.result() == 2**600
+    assert session.expression() == f"* 1 {2 ** 600}"
+    assert session.patch([0], "2") == 1
+    assert session.result() == 2**601
+
+
+def test_session_store_evicts_and_expires_sessions():
+    # given
+    # ... a store of 2 sessions living 10 seconds
+    now = [0.0]
+    store = SessionStore(max_sessions=2, ttl=10, clock=lambda: now[0])
+    first = store.add(Session.create("prefix", "1"))
+    second = store.add(Session.create("prefix", "2"))
+    # when
+    # ... the first one is used, a third one is added, and time passes
+    store.get(first)
+    third = store.add(Session.create("prefix", "3"))
+    # then
+    # ... the least recently used is evicted, then the others expire
+    with pytest.raises(SessionNotFoundError):
+        store.get(second)
+    assert store.get(first).result() == 1
+    now[0] = 10.0
+    with pytest.raises(SessionNotFoundError):
+        store.get(third)
+    assert store.stats() == {
+        "sessions": 0,
+        "max_sessions": 2,
+        "ttl": 10,
+        "created": 3,
+        "expired": 2,
+        "evicted": 1,
+    }
+
+
+def test_shared_session_store_shares_the_patches_of_each_process(tmp_path):
+    # given
+    # ... 2 stores of the same database, as in 2 worker processes, and a session started in the first one
+    first, second = SharedSessionStore(str(tmp_path / "sessions.db")), SharedSessionStore(str(tmp_path / "sessions.db"))
+    limits = CostLimits(max_bits=1000, max_cost=None)
+    session_id = first.add(Session.create("infix", "( ( 2 * 3 ) + ( 4 / 0 ) )", max_bits=64, limits=limits))
+    # when
+    # ... each store patches the session in turn
+    _, recomputed = second.patch(session_id, [1, 1], "2")
+    first.patch(session_id, [0, 0], "( 1 + 1 )")
+    # then
+    # ... both see all the patches, and only the path to the root is re-evaluated
+    assert recomputed == 2
+    for store in (first, second):
+        session = store.get(session_id)
+        assert session.expression() == "( ( ( 1 + 1 ) * 3 ) + ( 4 / 2 ) )"
+        assert session.result() == 8
+        assert session.limits == limits and session.max_bits == 64
+    with pytest.raises(ResourceLimitError):
+        second.patch(session_id, [0, 0], str(2**999))
+    assert first.get(session_id).result() == 8
+
+
+def test_shared_session_store_folds_the_patches_into_the_expression(tmp_path):
+    # given
+    # ... a session patched COMPACT_EVERY + 1 times
+    path = str(tmp_path / "sessions.db")
+    store = SharedSessionStore(path)
+    session_id = store.add(Session.create("prefix", "+ 0 0"))
+    for value in range(COMPACT_EVERY + 1):
+        store.patch(session_id, [0], str(value))
+    # when
+    # ... another process first uses it
+    session = SharedSessionStore(path).get(session_id)
+    # then
+    # ... it's rebuilt from the folded expression, and the patch logged since
+    assert session.expression() == f"+ {COMPACT_EVERY} 0"
+    assert session.patches == COMPACT_EVERY + 1
+
+
+def test_shared_session_store_evicts_and_expires_sessions(tmp_path):
+    # given
+    # ... a store of 2 sessions living 10 seconds
+    now = [0.0]
+    store = SharedSessionStore(str(tmp_path / "sessions.db"), max_sessions=2, ttl=10, clock=lambda: now[0])
+    first = store.add(Session.create("prefix", "1"))
+    now[0] = 1.0
+    second = store.add(Session.create("prefix", "2"))
+    # when
+    # ... the first one is used, a third one is added, and time passes
+    now[0] = 2.0
+    store.get(first)
+    third = store.add(Session.create("prefix", "3"))
+    # then
+    # ... the least recently used is evicted, then the others expire
+    with pytest.raises(SessionNotFoundError):
+        store.get(second)
+    assert store.get(first).result() == 1
+    now[0] = 12.0
+    with pytest.raises(SessionNotFoundError):
+        store.get(third)
+    store.add(Session.create("prefix", "4"))
+    store.delete(store.add(Session.create("prefix", "5")))
+    with pytest.raises(SessionNotFoundError):
+        store.delete(first)
+    assert store.stats() == {
+        "path": str(tmp_path / "sessions.db"),
+        "sessions": 1,
+        "max_sessions": 2,
+        "ttl": 10,
+        "created": 5,
+        "expired": 2,
+        "evicted": 1,
+    }
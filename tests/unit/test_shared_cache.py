@@ -0,0 +1,82 @@
+import multiprocessing
+
+import pytest
+
+from compiler import PREFIX
+from exceptions import MalformedPrefixNotationError
+from expression_cache import ExpressionCache
+from shared_cache import SharedResultCache, key_digest
+
+
+@pytest.mark.parametrize(
+    "result, error",
+    (
+        [3, None],
+        [-(2 ** 987), None],
+        [1.5, None],
+        [None, (MalformedPrefixNotationError, "There are not enough values to apply the operand '+' on.")],
+        [None, (ZeroDivisionError, "division by zero")],
+    ),
+)
+def test_shared_result_cache_round_trip(result, error):
+    cache = SharedResultCache(slots=16)
+    cache.put((PREFIX, "key"), result, error)
+    assert cache.get((PREFIX, "key")) == (result, error)
+    assert cache.get((PREFIX, "other key")) is None
+    assert cache.stats()["hits"] == cache.stats()["misses"] == 1
+
+
+def test_shared_result_cache_keys_payloads_apart_from_expressions_of_the_same_bytes():
+    # given
+    # ... the error of a binary payload whose bytes are the ones of a valid expression
+    cache = SharedResultCache(slots=16)
+    cache.put((PREFIX, b"+ 1 2"), None, (MalformedPrefixNotationError, "The payload is malformed."))
+    # when
+    # ... the expression is looked up
+    # then
+    # ... it's a miss, rather than the error of the payload
+    assert key_digest((PREFIX, "+ 1 2")) != key_digest((PREFIX, b"+ 1 2"))
+    assert cache.get((PREFIX, "+ 1 2")) is None
+    assert cache.get((PREFIX, b"+ 1 2")) == (None, (MalformedPrefixNotationError, "The payload is malformed."))
+
+
+def test_shared_result_cache_skips_results_larger_than_a_slot():
+    cache = SharedResultCache(slots=16, slot_size=64)
+    cache.put((PREFIX, "key"), 2 ** 1000, None)
+    assert cache.get((PREFIX, "key")) is None
+
+
+def test_shared_result_cache_evicts_least_recently_used_slot_of_a_set():
+    # given
+    # ... a cache with a single set of 2 slots, both used
+    cache = SharedResultCache(slots=2, ways=2)
+    cache.put((PREFIX, "1"), 1, None)
+    cache.put((PREFIX, "2"), 2, None)
+    cache.get((PREFIX, "1"))
+    # when
+    # ... a third result is stored
+    cache.put((PREFIX, "3"), 3, None)
+    # then
+    # ... the least recently used one is evicted
+    assert cache.get((PREFIX, "2")) is None
+    assert cache.get((PREFIX, "1")) == (1, None)
+    assert cache.get((PREFIX, "3")) == (3, None)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_shared_result_cache_is_shared_with_forked_processes():
+    # given
+    # ... a shared cache created before forking
+    cache = SharedResultCache(slots=16)
+    # when
+    # ... an expression is evaluated in a forked process
+    process = multiprocessing.get_context("fork").Process(
+        target=lambda: ExpressionCache(backing=cache).evaluate(PREFIX, "* 6 7")
+    )
+    process.start()
+    process.join()
+    # then
+    # ... its result is found by this process
+    local_cache = ExpressionCache(backing=cache)
+    assert local_cache.evaluate(PREFIX, "* 6 7") == 42
+    assert cache.stats()["hits"] == 1
@@ -0,0 +1,140 @@
+import io
+import sys
+import tracemalloc
+
+import pytest
+
+from exceptions import InvalidCharacterError, InvalidParenthesesError, MalformedPrefixNotationError
+import infix_calculator
+import prefix_calculator
+from infix_calculator import evaluate_infix_notation, evaluate_infix_stream
+from prefix_calculator import evaluate_prefix_notation, evaluate_prefix_stream
+from streaming import open_expression
+from tokenizer import StreamTokenizer
+
+
+def balanced_prefix(depth):
+    return "1" if depth == 0 else f"+ {balanced_prefix(depth - 1)} * 1 {balanced_prefix(depth - 1)}"
+
+
+@pytest.mark.parametrize("chunk_size", (1, 3, 1024))
+def test_stream_tokenizer_joins_literals_split_across_chunks(chunk_size):
+    tokens = StreamTokenizer(io.BytesIO("( 1234 +\n56789 )\n".encode()), chunk_size)
+    assert list(tokens) == ["(", 1234, "+", 56789, ")"]
+    assert (tokens.first_char, tokens.last_char) == ("(", ")")
+
+
+@pytest.mark.parametrize("chunk_size", (1, 4, 1024))
+@pytest.mark.parametrize(
+    "expression",
+    (
+        "3",
+        "+ 1 2",
+        "- / 10 + 1 1 * 1 2",
+        "* / + - 12 987 323 111 1023",
+        "+ 0 - 0 + 0 + 0 / 1 1",
+        f"+ {2 ** 987} {2 ** 525}",
+    ),
+)
+def test_evaluate_prefix_stream_success(chunk_size, expression):
+    assert evaluate_prefix_stream(io.BytesIO(expression.encode()), chunk_size) == evaluate_prefix_notation(expression)
+
+
+@pytest.mark.parametrize("chunk_size", (1, 4, 1024))
+@pytest.mark.parametrize(
+    "expression",
+    (
+        "( 1 + 2 )",
+        "( ( ( 1 + 1 ) / 10 ) - ( 1 * 2 ) )",
+        "( 4 * ( ( ( 6 + 1 ) - 2 ) + 6 ) )",
+        f"( {2 ** 987} + {2 ** 525} )",
+    ),
+)
+def test_evaluate_infix_stream_success(chunk_size, expression):
+    assert evaluate_infix_stream(io.StringIO(expression), chunk_size) == evaluate_infix_notation(expression)
+
+
+@pytest.mark.parametrize(
+    "expression, exception_type, exception_msg",
+    (
+        ["", MalformedPrefixNotationError, "The provided expression does not contain any characters."],
+        ["+ 1", MalformedPrefixNotationError, "There are not enough values to apply the operand '+' on."],
+        ["5 + 1 2", MalformedPrefixNotationError, "There were too many values and not enough operators."],
+        # the expression is read in order, so the first invalid char is found first
+        ["* a b", InvalidCharacterError, "Invalid character found in expression: 'a'."],
+        ["/ 5 0", ZeroDivisionError, "division by zero"],
+    ),
+)
+def test_evaluate_prefix_stream_when_it_raises_exception(expression, exception_type, exception_msg):
+    with pytest.raises(exception_type) as error:
+        evaluate_prefix_stream(io.BytesIO(expression.encode()))
+
+    assert error.value.args[0] == exception_msg
+
+
+@pytest.mark.parametrize(
+    "module, data, expected_output, expected_status",
+    (
+        # results above the int max str digits limit are printed all the same
+        [prefix_calculator, f"* {'9' * 3000} {'9' * 3000}".encode(), "9" * 2999 + "8" + "0" * 2999 + "1", 0],
+        [
+            infix_calculator,
+            f"( 0 - ( {'9' * 3000} * {'9' * 3000} ) )".encode(),
+            "-" + "9" * 2999 + "8" + "0" * 2999 + "1",
+            0,
+        ],
+        [
+            prefix_calculator,
+            b"+ 1 \xff",
+            "Failed to evaluate expression: 'utf-8' codec can't decode byte 0xff in position 4: invalid start byte",
+            1,
+        ],
+        [
+            infix_calculator,
+            f"( 1{'0' * 400} / 3 )".encode(),
+            "Failed to evaluate expression: integer division result too large for a float",
+            1,
+        ],
+    ),
+    ids=("prefix-long-result", "infix-long-result", "prefix-invalid-utf-8", "infix-overflow"),
+)
+def test_calculators_evaluate_files_from_the_command_line(
+    tmp_path, monkeypatch, capsys, module, data, expected_output, expected_status
+):
+    # given
+    # ... an expression in a file
+    path = tmp_path / "expression.txt"
+    path.write_bytes(data)
+    monkeypatch.setattr(sys, "argv", [module.__name__, str(path)])
+    # when
+    status = module.main()
+    # then
+    # ... its result or its error is printed, and the status tells them apart
+    assert capsys.readouterr().out == expected_output + "\n"
+    assert status == expected_status
+
+
+@pytest.mark.parametrize("expression", ("6 + 5", "( 6 + 5", " ( 6 + 5 )"))
+def test_evaluate_infix_stream_checks_parentheses(expression):
+    with pytest.raises(InvalidParenthesesError):
+        evaluate_infix_stream(io.BytesIO(expression.encode()))
+
+
+def test_evaluate_prefix_stream_memory_does_not_depend_on_expression_length(tmp_path):
+    # given
+    # ... a large expression of low nesting depth, in a file
+    expression = balanced_prefix(16)
+    path = tmp_path / "expression.txt"
+    path.write_text(expression + "\n")
+    # when
+    # ... it's evaluated from a memory map
+    tracemalloc.start()
+    with open_expression(str(path)) as stream:
+        result = evaluate_prefix_stream(stream, chunk_size=4096)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    # then
+    # ... the memory used is a fraction of the length of the expression
+    assert result == 2 ** 16
+    assert len(expression) > 500000
+    assert peak < len(expression) / 10
@@ -0,0 +1,38 @@
+import pytest
+
+from tokenizer import parse_literal, token_chars, token_position, tokenize, tokenize_reversed
+
+
+@pytest.mark.parametrize(
+    "expression, expected",
+    (
+        ["+ 1 2", ["+", 1, 2]],
+        ["( 12 * 340 )", ["(", 12, "*", 340, ")"]],
+        ["(12*340)", ["(", 12, "*", 340, ")"]],
+        ["+   1  2 ", ["+", 1, 2]],
+        ["98.7", [98, ".", 7]],
+        ["* a b", ["*", "a", "b"]],
+        ["", []],
+    ),
+)
+def test_tokenize(expression, expected):
+    assert list(tokenize(expression)) == expected
+
+
+def test_tokenize_reversed():
+    assert list(tokenize_reversed("- 10 3")) == [3, 10, "-"]
+
+
+def test_token_chars_and_positions():
+    assert token_chars("(  100 +a)") == "(0+a)"
+    assert [token_position("(  100 +a)", index) for index in range(5)] == [0, 3, 7, 8, 9]
+
+
+@pytest.mark.parametrize("length", (1, 300, 4300, 4301, 20000))
+def test_parse_literal_converts_literals_of_any_length(length):
+    digits = ("1234567890" * (length // 10 + 1))[:length]
+    expected = 0
+    for start in range(0, length, 1000):
+        chunk = digits[start:start + 1000]
+        expected = expected * 10 ** len(chunk) + int(chunk)
+    assert parse_literal(digits) == expected
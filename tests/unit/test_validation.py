@@ -0,0 +1,71 @@
+import pytest
+
+from benchmarks.generators import random_infix_expression, random_prefix_expression
+from compiler import COMPILERS
+from validation import (
+    EMPTY_EXPRESSION,
+    EXPECTED_OPERATOR,
+    INVALID_CHARACTER,
+    INVALID_PARENTHESES,
+    NO_VALUES,
+    NOT_ENOUGH_OPERATORS,
+    NOT_ENOUGH_VALUES,
+    TOO_MANY_VALUES,
+    validate,
+)
+
+
+@pytest.mark.parametrize(
+    "notation, expression, code, position",
+    (
+        ["prefix", "", EMPTY_EXPRESSION, 0],
+        ["prefix", "* a b", INVALID_CHARACTER, 4],
+        ["prefix", "* / + - 12 98.7 323 111 10,23", INVALID_CHARACTER, 26],
+        ["prefix", "   ", NO_VALUES, 0],
+        ["prefix", "+ 3 1 2 *", NOT_ENOUGH_VALUES, 8],
+        ["prefix", "5 + + 1 2 - 4 3", TOO_MANY_VALUES, 0],
+        ["infix", "", EMPTY_EXPRESSION, 0],
+        ["infix", "6 + 5", INVALID_PARENTHESES, 0],
+        ["infix", "( 6 + 5", INVALID_PARENTHESES, 6],
+        ["infix", "( ( 1 + 2,5 ) * 3 )", INVALID_CHARACTER, 9],
+        ["infix", "( ( ( ( ( ( 1 + 1 ) ) ) ) ) )", EXPECTED_OPERATOR, 20],
+        ["infix", "( 6 10 )", NOT_ENOUGH_OPERATORS, 7],
+        ["infix", "( + 4 )", NOT_ENOUGH_VALUES, 2],
+        ["infix", "( 6000 6 + ( 4 * ( 2 + 3 ) ) )", TOO_MANY_VALUES, 29],
+        ["infix", "( ( 1 + 2 )", TOO_MANY_VALUES, 0],
+    ),
+)
+def test_validate_returns_the_error_of_the_compiler_and_its_position(notation, expression, code, position):
+    error = validate(notation, expression)
+    assert (error.code, error.position) == (code, position)
+    # ... the error is the one raised when evaluating the expression
+    assert (error.error_type, error.message) == COMPILERS[notation](expression).error
+    assert not error.after_division
+
+
+@pytest.mark.parametrize(
+    "notation, expression",
+    (
+        ["prefix", "3"],
+        ["prefix", "/ 5 0"],
+        ["infix", "( 5 / 0 )"],
+        *[["prefix", random_prefix_expression(seed, tokens=63, depth=8)] for seed in range(5)],
+        *[["infix", random_infix_expression(seed, tokens=63, depth=8)] for seed in range(5)],
+    ),
+)
+def test_validate_well_formed_expressions(notation, expression):
+    assert validate(notation, expression) is None
+
+
+@pytest.mark.parametrize(
+    "notation, expression, after_division",
+    (
+        # the division is applied before the extra value is found, traversing the prefix expression in reverse order
+        ["prefix", "5 / 1 0", True],
+        ["prefix", "/ 5 + 1", False],
+        ["infix", "( ( 1 / 0 ) + )", True],
+        ["infix", "( ( 1 + 0 ) / )", False],
+    ),
+)
+def test_validate_errors_found_after_a_division(notation, expression, after_division):
+    assert validate(notation, expression).after_division == after_division
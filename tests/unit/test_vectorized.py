@@ -0,0 +1,81 @@
+import pytest
+
+from compiler import INFIX, PREFIX
+from exceptions import MalformedPrefixNotationError, UnboundVariableError
+from vectorized import compile_parametric, evaluate_vectorized
+
+numpy = pytest.importorskip("numpy")
+
+
+@pytest.mark.parametrize(
+    "expression, notation",
+    (
+        ["* + x y z", PREFIX],
+        ["( ( x + y ) * z )", INFIX],
+    ),
+)
+def test_evaluate_vectorized_success(expression, notation):
+    # given
+    # ... a parametric expression compiled once
+    program = compile_parametric(expression, notation)
+    # when
+    # ... it's evaluated over columns of bindings
+    result = evaluate_vectorized(program, {"x": numpy.arange(4), "y": numpy.full(4, 10), "z": 2})
+    # then
+    # ... one result is returned per row
+    assert result.tolist() == [20, 22, 24, 26]
+
+
+@pytest.mark.parametrize(
+    "expression, notation",
+    (
+        ["- / x y 1", PREFIX],
+        ["( ( x / y ) - 1 )", INFIX],
+    ),
+)
+def test_evaluate_vectorized_masks_zero_divisions(expression, notation):
+    # given
+    # ... a column of divisors containing zeroes
+    program = compile_parametric(expression, notation)
+    # when
+    # ... the expression is evaluated
+    result = evaluate_vectorized(program, {"x": numpy.array([6, 1, 9]), "y": numpy.array([3, 0, 2])})
+    # then
+    # ... only the rows divided by zero are flagged
+    assert result.mask.tolist() == [False, True, False]
+    assert result.compressed().tolist() == [1.0, 3.5]
+
+
+def test_evaluate_vectorized_casts_floats_with_no_decimals_to_ints():
+    # given
+    # ... divisions without remainders, and divisions where one has a remainder
+    program = compile_parametric("/ x y")
+    # when
+    # ... they're evaluated
+    exact = evaluate_vectorized(program, {"x": numpy.array([6, 9]), "y": numpy.array([3, 3])})
+    inexact = evaluate_vectorized(program, {"x": numpy.array([6, 7]), "y": numpy.array([3, 2])})
+    # then
+    # ... the results have the types of the scalar evaluators, as long as all the elements do
+    assert exact.dtype.kind == "i"
+    assert exact.tolist() == [2, 3]
+    assert inexact.dtype.kind == "f"
+    assert inexact.tolist() == [2.0, 3.5]
+
+
+def test_evaluate_vectorized_broadcasts_constant_expressions():
+    result = evaluate_vectorized(compile_parametric("+ 1 2"), {"x": numpy.arange(3)})
+    assert result.tolist() == [3, 3, 3]
+
+
+@pytest.mark.parametrize(
+    "expression, bindings, exception_type, exception_msg",
+    (
+        ["+ x y", {"x": [1]}, UnboundVariableError, "No value bound to variable 'y'."],
+        ["+ x", {"x": [1]}, MalformedPrefixNotationError, "There are not enough values to apply the operand '+' on."],
+    ),
+)
+def test_evaluate_vectorized_when_it_raises_exception(expression, bindings, exception_type, exception_msg):
+    with pytest.raises(exception_type) as error:
+        evaluate_vectorized(compile_parametric(expression), bindings)
+
+    assert error.value.args[0] == exception_msg
@@ -0,0 +1,161 @@
+import codecs
+import re
+import sys
+from collections import namedtuple
+
+# a run of digits is a literal, any other non space char is an operator, a parenthesis or an invalid char
+_TOKEN_RE = re.compile(r"([0-9]+)|([^ ])")
+_DIGITS_RE = re.compile(r"[0-9]*")
+_LITERAL_RE = re.compile(r"[0-9]+")
+# streams can be split in lines, so line breaks separate tokens as spaces do
+_STREAM_TOKEN_RE = re.compile(r"([0-9]+)|([^ \r\n])")
+# same as above, with identifiers for the variables of parametric expressions
+_PARAMETRIC_TOKEN_RE = re.compile(r"([0-9]+)|([A-Za-z_][A-Za-z0-9_]*)|([^ ])")
+
+CHUNK_SIZE = 1024 * 1024
+
+# a variable of a parametric expression, bound to a value when evaluating the expression
+Variable = namedtuple("Variable", ["name"])
+
+
+def _int_max_str_digits():
+    # python 3.11+ limits the number of digits int() converts at once, 0 meaning no limit
+    return sys.get_int_max_str_digits() if hasattr(sys, "get_int_max_str_digits") else 0
+
+
+def parse_literal(digits):
+    """Convert a slice of digits into an int in one step.
+
+    Literals longer than the int max str digits limit of the interpreter are split in halves, converted separately
+    and combined, which keeps the conversion subquadratic in the length of the literal.
+    """
+    limit = _int_max_str_digits()
+    if not limit or len(digits) <= limit:
+        return int(digits)
+    half = len(digits) // 2
+    return parse_literal(digits[:half]) * 10 ** (len(digits) - half) + parse_literal(digits[half:])
+
+
+def is_long_literal(value):
+    """Return whether an int may have more digits than the int max str digits limit, which str() refuses to convert.
+
+    Use format_literal to convert them (e.g. json.dumps fails on them).
+    """
+    limit = _int_max_str_digits()
+    # 3.33 bits per digit, so the values below the limit in bits are well below the limit in digits
+    return bool(limit) and value.bit_length() > limit * 3
+
+
+def format_literal(value):
+    """Convert a non negative int into its digits, the inverse of parse_literal.
+
+    Values with more digits than the int max str digits limit are split in halves by a power of 10, converted
+    separately and joined.
+    """
+    if not is_long_literal(value):
+        return str(value)
+    half = int(value.bit_length() * 0.30103) // 2
+    high, low = divmod(value, 10**half)
+    return format_literal(high) + format_literal(low).zfill(half)
+
+
+def format_value(value):
+    """Convert the result of an evaluation into its text, with format_literal for the ints of any size and sign."""
+    if type(value) is not int:
+        return str(value)
+    return format_literal(value) if value >= 0 else "-" + format_literal(-value)
+
+
+def tokenize(expression, variables=False):
+    """Yield the tokens of the expression in order.
+
+    Each literal is yielded as an int, converted from the whole run of digits once its boundaries are found.
+    Operators, parentheses and invalid chars are yielded as single chars, and spaces only separate tokens.
+    If variables is set, identifiers are yielded as variables instead of invalid chars.
+    """
+    if not variables:
+        for match in _TOKEN_RE.finditer(expression):
+            digits, char = match.groups()
+            yield parse_literal(digits) if digits is not None else char
+        return
+
+    for match in _PARAMETRIC_TOKEN_RE.finditer(expression):
+        digits, name, char = match.groups()
+        if digits is not None:
+            yield parse_literal(digits)
+        else:
+            yield Variable(name) if name is not None else char
+
+
+def token_chars(expression):
+    """Return a string of the tokens of the expression in order, one char each: "0" for literals.
+
+    Literals aren't converted to ints, for the callers which only need the structure of the expression (as any run
+    of digits is a literal, the other tokens are never "0").
+    """
+    return _LITERAL_RE.sub("0", expression).replace(" ", "")
+
+
+def token_position(expression, index):
+    """Return the position in the expression of the first char of its token at this index."""
+    for i, match in enumerate(_TOKEN_RE.finditer(expression)):
+        if i == index:
+            return match.start()
+    return len(expression)
+
+
+def tokenize_reversed(expression, variables=False):
+    """Return the tokens of the expression in reverse order, as needed to evaluate the prefix notation."""
+    return reversed(list(tokenize(expression, variables)))
+
+
+class StreamTokenizer:
+    """Iterate over the tokens of an expression read from a stream (a file object, an mmap, a request body...).
+
+    The stream is read in chunks of chunk_size chars or bytes (bytes are decoded as utf-8), so only the chunk
+    being tokenized is held in memory, and the literal being read if it spans several chunks. Line breaks separate
+    tokens as spaces do. The first and last chars of the expression (ignoring the line breaks at the end) are kept,
+    for the checks done on the whole expression.
+    """
+
+    def __init__(self, stream, chunk_size=CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.first_char = None
+        self.last_char = None
+
+    def _chunks(self):
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        while True:
+            data = self.stream.read(self.chunk_size)
+            chunk = decoder.decode(data, final=not data) if isinstance(data, bytes) else data
+            if chunk:
+                if self.first_char is None:
+                    self.first_char = chunk[0]
+                if chunk.rstrip("\r\n"):
+                    self.last_char = chunk.rstrip("\r\n")[-1]
+                yield chunk
+            if not data:
+                return
+
+    def __iter__(self):
+        digits = []  # the parts of a literal which may continue in the next chunk
+        for chunk in self._chunks():
+            pos = 0
+            if digits:
+                pos = _DIGITS_RE.match(chunk).end()
+                digits.append(chunk[:pos])
+                if pos == len(chunk):
+                    continue
+                yield parse_literal("".join(digits))
+                digits = []
+            for match in _STREAM_TOKEN_RE.finditer(chunk, pos):
+                literal, char = match.groups()
+                if literal is None:
+                    yield char
+                elif match.end() == len(chunk):
+                    digits.append(literal)
+                else:
+                    yield parse_literal(literal)
+        if digits:
+            yield parse_literal("".join(digits))
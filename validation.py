@@ -0,0 +1,121 @@
+from collections import namedtuple
+
+from compiler import INFIX, PREFIX
+from exceptions import (
+    InvalidCharacterError,
+    InvalidParenthesesError,
+    MalformedInfixNotationError,
+    MalformedPrefixNotationError,
+)
+from operations import INFIX_OPERATORS, PREFIX_OPERATORS
+from tokenizer import token_chars, token_position
+
+# the codes of the errors found by validating expressions
+EMPTY_EXPRESSION = "empty_expression"
+INVALID_CHARACTER = "invalid_character"
+INVALID_PARENTHESES = "invalid_parentheses"
+NOT_ENOUGH_VALUES = "not_enough_values"
+NOT_ENOUGH_OPERATORS = "not_enough_operators"
+EXPECTED_OPERATOR = "expected_operator"
+NO_VALUES = "no_values"
+TOO_MANY_VALUES = "too_many_values"
+
+# The first error of a malformed expression: its code, the exception type and message the evaluators raise for it,
+# the position of the char where it's found, and whether a division is applied before the error is found, when
+# evaluating the expression (in which case the evaluation may raise a zero division error first).
+ValidationError = namedtuple("ValidationError", ["code", "error_type", "message", "position", "after_division"])
+
+
+def _validate_prefix(expression):
+    chars = token_chars(expression)
+    depth = 0
+    divided = False
+    # the tokens are traversed in reverse order, as by the evaluator
+    for index in range(len(chars) - 1, -1, -1):
+        char = chars[index]
+        if char == "0":
+            depth += 1
+        elif char in PREFIX_OPERATORS:
+            if depth < 2:
+                error_msg = f"There are not enough values to apply the operand '{char}' on."
+                position = token_position(expression, index)
+                return ValidationError(NOT_ENOUGH_VALUES, MalformedPrefixNotationError, error_msg, position, divided)
+            depth -= 1
+            divided = divided or char == "/"
+        else:
+            error_msg = f"Invalid character found in expression: '{char}'."
+            position = token_position(expression, index)
+            return ValidationError(INVALID_CHARACTER, InvalidCharacterError, error_msg, position, divided)
+
+    if depth == 0:
+        error_msg = "The provided expression does not contain any values."
+        return ValidationError(NO_VALUES, MalformedPrefixNotationError, error_msg, 0, divided)
+    if depth > 1:
+        # the first value of the expression is one too many
+        error_msg = "There were too many values and not enough operators."
+        position = token_position(expression, 0)
+        return ValidationError(TOO_MANY_VALUES, MalformedPrefixNotationError, error_msg, position, divided)
+    return None
+
+
+def _validate_infix(expression):
+    if expression[0] != "(" or expression[-1] != ")":
+        error_msg = "Invalid parentheses configuration in input string."
+        position = 0 if expression[0] != "(" else len(expression) - 1
+        return ValidationError(INVALID_PARENTHESES, InvalidParenthesesError, error_msg, position, False)
+
+    op_stack = []  # (char, index) of the operators and parentheses
+    depth = 0
+    divided = False
+    for index, char in enumerate(token_chars(expression)):
+        if char == ")":
+            if len(op_stack) < 2:
+                error_msg = "Not enough operators/parentheses to perform the operation."
+                position = token_position(expression, index)
+                return ValidationError(NOT_ENOUGH_OPERATORS, MalformedInfixNotationError, error_msg, position, divided)
+            (top_op, top_index), (next_parenthesis, _) = op_stack.pop(), op_stack.pop()
+            if top_op not in INFIX_OPERATORS or next_parenthesis != "(":
+                error_msg = "Expected operator or parenthesis not found."
+                position = token_position(expression, index)
+                return ValidationError(EXPECTED_OPERATOR, MalformedInfixNotationError, error_msg, position, divided)
+            if depth < 2:
+                error_msg = f"Not enough values to apply the operand '{top_op}' on."
+                position = token_position(expression, top_index)
+                return ValidationError(NOT_ENOUGH_VALUES, MalformedInfixNotationError, error_msg, position, divided)
+            depth -= 1
+            divided = divided or top_op == "/"
+        elif char == "0":
+            depth += 1
+        elif char in INFIX_OPERATORS or char == "(":
+            op_stack.append((char, index))
+        else:
+            error_msg = f"Invalid character found in expression: '{char}'."
+            position = token_position(expression, index)
+            return ValidationError(INVALID_CHARACTER, InvalidCharacterError, error_msg, position, divided)
+
+    if op_stack or depth != 1:
+        # the first operator or parenthesis left, or else the end of the expression
+        position = token_position(expression, op_stack[0][1]) if op_stack else len(expression) - 1
+        error_msg = "There were too many values / operators / parentheses."
+        return ValidationError(TOO_MANY_VALUES, MalformedInfixNotationError, error_msg, position, divided)
+    return None
+
+
+VALIDATORS = {
+    PREFIX: _validate_prefix,
+    INFIX: _validate_infix,
+}
+
+
+def validate(notation, expression):
+    """Return the first error of the expression (a ValidationError), or None if it's well formed, without raising.
+
+    The errors are the ones the evaluators (and the compiler) of the notation raise for the expression, found in the
+    same order, along with the position of the char where they're found. Zero divisions, which depend on the values
+    of the expression, aren't validation errors.
+    """
+    if not expression:
+        error_type = MalformedPrefixNotationError if notation == PREFIX else MalformedInfixNotationError
+        error_msg = "The provided expression does not contain any characters."
+        return ValidationError(EMPTY_EXPRESSION, error_type, error_msg, 0, False)
+    return VALIDATORS[notation](expression)
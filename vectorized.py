@@ -0,0 +1,62 @@
+import logging
+from collections import deque
+
+from compiler import COMPILERS, INFIX, PREFIX, bound_value
+from operations import (
+    VECTORIZED_INFIX_OPERATORS,
+    VECTORIZED_PREFIX_OPERATORS,
+    cast_float_array_to_int_if_no_decimals,
+    numpy,
+)
+from tokenizer import Variable
+
+logger = logging.getLogger(__name__)
+
+VECTORIZED_OPERATORS = {
+    PREFIX: VECTORIZED_PREFIX_OPERATORS,
+    INFIX: VECTORIZED_INFIX_OPERATORS,
+}
+
+
+def compile_parametric(expression, notation=PREFIX):
+    """Compile a parametric expression, where identifiers are variables, once.
+
+    The compiled program can be evaluated any number of times by evaluate_vectorized, on different bindings.
+    """
+    return COMPILERS[notation](expression, variables=True)
+
+
+def evaluate_vectorized(program, bindings):
+    """Evaluate a parametric program over columns of bindings, returning a masked array of results.
+
+    bindings maps each variable to a numpy array (or anything numpy.asarray accepts), and the results are computed
+    element-wise over the broadcast of all the columns, with the numpy dtypes (e.g. int64 columns can overflow).
+    The elements divided by zero are masked in the result, instead of aborting the evaluation of the whole batch.
+    As the scalar evaluators return ints for the floats with no decimals, float results are cast to ints when none
+    of their elements has decimals (a single element with decimals keeps all of them floats).
+    """
+    if numpy is None:
+        raise RuntimeError("numpy is required for the vectorized evaluation of expressions.")
+
+    operators = VECTORIZED_OPERATORS[program.notation]
+    columns = {name: numpy.asarray(column) for name, column in (bindings or {}).items()}
+    stack = deque()  # using a double ended queue as a stack of arrays
+    for instruction in program.instructions:
+        if type(instruction) is int:
+            stack.append(instruction)
+        elif type(instruction) is Variable:
+            stack.append(bound_value(instruction, columns))
+        else:
+            stack.append(operators[instruction](stack.pop(), stack.pop()))
+
+    if program.error is not None:
+        error_type, error_msg = program.error
+        logger.error(error_msg)
+        raise error_type(error_msg)
+
+    shape = numpy.broadcast_shapes(*(column.shape for column in columns.values()))
+    result = cast_float_array_to_int_if_no_decimals(numpy.ma.asarray(stack.pop()))
+    return numpy.ma.masked_array(
+        numpy.broadcast_to(result.filled(0), shape),
+        mask=numpy.broadcast_to(numpy.ma.getmaskarray(result), shape),
+    )
@@ -1,14 +1,585 @@
+import collections
+import hmac
+import json
+import os
+import threading
+import uuid
+from functools import wraps
+from time import perf_counter
+
+from batch import dumps_record, evaluate_batch, iter_json_array, iter_ndjson
+from binary_format import MIMETYPE as TOKENS_MIMETYPE
+from binary_format import decode_tokens, encode_response
+from coalescing import SingleFlight
+from compiler import ALGEBRAIC, INFIX, PREFIX, compile_expression, compile_tokens, run_program
+from dag import build_dag, run_dag
 from exceptions import (
+    EvaluationTimeoutError,
     InvalidCharacterError,
     InvalidParenthesesError,
+    InvalidPatchError,
+    InvalidPayloadError,
     MalformedInfixNotationError,
     MalformedPrefixNotationError,
+    ProfilingNotAllowedError,
+    ResourceLimitError,
+    ServerBusyError,
+    SessionNotFoundError,
 )
-from flask import Flask, request
-from infix_calculator import evaluate_infix_notation
-from prefix_calculator import evaluate_prefix_notation
+from expression_cache import EVALUATION_ERRORS, ExpressionCache, normalize_expression
+from flask import Flask, Response, request, stream_with_context
+from governor import CostLimits, check_cost
+from infix_calculator import evaluate_algebraic_notation, evaluate_infix_notation, evaluate_infix_stream
+from log_sampling import ErrorLogSampler
+from metrics import DURATION_BUCKETS, SIZE_BUCKETS, CallbackCounter, Counter, Gauge, Histogram, Registry
+from offload import EvaluationPool, is_expensive
+from parallel import ParallelEvaluator
+from prefix_calculator import evaluate_prefix_notation, evaluate_prefix_stream
+from profiling import EvaluationProfiler
+from result_store import PersistentResultStore
+from sessions import Session, SessionStore, SharedSessionStore
+from tokenizer import is_long_literal, tokenize
+from validation import VALIDATORS, validate
 
 app = Flask(__name__)
+app.config["EXPRESSION_CACHE_ENABLED"] = os.environ.get("EXPRESSION_CACHE_ENABLED", "True") == "True"
+app.config["EXPRESSION_CACHE_MAX_ENTRIES"] = int(os.environ.get("EXPRESSION_CACHE_MAX_ENTRIES", 4096))
+app.config["EXPRESSION_CACHE_MAX_BYTES"] = int(os.environ.get("EXPRESSION_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+app.config["EXPRESSION_CACHE_CANONICAL"] = os.environ.get("EXPRESSION_CACHE_CANONICAL", "True") == "True"
+# the SQLite database keeping the results across restarts (no persistent store without one)
+app.config["RESULT_STORE_PATH"] = os.environ.get("RESULT_STORE_PATH") or None
+app.config["RESULT_STORE_MAX_ENTRIES"] = int(os.environ.get("RESULT_STORE_MAX_ENTRIES", 1000000))
+app.config["RESULT_STORE_MAX_BYTES"] = int(os.environ.get("RESULT_STORE_MAX_BYTES", 1024 * 1024 * 1024))
+app.config["OFFLOAD_ENABLED"] = os.environ.get("OFFLOAD_ENABLED", "False") == "True"
+app.config["OFFLOAD_WORKERS"] = int(os.environ.get("OFFLOAD_WORKERS", os.cpu_count() or 1))
+app.config["OFFLOAD_MAX_QUEUE"] = int(os.environ.get("OFFLOAD_MAX_QUEUE", 32))
+app.config["OFFLOAD_MIN_INSTRUCTIONS"] = int(os.environ.get("OFFLOAD_MIN_INSTRUCTIONS", 10000))
+app.config["OFFLOAD_MIN_LITERAL_BITS"] = int(os.environ.get("OFFLOAD_MIN_LITERAL_BITS", 64 * 1024))
+app.config["EVALUATION_TIMEOUT"] = float(os.environ.get("EVALUATION_TIMEOUT", 30))
+app.config["RETRY_AFTER"] = int(os.environ.get("RETRY_AFTER", 1))
+app.config["METRICS_ENABLED"] = os.environ.get("METRICS_ENABLED", "True") == "True"
+app.config["DEDUPLICATION_ENABLED"] = os.environ.get("DEDUPLICATION_ENABLED", "False") == "True"
+app.config["COALESCING_ENABLED"] = os.environ.get("COALESCING_ENABLED", "True") == "True"
+app.config["COALESCING_TIMEOUT"] = float(os.environ.get("COALESCING_TIMEOUT", 10))
+app.config["PARALLEL_ENABLED"] = os.environ.get("PARALLEL_ENABLED", "False") == "True"
+app.config["PARALLEL_WORKERS"] = int(os.environ.get("PARALLEL_WORKERS", os.cpu_count() or 1))
+app.config["PARALLEL_MIN_COST"] = int(os.environ.get("PARALLEL_MIN_COST", 10**6))
+app.config["GOVERNOR_ENABLED"] = os.environ.get("GOVERNOR_ENABLED", "True") == "True"
+# the limits of the estimated size of the values and cost of the expressions, by route (endpoint)
+_single_limits = CostLimits(
+    max_bits=int(os.environ.get("MAX_VALUE_BITS", 1 << 20)),
+    max_cost=int(os.environ.get("MAX_EVALUATION_COST", 10**8)),
+)
+_batch_limits = CostLimits(
+    max_bits=int(os.environ.get("BATCH_MAX_VALUE_BITS", 1 << 20)),
+    max_cost=int(os.environ.get("BATCH_MAX_EVALUATION_COST", 10**7)),
+)
+app.config["COST_LIMITS"] = {
+    "prefix_calculator": _single_limits,
+    "infix_calculator": _single_limits,
+    "algebraic_calculator": _single_limits,
+    # only the max_bits of the stream routes apply, at runtime, as their expressions are evaluated as they're read
+    "prefix_stream_calculator": _single_limits,
+    "infix_stream_calculator": _single_limits,
+    "prefix_batch_calculator": _batch_limits,
+    "infix_batch_calculator": _batch_limits,
+    # the limits of the expressions of the sessions, and of their patches
+    "create_session": _single_limits,
+}
+# the evaluations are aborted when a value gets larger than this, whatever the estimate
+app.config["MAX_INTERMEDIATE_BITS"] = int(os.environ.get("MAX_INTERMEDIATE_BITS", 1 << 24))
+app.config["MAX_SESSIONS"] = int(os.environ.get("MAX_SESSIONS", 1024))
+app.config["SESSION_TTL"] = float(os.environ.get("SESSION_TTL", 600))
+# the database of the sessions shared by several processes (set by server.py for its workers), or None to keep them
+# in this process
+app.config["SESSION_STORE_PATH"] = os.environ.get("SESSION_STORE_PATH") or None
+app.config["VALIDATION_ENABLED"] = os.environ.get("VALIDATION_ENABLED", "True") == "True"
+# the error records logged per second (0 disables the rate limit), and at once, by exception class
+app.config["ERROR_LOG_RATE"] = float(os.environ.get("ERROR_LOG_RATE", 1))
+app.config["ERROR_LOG_BURST"] = int(os.environ.get("ERROR_LOG_BURST", 10))
+# the token of the requests allowed to profile their evaluation (profiling is disabled without one), and the
+# directory where their cProfile stats are saved (not saved without one)
+app.config["PROFILING_TOKEN"] = os.environ.get("PROFILING_TOKEN", "")
+app.config["PROFILE_DIR"] = os.environ.get("PROFILE_DIR") or None
+
+# the request header with the profiling token, and the response header with the summary of the profile
+PROFILING_TOKEN_HEADER = "X-Profiling-Token"
+PROFILE_HEADER = "X-Profile"
+
+result_store = None
+if app.config["RESULT_STORE_PATH"] is not None:
+    # the database is only opened on first use, so it doesn't slow down the start of the webapp
+    result_store = PersistentResultStore(
+        app.config["RESULT_STORE_PATH"],
+        max_entries=app.config["RESULT_STORE_MAX_ENTRIES"],
+        max_bytes=app.config["RESULT_STORE_MAX_BYTES"],
+    )
+
+expression_cache = ExpressionCache(
+    max_entries=app.config["EXPRESSION_CACHE_MAX_ENTRIES"],
+    max_bytes=app.config["EXPRESSION_CACHE_MAX_BYTES"],
+    canonicalize=app.config["EXPRESSION_CACHE_CANONICAL"],
+    store=result_store,
+)
+
+single_flight = SingleFlight(timeout=app.config["COALESCING_TIMEOUT"])
+
+# the loggers of the modules logging the errors of the evaluations, whose error records are rate limited
+EVALUATION_LOGGERS = (
+    "binary_format",
+    "codegen",
+    "compiler",
+    "dag",
+    "float64",
+    "governor",
+    "infix_calculator",
+    "offload",
+    "parallel",
+    "prefix_calculator",
+    "profiling",
+    "sessions",
+)
+error_log_sampler = None
+if app.config["ERROR_LOG_RATE"] > 0:
+    error_log_sampler = ErrorLogSampler(rate=app.config["ERROR_LOG_RATE"], burst=app.config["ERROR_LOG_BURST"])
+    error_log_sampler.install(EVALUATION_LOGGERS)
+
+# the errors returned to the clients, by exception class
+error_counts = collections.Counter()
+error_counts_lock = threading.Lock()
+
+if app.config["SESSION_STORE_PATH"] is not None:
+    session_store = SharedSessionStore(
+        app.config["SESSION_STORE_PATH"], max_sessions=app.config["MAX_SESSIONS"], ttl=app.config["SESSION_TTL"]
+    )
+else:
+    session_store = SessionStore(max_sessions=app.config["MAX_SESSIONS"], ttl=app.config["SESSION_TTL"])
+
+# created on first use, so that worker processes are only started when offloading is enabled
+evaluation_pool = None
+parallel_evaluator = None
+
+EVALUATORS = {
+    PREFIX: evaluate_prefix_notation,
+    INFIX: evaluate_infix_notation,
+    ALGEBRAIC: evaluate_algebraic_notation,
+}
+
+
+def cache_lookups():
+    lookups = {("local", "hit"): expression_cache.hits, ("local", "miss"): expression_cache.misses}
+    if expression_cache.backing is not None:
+        stats = expression_cache.backing.stats()
+        lookups.update({("shared", "hit"): stats["hits"], ("shared", "miss"): stats["misses"]})
+    if expression_cache.store is not None:
+        stats = expression_cache.store.stats()
+        lookups.update({("persistent", "hit"): stats["hits"], ("persistent", "miss"): stats["misses"]})
+    return lookups
+
+
+def cache_hit_ratios():
+    lookups = cache_lookups()
+    ratios = {}
+    for cache in {cache for cache, _ in lookups}:
+        total = lookups[(cache, "hit")] + lookups[(cache, "miss")]
+        ratios[(cache,)] = lookups[(cache, "hit")] / total if total else 0.0
+    return ratios
+
+
+metrics = Registry()
+REQUESTS = metrics.register(
+    Counter("calculator_requests_total", "Requests served, by route and status code.", ("route", "status"))
+)
+REQUEST_SECONDS = metrics.register(
+    Histogram("calculator_request_duration_seconds", "Latency of the requests, by route.", DURATION_BUCKETS, ("route",))
+)
+PHASE_SECONDS = metrics.register(
+    Histogram(
+        "calculator_phase_duration_seconds",
+        "Time spent tokenizing, evaluating and serializing to JSON.",
+        DURATION_BUCKETS,
+        ("phase",),
+    )
+)
+EXPRESSION_CHARS = metrics.register(
+    Histogram("calculator_expression_length_chars", "Length of the expressions.", SIZE_BUCKETS, ("notation",))
+)
+OPERAND_BITS = metrics.register(
+    Histogram("calculator_operand_size_bits", "Size of the largest literal of the compiled expressions.", SIZE_BUCKETS)
+)
+ERRORS = metrics.register(Counter("calculator_errors_total", "Evaluation errors, by exception class.", ("error",)))
+DEDUPLICATED_NODES = metrics.register(
+    Counter("calculator_deduplicated_nodes_total", "Repeated subexpressions evaluated once, when deduplicating them.")
+)
+metrics.register(
+    CallbackCounter(
+        "calculator_cache_lookups_total", "Lookups of the result caches, by cache.", cache_lookups, ("cache", "result")
+    )
+)
+metrics.register(Gauge("calculator_cache_hit_ratio", "Hit ratio of the result caches.", cache_hit_ratios, ("cache",)))
+metrics.register(
+    CallbackCounter(
+        "calculator_coalescing_calls_total",
+        "Evaluations run, and requests which shared an evaluation in progress or gave up waiting for it.",
+        lambda: {(name,): value for name, value in single_flight.stats().items() if name != "in_progress"},
+        ("result",),
+    )
+)
+
+
+def get_evaluation_pool():
+    global evaluation_pool
+    if evaluation_pool is None:
+        evaluation_pool = EvaluationPool(
+            workers=app.config["OFFLOAD_WORKERS"],
+            max_queue=app.config["OFFLOAD_MAX_QUEUE"],
+            timeout=app.config["EVALUATION_TIMEOUT"],
+        )
+    return evaluation_pool
+
+
+def get_parallel_evaluator():
+    global parallel_evaluator
+    if parallel_evaluator is None:
+        parallel_evaluator = ParallelEvaluator(
+            workers=app.config["PARALLEL_WORKERS"],
+            min_cost=app.config["PARALLEL_MIN_COST"],
+            timeout=app.config["EVALUATION_TIMEOUT"],
+        )
+    return parallel_evaluator
+
+
+def run_inline(program):
+    """Run the compiled program in this process, evaluating its repeated subexpressions once if enabled.
+
+    When parallel evaluation is enabled, the costly independent subtrees are evaluated in worker processes instead.
+    When the governor is enabled, the evaluation is aborted if a value gets larger than MAX_INTERMEDIATE_BITS.
+    """
+    max_bits = app.config["MAX_INTERMEDIATE_BITS"] if app.config["GOVERNOR_ENABLED"] else None
+    if app.config["PARALLEL_ENABLED"]:
+        return get_parallel_evaluator().run(program, max_bits=max_bits)
+    if not app.config["DEDUPLICATION_ENABLED"]:
+        return run_program(program, max_bits=max_bits)
+    dag = build_dag(program)
+    if app.config["METRICS_ENABLED"]:
+        DEDUPLICATED_NODES.inc(amount=dag.deduplicated)
+    return run_dag(dag, max_bits=max_bits)
+
+
+def run_offloaded(program):
+    """Run the compiled program inline if it's cheap, or in the evaluation pool if it's expensive.
+
+    When the governor is enabled, the evaluation is aborted if a value gets larger than MAX_INTERMEDIATE_BITS.
+    """
+    if is_expensive(program, app.config["OFFLOAD_MIN_INSTRUCTIONS"], app.config["OFFLOAD_MIN_LITERAL_BITS"]):
+        max_bits = app.config["MAX_INTERMEDIATE_BITS"] if app.config["GOVERNOR_ENABLED"] else None
+        return get_evaluation_pool().run(program, max_bits=max_bits)
+    return run_inline(program)
+
+
+def compile_request(notation, expression):
+    """Compile the expression, or the tokens of a binary payload (bytes), which are decoded instead of scanned."""
+    if isinstance(expression, bytes):
+        return compile_tokens(notation, decode_tokens(expression))
+    return compile_expression(notation, expression)
+
+
+def timed_compile(notation, expression):
+    """Compile the expression, observing the time spent tokenizing it and the size of its largest literal."""
+    start = perf_counter()
+    program = compile_request(notation, expression)
+    PHASE_SECONDS.observe(perf_counter() - start, "tokenize")
+    # the largest literal is the longest one, so only its size is computed
+    largest = max((instruction for instruction in program.instructions if type(instruction) is int), default=0)
+    OPERAND_BITS.observe(largest.bit_length())
+    return program
+
+
+def timed_run(program):
+    """Run the compiled program (offloading it if enabled), observing the time spent evaluating it."""
+    start = perf_counter()
+    try:
+        return run_offloaded(program) if app.config["OFFLOAD_ENABLED"] else run_inline(program)
+    finally:
+        PHASE_SECONDS.observe(perf_counter() - start, "evaluate")
+
+
+def governed_compile(compile_program, limits):
+    """Wrap compile_program to raise an error for the programs whose estimated cost exceeds the limits."""
+
+    def compile_governed(notation, expression):
+        program = compile_program(notation, expression)
+        check_cost(program, limits)
+        return program
+
+    return compile_governed
+
+
+def evaluate(notation, expression):
+    """Evaluate the expression, sharing the evaluation in progress of an identical expression if coalescing is enabled.
+
+    The requests waiting for an identical evaluation evaluate the expression themselves after COALESCING_TIMEOUT
+    seconds. When the governor is enabled, the cost limits of the route serving the request apply.
+    """
+    limits = app.config["COST_LIMITS"].get(request.endpoint) if app.config["GOVERNOR_ENABLED"] else None
+    if not app.config["COALESCING_ENABLED"]:
+        return evaluate_expression(notation, expression, limits)
+    key = (notation, normalize_expression(expression), limits)
+    return single_flight.do(key, lambda: evaluate_expression(notation, expression, limits))
+
+
+def evaluate_expression(notation, expression, limits=None):
+    """Evaluate the expression through the expression cache, unless it's disabled in the app config.
+
+    When offloading is enabled, expensive expressions are evaluated in worker processes.
+    When parallel evaluation is enabled, the costly independent subtrees of the others are evaluated in parallel.
+    When deduplication is enabled, repeated subexpressions are evaluated once.
+    When metrics are enabled, expressions are compiled and run separately to observe both phases.
+    Malformed expressions are rejected by validating them before they're compiled (see check_valid).
+    With limits, expressions whose estimated cost exceeds them raise a ResourceLimitError before being run.
+    The expression is either a string or a binary payload of its tokens (bytes).
+    """
+    if app.config["METRICS_ENABLED"]:
+        EXPRESSION_CHARS.observe(len(expression) if expression else 0, notation)
+        compile_program, run = timed_compile, timed_run
+    else:
+        compile_program = compile_request
+        run = run_offloaded if app.config["OFFLOAD_ENABLED"] else run_inline
+    if limits is not None:
+        compile_program = governed_compile(compile_program, limits)
+    compile_program = validated_compile(compile_program)
+
+    if app.config["EXPRESSION_CACHE_ENABLED"]:
+        return expression_cache.evaluate(notation, expression, run, compile_program)
+    if (
+        app.config["OFFLOAD_ENABLED"]
+        or app.config["METRICS_ENABLED"]
+        or app.config["DEDUPLICATION_ENABLED"]
+        or app.config["PARALLEL_ENABLED"]
+        or app.config["GOVERNOR_ENABLED"]
+        or isinstance(expression, bytes)
+    ):
+        return run(compile_program(notation, expression))
+    check_valid(notation, expression)
+    return EVALUATORS[notation](expression)
+
+
+def timed_serialization(view):
+    """Decorate a route to observe the time spent serializing its response to JSON."""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        response = view(*args, **kwargs)
+        if not app.config["METRICS_ENABLED"]:
+            return response
+        start = perf_counter()
+        response = app.make_response(response)
+        PHASE_SECONDS.observe(perf_counter() - start, "serialize")
+        return response
+
+    return wrapper
+
+
+def error_response(notation, error):
+    """Return the message and status code for an error raised while evaluating an expression."""
+    count_error(type(error))
+    if isinstance(error, ZeroDivisionError):
+        return {"message": f"Zero division not supported."}, 500
+    if isinstance(error, ServerBusyError):
+        return {"message": f"The server is busy, please retry later."}, 503
+    if isinstance(error, EvaluationTimeoutError):
+        return {"message": f"The evaluation of the expression took too long."}, 504
+    if isinstance(error, ResourceLimitError):
+        return {"message": f"The expression exceeds the resource limits of the server: {error}"}, 422
+    if isinstance(error, ArithmeticError):
+        return {"message": f"The expression can't be evaluated: {error}"}, 422
+    return {"message": f"Please check the provided expression is in the {notation} notation: {error}"}, 400
+
+
+def profiling_requested():
+    """Return whether the request asks for a profile of its evaluation, raising an error if it isn't allowed to."""
+    token = request.headers.get(PROFILING_TOKEN_HEADER)
+    if token is None:
+        return False
+    expected = app.config["PROFILING_TOKEN"]
+    if not expected or not hmac.compare_digest(token.encode("utf-8"), expected.encode("utf-8")):
+        raise ProfilingNotAllowedError("Profiling requires the profiling token of the server.")
+    return True
+
+
+def evaluate_profiled(notation, expression):
+    """Evaluate the expression inline under an EvaluationProfiler, whose summary is sent back with the response.
+
+    The caches, coalescing and worker processes are bypassed, so the profile is the one of the actual evaluation of
+    the expression, with the resource limits of the route. When PROFILE_DIR is set, the cProfile stats of the
+    evaluation are saved there.
+    """
+    check_valid(notation, expression)
+    profiler = request_profile.profiler = EvaluationProfiler(notation)
+    read_tokens = None
+    if notation == INFIX:
+        read_tokens = decode_tokens if isinstance(expression, bytes) else lambda text: list(tokenize(text))
+    limits = app.config["COST_LIMITS"].get(request.endpoint) if app.config["GOVERNOR_ENABLED"] else None
+    max_bits = app.config["MAX_INTERMEDIATE_BITS"] if app.config["GOVERNOR_ENABLED"] else None
+    path = None
+    if app.config["PROFILE_DIR"] is not None:
+        path = os.path.join(app.config["PROFILE_DIR"], f"{uuid.uuid4().hex}.prof")
+    check = (lambda program: check_cost(program, limits)) if limits is not None else None
+    return profiler.evaluate(compile_request, expression, read_tokens, max_bits, check, path)
+
+
+def count_error(error_type):
+    """Count an error returned to a client, by exception class."""
+    with error_counts_lock:
+        error_counts[error_type.__name__] += 1
+    if app.config["METRICS_ENABLED"]:
+        ERRORS.inc(error_type.__name__)
+
+
+def undecodable_stream(error):
+    """Return the invalid payload error of a streamed expression which isn't valid utf-8."""
+    return InvalidPayloadError(f"The expression isn't valid utf-8: {error}")
+
+
+def stream_max_bits():
+    """Return the largest value the streamed expressions of the route may compute, or None without limit."""
+    limits = app.config["COST_LIMITS"].get(request.endpoint) if app.config["GOVERNOR_ENABLED"] else None
+    return limits.max_bits if limits is not None else None
+
+
+def check_valid(notation, expression):
+    """Raise the error of a malformed expression, found by validating it, without compiling nor logging it.
+
+    Rejecting malformed expressions before evaluating them spares compiling them, and raising and logging their error
+    in the evaluators. The expressions whose error is found after a division are evaluated anyway, as they may raise
+    a zero division first, and so are the binary payloads, which are already tokenized, and the algebraic expressions
+    (which compile into no instructions when malformed).
+    """
+    if not app.config["VALIDATION_ENABLED"] or isinstance(expression, bytes) or notation not in VALIDATORS:
+        return
+    error = validate(notation, expression)
+    if error is not None and not error.after_division:
+        raise error.error_type(error.message)
+
+
+def validated_compile(compile_program):
+    """Wrap compile_program to validate the expressions first, so only those missing from the caches are validated."""
+
+    def compile_validated(notation, expression):
+        check_valid(notation, expression)
+        return compile_program(notation, expression)
+
+    return compile_validated
+
+
+def calculator_response(notation):
+    """Return the response of a calculator request, profiling its evaluation if the request asks for it."""
+    expression = request_expression()
+    # bytes only come from the binary payloads, the JSON expressions must be strings
+    if not isinstance(expression, (str, bytes)):
+        return negotiated({"message": "The expression must be a string."}, 400)
+    if profiling_requested():
+        return negotiated({"result": evaluate_profiled(notation, expression)})
+    return negotiated({"result": evaluate(notation, expression)})
+
+
+def request_expression():
+    """Return the expression of a calculator request: the binary payload of its tokens, or its JSON expression."""
+    if request.mimetype == TOKENS_MIMETYPE:
+        return request.get_data()
+    return request.json.get("expression", "")
+
+
+def negotiated(body, status=200, headers=None):
+    """Return the body of a response in the binary format if the Accept header prefers it to JSON."""
+    # JSON is preferred when both are as acceptable, e.g. without Accept header
+    mimetype = request.accept_mimetypes.best_match(("application/json", TOKENS_MIMETYPE), "application/json")
+    if mimetype == TOKENS_MIMETYPE:
+        return Response(encode_response(body), status, headers, mimetype=TOKENS_MIMETYPE)
+    return json_body(body, status, headers)
+
+
+def json_body(body, status=200, headers=None):
+    """Return the body of a JSON response, serialized with dumps_record if its result is too long an int for Flask."""
+    result = body.get("result")
+    if type(result) is int and is_long_literal(result):
+        return Response(dumps_record(body) + "\n", status, headers, mimetype="application/json")
+    return body, status, headers
+
+
+def batch_response(notation):
+    """Stream the NDJSON results of a batch of expressions, sent as a JSON array or as NDJSON."""
+    if request.mimetype in ("application/x-ndjson", "application/jsonl"):
+        items = iter_ndjson(request.stream)
+    else:
+        items = iter_json_array(request.stream)
+    lines = evaluate_batch(
+        items,
+        lambda expression: evaluate(notation, expression),
+        lambda error: error_response(notation, error),
+        # ArithmeticError also covers the overflows of float divisions, e.g. "/ <10^400> 3"
+        EVALUATION_ERRORS + (ArithmeticError, ServerBusyError, EvaluationTimeoutError, ResourceLimitError),
+    )
+    return Response(stream_with_context(lines), mimetype="application/x-ndjson")
+
+
+# the start of the request served by each thread (cheaper to reach than flask.g)
+request_timer = threading.local()
+# the profiler of the evaluation of the request served by each thread, if it asked for a profile
+request_profile = threading.local()
+
+
+@app.before_request
+def start_timer():
+    request_timer.start = perf_counter()
+    request_profile.profiler = None
+
+
+@app.after_request
+def observe_request(response):
+    """Count the requests and observe their latency (up to the first byte of streamed responses)."""
+    if app.config["METRICS_ENABLED"]:
+        url_rule = request.url_rule
+        route = url_rule.rule if url_rule is not None else "unmatched"
+        REQUESTS.inc(route, response.status_code)
+        REQUEST_SECONDS.observe(perf_counter() - request_timer.start, route)
+    return response
+
+
+@app.after_request
+def attach_profile(response):
+    """Send the summary of the profile of the evaluation back in a header, if the request asked for it."""
+    profiler = getattr(request_profile, "profiler", None)
+    if profiler is not None:
+        response.headers[PROFILE_HEADER] = json.dumps(profiler.summary(), separators=(",", ":"))
+        request_profile.profiler = None
+    return response
+
+
+@app.errorhandler(ServerBusyError)
+@app.errorhandler(EvaluationTimeoutError)
+def evaluation_unavailable(error):
+    """Handle the errors of the evaluation pool for all routes, asking the clients to retry later."""
+    body, status = error_response(None, error)
+    return negotiated(body, status, {"Retry-After": str(app.config["RETRY_AFTER"])})
+
+
+@app.errorhandler(ResourceLimitError)
+def resource_limit_exceeded(error):
+    """Handle the expressions exceeding the resource limits for all routes."""
+    return negotiated(*error_response(None, error))
+
+
+@app.errorhandler(ProfilingNotAllowedError)
+def profiling_not_allowed(error):
+    """Handle the requests asking for a profile without the profiling token."""
+    return negotiated({"message": str(error)}, 403)
+
+
+@app.errorhandler(SessionNotFoundError)
+def session_not_found(error):
+    """Handle the requests for sessions which don't exist, or expired."""
+    return {"message": str(error)}, 404
 
 
 @app.route("/status/")
@@ -17,33 +588,230 @@ def status():
     return {"status": "Webapp is running."}
 
 
+@app.route("/calculator/cache/")
+def cache_stats():
+    """Route for the counters of the expression cache."""
+    stats = {"enabled": app.config["EXPRESSION_CACHE_ENABLED"], **expression_cache.stats()}
+    if expression_cache.backing is not None:
+        stats["shared"] = expression_cache.backing.stats()
+    if expression_cache.store is not None:
+        stats["persistent"] = expression_cache.store.stats()
+    return stats
+
+
+@app.route("/calculator/errors/")
+def error_stats():
+    """Route for the counters of the errors returned to the clients, and of the error records logged."""
+    with error_counts_lock:
+        errors = dict(error_counts)
+    return {"errors": errors, "log": error_log_sampler.stats() if error_log_sampler is not None else None}
+
+
+@app.route("/calculator/validate/", methods=["POST"])
+def validate_expression():
+    """Route validating an expression without evaluating it, returning the code and position of its first error."""
+    data = request.json
+    notation = data.get("notation", PREFIX)
+    if notation not in (PREFIX, INFIX):
+        return {"message": f"The notation must be '{PREFIX}' or '{INFIX}'."}, 400
+    expression = data.get("expression", "")
+    if not isinstance(expression, str):
+        return {"message": "The expression must be a string."}, 400
+    error = validate(notation, expression)
+    if error is None:
+        return {"valid": True}
+    return {"valid": False, "code": error.code, "message": error.message, "position": error.position}
+
+
+@app.route("/calculator/offload/")
+def offload_stats():
+    """Route for the counters of the evaluation pool."""
+    stats = evaluation_pool.stats() if evaluation_pool is not None else {}
+    return {"enabled": app.config["OFFLOAD_ENABLED"], **stats}
+
+
+@app.route("/calculator/parallel/")
+def parallel_stats():
+    """Route for the counters of the parallel evaluations."""
+    stats = parallel_evaluator.stats() if parallel_evaluator is not None else {}
+    return {"enabled": app.config["PARALLEL_ENABLED"], **stats}
+
+
+@app.route("/calculator/coalescing/")
+def coalescing_stats():
+    """Route for the counters of the coalesced evaluations."""
+    return {"enabled": app.config["COALESCING_ENABLED"], **single_flight.stats()}
+
+
+@app.route("/metrics")
+def prometheus_metrics():
+    """Route for the metrics of the webapp, in the Prometheus text format."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
 @app.route("/calculator/prefix/", methods=["POST"])
+@timed_serialization
 def prefix_calculator():
     """Route for the prefix calculator."""
     try:
-        data = request.json
-        expression = data.get("expression", "")
-        result = evaluate_prefix_notation(expression)
-        return {"result": result}
-    except (InvalidCharacterError, MalformedPrefixNotationError) as e:
-        return {"message": f"Please check the provided expression is in the prefix notation: {e}"}, 400
-    except ZeroDivisionError:
-        return {"message": f"Zero division not supported."}, 500
+        return calculator_response(PREFIX)
+    except (InvalidCharacterError, MalformedPrefixNotationError, ArithmeticError, InvalidPayloadError) as e:
+        return negotiated(*error_response(PREFIX, e))
+
+
+@app.route("/calculator/prefix/batch/", methods=["POST"])
+def prefix_batch_calculator():
+    """Route for the prefix calculator, for a batch of expressions."""
+    return batch_response(PREFIX)
+
+
+@app.route("/calculator/prefix/stream/", methods=["POST"])
+def prefix_stream_calculator():
+    """Route for the prefix calculator, for an expression sent as the raw (possibly chunked) request body.
+
+    The expression is read as it's evaluated, so its cost can't be estimated beforehand: when the governor is
+    enabled, the evaluation is aborted instead as soon as a value gets larger than the max_bits limit of the route.
+    """
+    max_bits = stream_max_bits()
+    try:
+        return json_body({"result": evaluate_prefix_stream(request.stream, max_bits=max_bits)})
+    except (InvalidCharacterError, MalformedPrefixNotationError, ArithmeticError, ResourceLimitError) as e:
+        return error_response(PREFIX, e)
+    except UnicodeDecodeError as e:
+        return error_response(PREFIX, undecodable_stream(e))
 
 
 @app.route("/calculator/infix/", methods=["POST"])
+@timed_serialization
 def infix_calculator():
     """Route for the infix calculator."""
     try:
-        data = request.json
-        expression = data.get("expression", "")
-        result = evaluate_infix_notation(expression)
-        return {"result": result}
-    except (InvalidCharacterError, InvalidParenthesesError, MalformedInfixNotationError) as e:
-        return {"message": f"Please check the provided expression is in the infix notation: {e}"}, 400
-    except ZeroDivisionError:
-        return {"message": f"Zero division not supported."}, 500
+        return calculator_response(INFIX)
+    except (
+        InvalidCharacterError,
+        InvalidParenthesesError,
+        MalformedInfixNotationError,
+        ArithmeticError,
+        InvalidPayloadError,
+    ) as e:
+        return negotiated(*error_response(INFIX, e))
+
+
+@app.route("/calculator/algebraic/", methods=["POST"])
+@timed_serialization
+def algebraic_calculator():
+    """Route for the infix calculator with operator precedence, whose expressions needn't be fully parenthesized."""
+    try:
+        return calculator_response(ALGEBRAIC)
+    except (
+        InvalidCharacterError,
+        InvalidParenthesesError,
+        MalformedInfixNotationError,
+        ArithmeticError,
+        InvalidPayloadError,
+    ) as e:
+        return negotiated(*error_response(ALGEBRAIC, e))
+
+
+@app.route("/calculator/infix/batch/", methods=["POST"])
+def infix_batch_calculator():
+    """Route for the infix calculator, for a batch of expressions."""
+    return batch_response(INFIX)
+
+
+@app.route("/calculator/infix/stream/", methods=["POST"])
+def infix_stream_calculator():
+    """Route for the infix calculator, for an expression sent as the raw (possibly chunked) request body.
+
+    When the governor is enabled, the evaluation is aborted as soon as a value gets larger than the max_bits limit of
+    the route, see prefix_stream_calculator.
+    """
+    max_bits = stream_max_bits()
+    try:
+        return json_body({"result": evaluate_infix_stream(request.stream, max_bits=max_bits)})
+    except (
+        InvalidCharacterError,
+        InvalidParenthesesError,
+        MalformedInfixNotationError,
+        ArithmeticError,
+        ResourceLimitError,
+    ) as e:
+        return error_response(INFIX, e)
+    except UnicodeDecodeError as e:
+        return error_response(INFIX, undecodable_stream(e))
+
+
+# the errors of the expressions of the sessions, which are reported without failing the request
+SESSION_ERRORS = EVALUATION_ERRORS + (ArithmeticError, ResourceLimitError)
+
+
+def session_response(session_id, session, status=200, **fields):
+    """Return the id and result of the session, or the error evaluating its expression raises."""
+    try:
+        return json_body({"session": session_id, **fields, "result": session.result()}, status)
+    except SESSION_ERRORS as e:
+        body, error_status = error_response(session.notation, e)
+        return {"session": session_id, **fields, "error": type(e).__name__, **body, "status": error_status}, status
+
+
+@app.route("/calculator/sessions/", methods=["GET"])
+def session_stats():
+    """Route for the counters of the evaluation sessions."""
+    return session_store.stats()
+
+
+@app.route("/calculator/sessions/", methods=["POST"])
+def create_session():
+    """Route starting an evaluation session for an expression, whose subtrees can then be replaced."""
+    data = request.json
+    notation = data.get("notation", PREFIX)
+    if notation not in (PREFIX, INFIX):
+        return {"message": f"The notation must be '{PREFIX}' or '{INFIX}'."}, 400
+    limits = app.config["COST_LIMITS"].get(request.endpoint) if app.config["GOVERNOR_ENABLED"] else None
+    max_bits = app.config["MAX_INTERMEDIATE_BITS"] if app.config["GOVERNOR_ENABLED"] else None
+    expression = data.get("expression", "")
+    if not isinstance(expression, str):
+        return {"message": "The expression must be a string."}, 400
+    try:
+        session = Session.create(notation, expression, max_bits, limits)
+    except EVALUATION_ERRORS as e:
+        return error_response(notation, e)
+    return session_response(session_store.add(session), session, 201)
+
+
+@app.route("/calculator/sessions/<session_id>/", methods=["GET"])
+def get_session(session_id):
+    """Route for the current expression of a session, and its result."""
+    session = session_store.get(session_id)
+    return session_response(session_id, session, expression=session.expression())
+
+
+@app.route("/calculator/sessions/<session_id>/", methods=["PATCH"])
+def patch_session(session_id):
+    """Route replacing the subtree at a path of the expression of a session, re-evaluating the path to the root."""
+    session = session_store.get(session_id)
+    data = request.json
+    path = data.get("path", [])
+    if not isinstance(path, list) or any(type(side) is not int for side in path):
+        return {"message": "The path must be a list of sides, 0 for left operands and 1 for right operands."}, 400
+    expression = data.get("expression", "")
+    if not isinstance(expression, str):
+        return {"message": "The expression must be a string."}, 400
+    try:
+        session, recomputed = session_store.patch(session_id, path, expression)
+    except InvalidPatchError as e:
+        return {"message": str(e)}, 400
+    except EVALUATION_ERRORS as e:
+        return error_response(session.notation, e)
+    return session_response(session_id, session, recomputed=recomputed)
+
+
+@app.route("/calculator/sessions/<session_id>/", methods=["DELETE"])
+def delete_session(session_id):
+    """Route ending a session."""
+    session_store.delete(session_id)
+    return "", 204
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=3456)
+    app.run(host="0.0.0.0", port=3456, threaded=True)